@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Advertisement trace recorder for the Bluetooth IDS
+Streams raw advertisements into a compact append-only binary trace for
+threshold tuning and replay:
+
+    <trace>.btr          32-byte header (written with the first advertisement)
+                         + fixed-width 24-byte records
+    <trace>.btr.strings  interned string table (MACs, names, payloads)
+
+Unchanged advertisements from the same device are throttled to one per
+min_interval (min_interval=0 records every advertisement). Records only
+reference strings already written, so a trace cut short by a power loss is
+still readable up to its last complete record.
+
+Usage:
+    python3 adv_trace.py summary night.btr
+    python3 adv_trace.py csv night.btr > night.csv
+"""
+
+import argparse
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+MAGIC = b"BTRACE1\0"
+HEADER = struct.Struct("<8sdH14x")          # magic, base time, record size
+RECORD = struct.Struct("<IIIbbBxII")        # ms offset, mac, name, rssi, tx power, addr type, manufacturer, services
+STRING_LENGTH = struct.Struct("<H")
+
+ADDRESS_TYPES = {None: 0, "public": 1, "random": 2}
+ADDRESS_NAMES = {value: key for key, value in ADDRESS_TYPES.items()}
+NO_TX_POWER = -128
+
+
+def encode_manufacturer_data(manufacturer_data):
+    """{company_id: bytes} -> one blob (company id, length, data)..."""
+    if not manufacturer_data:
+        return b""
+    return b"".join(struct.pack("<HB", company, len(data)) + bytes(data)
+                    for company, data in sorted(manufacturer_data.items()))
+
+
+def decode_manufacturer_data(blob):
+    """Inverse of encode_manufacturer_data"""
+    result = {}
+    offset = 0
+    while offset + 3 <= len(blob):
+        company, length = struct.unpack_from("<HB", blob, offset)
+        offset += 3
+        result[company] = blob[offset:offset + length]
+        offset += length
+    return result
+
+
+class TraceRecorder:
+    def __init__(self, path, min_interval=5.0, rssi_step=10, flush_interval=10.0, logger=None):
+        self.path = path
+        self.min_interval = min_interval      # seconds between unchanged records per device
+        self.rssi_step = rssi_step            # dB change that forces a record
+        self.flush_interval = flush_interval  # seconds between file flushes
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.strings = {b"": 0}
+        self.last_record = {}
+        self.last_flush = time.monotonic()
+        self.count = 0
+
+        new_trace = not os.path.exists(path) or os.path.getsize(path) < HEADER.size
+        self.strings_file = open(path + ".strings", "ab")
+        self.records_file = open(path, "ab")
+        if new_trace:
+            # Header is written with the first advertisement's timestamp
+            self.base_time = None
+            self.records_file.truncate(0)
+            self.strings_file.truncate(0)
+            self.strings_file.write(STRING_LENGTH.pack(0))
+        else:
+            # Appending: reuse the existing header and string table
+            reader = TraceReader(path)
+            self.base_time = reader.base_time
+            self.strings = {value: index for index, value in enumerate(reader.strings)}
+            reader.close()
+            self.strings_file.truncate(reader.strings_size)
+            self.records_file.truncate(HEADER.size + len(reader) * RECORD.size)
+
+    def intern(self, value):
+        """Index of value in the string table, appending it if new"""
+        if isinstance(value, str):
+            value = value.encode()
+        index = self.strings.get(value)
+        if index is None:
+            value = value[:65535]
+            index = len(self.strings)
+            self.strings[value] = index
+            self.strings_file.write(STRING_LENGTH.pack(len(value)) + value)
+        return index
+
+    def record(self, mac, sighting):
+        """Scanner listener - write one advertisement, throttled per device"""
+        timestamp = sighting['last_seen']
+        rssi = sighting['signal']
+        manufacturer = encode_manufacturer_data(sighting.get('manufacturer_data'))
+        services = ",".join(sorted(sighting.get('service_uuids') or ()))
+
+        previous = self.last_record.get(mac)
+        if previous is not None:
+            last_time, last_rssi, last_payload = previous
+            if (timestamp - last_time < self.min_interval and abs(rssi - last_rssi) < self.rssi_step
+                    and (manufacturer, services) == last_payload):
+                return
+        self.last_record[mac] = (timestamp, rssi, (manufacturer, services))
+
+        if self.base_time is None:
+            self.base_time = timestamp
+            self.records_file.write(HEADER.pack(MAGIC, self.base_time, RECORD.size))
+
+        tx_power = sighting.get('tx_power')
+        name = sighting.get('name')
+        self.records_file.write(RECORD.pack(
+            max(0, int((timestamp - self.base_time) * 1000)),
+            self.intern(mac),
+            self.intern("" if name in (None, "Unknown") else name),
+            max(-127, min(127, int(rssi))),
+            NO_TX_POWER if tx_power is None else max(-127, min(127, int(tx_power))),
+            ADDRESS_TYPES.get(sighting.get('address_type'), 0),
+            self.intern(manufacturer),
+            self.intern(services)
+        ))
+        self.count += 1
+
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Strings first, then records, so records never point past the table"""
+        self.last_flush = time.monotonic()
+        try:
+            self.strings_file.flush()
+            os.fsync(self.strings_file.fileno())
+            self.records_file.flush()
+        except Exception as e:
+            self.logger.error(f"Error flushing trace: {e}")
+
+    def close(self):
+        self.flush()
+        self.strings_file.close()
+        self.records_file.close()
+        self.logger.info(f"Trace {self.path}: {self.count} advertisements recorded")
+
+
+class TraceReader:
+    def __init__(self, path):
+        self.path = path
+
+        with open(path + ".strings", "rb") as f:
+            data = f.read()
+        self.strings = []
+        self.strings_size = 0  # bytes of complete entries
+        while self.strings_size + STRING_LENGTH.size <= len(data):
+            (length,) = STRING_LENGTH.unpack_from(data, self.strings_size)
+            start = self.strings_size + STRING_LENGTH.size
+            if start + length > len(data):
+                break
+            self.strings.append(data[start:start + length])
+            self.strings_size = start + length
+
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} has no records")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.base_time, record_size = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a BTRACE1 trace")
+
+        # Ignore a trailing partial record and records whose strings never made it to disk
+        self.count = (len(self.map) - HEADER.size) // RECORD.size
+        while self.count and max(self.raw(self.count - 1)[i] for i in (1, 2, 6, 7)) >= len(self.strings):
+            self.count -= 1
+
+    def __len__(self):
+        return self.count
+
+    def raw(self, index):
+        return RECORD.unpack_from(self.map, HEADER.size + index * RECORD.size)
+
+    def __iter__(self):
+        """(timestamp, mac, name, rssi) tuples - the ReplayScanner input format"""
+        strings = self.strings
+        base = self.base_time
+        for fields in RECORD.iter_unpack(self.map[HEADER.size:HEADER.size + self.count * RECORD.size]):
+            yield (base + fields[0] / 1000, strings[fields[1]].decode(),
+                   strings[fields[2]].decode() or "Unknown", fields[3])
+
+    def records(self):
+        """Full advertisement dicts including payload fields"""
+        strings = self.strings
+        for index in range(self.count):
+            offset, mac, name, rssi, tx_power, address_type, manufacturer, services = self.raw(index)
+            yield {
+                'timestamp': self.base_time + offset / 1000,
+                'mac': strings[mac].decode(),
+                'name': strings[name].decode() or "Unknown",
+                'signal': rssi,
+                'tx_power': None if tx_power == NO_TX_POWER else tx_power,
+                'address_type': ADDRESS_NAMES.get(address_type),
+                'manufacturer_data': decode_manufacturer_data(strings[manufacturer]),
+                'service_uuids': strings[services].decode().split(",") if strings[services] else []
+            }
+
+    def to_numpy(self):
+        """Zero-copy structured NumPy view of the records (needs numpy)"""
+        import numpy as np
+
+        dtype = np.dtype([('offset_ms', '<u4'), ('mac', '<u4'), ('name', '<u4'), ('rssi', 'i1'),
+                          ('tx_power', 'i1'), ('address_type', 'u1'), ('pad', 'u1'),
+                          ('manufacturer', '<u4'), ('services', '<u4')])
+        return np.frombuffer(self.map, dtype=dtype, count=self.count, offset=HEADER.size)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect Bluetooth IDS advertisement traces")
+    parser.add_argument("command", choices=["summary", "csv"])
+    parser.add_argument("trace")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    reader = TraceReader(args.trace)
+
+    if args.command == "summary":
+        macs = set()
+        first = last = None
+        for timestamp, mac, _, _ in reader:
+            macs.add(mac)
+            first = timestamp if first is None else min(first, timestamp)
+            last = timestamp if last is None else max(last, timestamp)
+        size = os.path.getsize(args.trace) + os.path.getsize(args.trace + ".strings")
+        print(f"{len(reader)} advertisements from {len(macs)} addresses, {len(reader.strings)} strings")
+        if first is not None:
+            print(f"{time.ctime(first)} -> {time.ctime(last)} ({(last - first) / 3600:.2f} h)")
+        print(f"{size / 1e6:.2f} MB on disk, read in {time.perf_counter() - started:.2f} s")
+    else:
+        print("timestamp,mac,name,rssi")
+        for timestamp, mac, name, rssi in reader:
+            sys.stdout.write(f"{timestamp:.3f},{mac},{name.replace(',', ' ')},{rssi}\n")
+
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
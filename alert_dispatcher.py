@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Alert dispatcher for the Bluetooth IDS
+Sends email and voice notifications on a worker pool so the scanning loop
+never waits on SMTP or the VPS, with per-channel retry and latency reporting.
+With an outbound queue, voice calls are persisted and delivered store-and-forward:
+their latency is recorded when the queue actually delivers them, and a voice
+alarm the queue gives up on is reported by email instead.
+"""
+
+import logging
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+
+from config_cache import ConfigFile, config_path, validate_email_config
+from outbound_queue import PRIORITY_ALARM
+
+EMAIL_CONFIG_FILE = config_path("email_config.json")
+MAKE_CALL_URL = 'https://admin.securecaller.online/api/make-call'
+MAKE_CALL_PATH = '/api/make-call'
+DEVICE_ID = 'btids001'
+
+QUEUED = "queued"  # a channel's send() handed the alert to the outbound queue
+
+
+def format_phone_number(phone):
+    """Convert to E.164 format for Telnyx"""
+    phone = phone.strip()
+    if phone.startswith('0'):
+        return '+61' + phone[1:]
+    if not phone.startswith('+'):
+        return '+' + phone
+    return phone
+
+
+class AlertDispatcher:
+    def __init__(self, config_file=EMAIL_CONFIG_FILE, max_workers=3, retries=3,
+                 backoff=2.0, outbox=None, config=None, logger=None):
+        self.outbox = outbox      # OutboundQueue for VPS requests (None = direct POST)
+        self.retries = retries    # attempts per channel
+        self.backoff = backoff    # seconds before the first retry, doubled each time
+        self.logger = logger or logging.getLogger(__name__)
+
+        # Cached email/voice config (the owner's ConfigCache reloads it)
+        if config is None and config_file:
+            config = ConfigFile(config_file, validator=validate_email_config, logger=self.logger)
+        self.config = config
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alert")
+        self.session = None
+        self.latencies = {}
+        self.pending_voice = {}  # idempotency key -> dispatch time of a queued voice alarm
+        self.metrics = None      # optional Metrics registry of the owner
+        if outbox is not None:
+            outbox.add_listener(self.outbox_result)
+
+    def load_config(self):
+        """Cached email config (which also contains voice settings) - no file I/O"""
+        if self.config is None or self.config.signature is None:
+            raise FileNotFoundError("email_config.json not found")
+        return self.config.get()
+
+    def dispatch(self, device_count, device_list, channels=("email", "voice"), key=None):
+        """Queue the notification channels and return immediately"""
+        try:
+            email_config = self.load_config()
+        except Exception as e:
+            self.logger.error(f"📧 Could not load alert config: {e}")
+            return []
+
+        detected_at = datetime.now()
+        messages = []
+        if "email" in channels:
+            messages = self.build_emails(email_config, device_count, device_list, detected_at)
+        futures = []
+
+        if messages:
+            futures.append(self.executor.submit(
+                self.run_channel, "email", self.send_emails, email_config, messages))
+
+        voice_config = email_config.get("voice", {})
+        if "voice" in channels and voice_config.get("enabled", False):
+            # One key per incident: a repeated dispatch cannot ring anyone twice
+            key = f"make-call-{DEVICE_ID}-{key or int(detected_at.timestamp())}"
+            if self.outbox is not None:
+                self.pending_voice.setdefault(key, time.monotonic())
+            futures.append(self.executor.submit(
+                self.run_channel, "voice", self.send_voice, email_config, key))
+        elif "voice" in channels:
+            self.logger.info("Voice calls disabled, skipping...")
+
+        return futures
+
+    def run_channel(self, channel, send, *args):
+        """Run one channel with retry/backoff and record its latency"""
+        started = time.monotonic()
+        delay = self.backoff
+
+        for attempt in range(1, self.retries + 1):
+            try:
+                if send(*args) == QUEUED:
+                    self.logger.info(f"📤 {channel} alerts queued in {time.monotonic() - started:.2f}s")
+                    return True
+                latency = time.monotonic() - started
+                self.latencies[channel] = latency
+                self.record_metrics(channel, latency, "delivered")
+                self.logger.info(f"✅ {channel} alerts delivered in {latency:.2f}s (attempt {attempt})")
+                return True
+            except Exception as e:
+                self.logger.error(f"❌ {channel} alert attempt {attempt}/{self.retries} failed: {e}")
+                if attempt < self.retries:
+                    time.sleep(delay)
+                    delay *= 2
+
+        self.latencies[channel] = None
+        self.record_metrics(channel, time.monotonic() - started, "failed")
+        self.logger.error(f"❌ {channel} alerts gave up after {time.monotonic() - started:.2f}s")
+        return False
+
+    def record_metrics(self, channel, latency, result):
+        if self.metrics is None:
+            return
+        self.metrics.histogram("alert", "Alert channel latency including retries").observe(latency, channel=channel)
+        self.metrics.counter("alerts_total", "Alert channel outcomes").inc(channel=channel, result=result)
+
+    def outbox_result(self, key, outcome, row):
+        """Outbound queue listener: a voice alarm was delivered, expired or refused by the VPS"""
+        if not key.startswith("make-call-"):
+            return
+        started = self.pending_voice.pop(key, None)
+        # Queued before a restart: measure from the enqueue time instead
+        latency = time.monotonic() - started if started is not None else time.time() - row['created']
+        if outcome == "delivered":
+            self.latencies["voice"] = latency
+            self.record_metrics("voice", latency, "delivered")
+            self.logger.info(f"✅ voice alerts delivered in {latency:.2f}s ({row['attempts'] + 1} attempt(s))")
+            return
+
+        self.latencies["voice"] = None
+        self.record_metrics("voice", latency, outcome)
+        self.logger.error(f"📞 Voice alarm not delivered ({outcome} after {row['attempts']} attempt(s))")
+        try:
+            email_config = self.load_config()
+        except Exception as e:
+            self.logger.error(f"📧 Could not load alert config: {e}")
+            return
+        if not email_config.get("email_enabled", False):
+            return
+
+        created = datetime.fromtimestamp(row['created']).strftime("%Y-%m-%d %H:%M:%S")
+        msg = EmailMessage()
+        msg.set_content(f"""⚠️ VOICE ALARM NOT DELIVERED ⚠️
+
+The voice calls for the alarm raised at {created} could not be requested.
+Device ID: {email_config.get("device_id", "Unknown Device")}
+Reason: {outcome} after {row['attempts']} attempt(s), last error: {row['last_error'] or 'none'}
+
+Check the site's connection to the VPS.
+""")
+        msg["Subject"] = f"{email_config.get('subject', 'Security Alert')} - voice alarm not delivered"
+        msg["From"] = email_config["sender_email"]
+        msg["To"] = email_config["recipient_email"]
+        self.executor.submit(self.run_channel, "email", self.send_emails, email_config, [msg])
+
+    def build_emails(self, email_config, device_count, device_list, detected_at):
+        """Build the primary alert and the additional-recipient alerts"""
+        messages = []
+        timestamp = detected_at.strftime("%Y-%m-%d %H:%M:%S")
+
+        if email_config.get("email_enabled", False):
+            msg = EmailMessage()
+            msg.set_content(f"""🚨 SECURITY ALERT 🚨
+
+INTRUSION DETECTED at {timestamp}
+
+Number of devices detected: {device_count}
+Device ID: {email_config.get("device_id", "Unknown Device")}
+Device details:
+{device_list}
+
+System Status: ARMED and TRIGGERED
+Relay: ACTIVATED
+""")
+            msg["Subject"] = email_config["subject"]
+            msg["From"] = email_config["sender_email"]
+            msg["To"] = email_config["recipient_email"]
+            messages.append(msg)
+
+        # Additional recipients are configured on the voice page
+        voice_config = email_config.get("voice", {})
+        if voice_config.get("enabled", False):
+            for key in ("email1", "email2", "email3"):
+                email = voice_config.get(key, "").strip()
+                if not email:
+                    continue
+
+                msg = EmailMessage()
+                msg.set_content(f"""
+SECURITY ALERT - Bluetooth Intrusion Detected
+
+Device ID: {email_config.get('device_id', 'BT-IDS')}
+Time: {timestamp}
+Devices Detected: {device_count}
+
+Device Details:
+{device_list}
+
+This is an automated alert from your Bluetooth Intrusion Detection System.
+""")
+                msg["Subject"] = email_config.get("subject", "Security Alert")
+                msg["From"] = email_config["sender_email"]
+                msg["To"] = email
+                messages.append(msg)
+
+        return messages
+
+    def send_emails(self, email_config, messages):
+        """Send all pending messages over one SMTP session"""
+        server = smtplib.SMTP(email_config["smtp_server"], email_config["smtp_port"], timeout=30)
+        try:
+            server.starttls()
+            server.login(email_config["sender_email"], email_config["sender_password"])
+            # Delivered messages are removed so a retry only resends the rest
+            while messages:
+                server.send_message(messages[0])
+                self.logger.info(f"📧 Email alert sent to {messages[0]['To']}")
+                messages.pop(0)
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+    def send_voice(self, email_config, key=None):
+        """Request all voice calls in one batched make-call request"""
+        voice_config = email_config.get("voice", {})
+        phone_numbers = [format_phone_number(voice_config.get(slot, ""))
+                         for slot in ("phone1", "phone2", "phone3")
+                         if voice_config.get(slot, "").strip()]
+        if not phone_numbers:
+            self.logger.info("📞 No phone numbers configured")
+            self.pending_voice.pop(key, None)
+            return
+
+        payload = {
+            'phone_numbers': phone_numbers,
+            'message': voice_config.get("message", "Security alert detected")[:60],
+            'device_id': DEVICE_ID
+        }
+
+        if self.outbox is not None:
+            self.outbox.enqueue(MAKE_CALL_PATH, payload, priority=PRIORITY_ALARM, key=key)
+            self.logger.info(f"📞 Voice calls queued for {len(phone_numbers)} number(s)")
+            return QUEUED
+
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+
+        response = self.session.post(
+            MAKE_CALL_URL,
+            json=payload,
+            headers={'Idempotency-Key': key} if key else None,
+            timeout=10
+        )
+        if response.status_code != 200:
+            raise Exception(f"API returned {response.status_code}")
+
+        self.logger.info(f"📞 Voice calls requested for {len(phone_numbers)} number(s)")
+
+    def shutdown(self, wait=False):
+        """Stop accepting alerts"""
+        self.executor.shutdown(wait=wait)
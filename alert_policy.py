@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Alert policy for the Bluetooth IDS
+Sits between trigger_alarm and the AlertDispatcher. Repeat triggers within
+a coalescing window update one incident instead of opening a new one. The
+first tier is email; voice calls follow only when the incident persists
+(re-triggers or is still active after escalate_after) or grows. Every
+channel is rate limited by a token bucket. Incident and bucket state is
+saved to disk, so a restarted monitor continues the same incident.
+"""
+
+import json
+import logging
+import os
+
+INCIDENT_FILE = "incidents.json"
+
+TIER_NONE = 0
+TIER_EMAIL = 1
+TIER_VOICE = 2
+
+
+class TokenBucket:
+    def __init__(self, per_hour, burst, tokens=None, updated=None):
+        self.per_hour = per_hour  # refill rate
+        self.burst = burst        # bucket size
+        self.tokens = burst if tokens is None else min(tokens, burst)
+        self.updated = updated
+
+    def refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.per_hour / 3600.0)
+        self.updated = now
+
+    def take(self, now):
+        """Spend one token if there is one"""
+        self.refill(now)
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    def state(self):
+        return [round(self.tokens, 3), self.updated]
+
+
+class AlertPolicy:
+    def __init__(self, dispatcher, path=INCIDENT_FILE, coalesce_window=900.0, escalate_after=120.0,
+                 email_per_hour=6.0, email_burst=3, voice_per_hour=1.0, voice_burst=2, logger=None):
+        self.dispatcher = dispatcher
+        self.path = path
+        self.coalesce_window = coalesce_window  # seconds after the last trigger that repeats merge
+        self.escalate_after = escalate_after    # seconds an incident must stay active before voice
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.buckets = {
+            "email": TokenBucket(email_per_hour, email_burst),
+            "voice": TokenBucket(voice_per_hour, voice_burst)
+        }
+        self.incident = None
+        self.next_id = 1
+        self.device_list = ""  # latest device details for follow-up alerts
+        self.suppressed = dict.fromkeys(self.buckets, 0)
+        self.load()
+
+    # Monitor hooks
+
+    def alarm(self, macs, device_count, device_list, now):
+        """trigger_alarm: open an incident or fold the trigger into the current one"""
+        macs = set(macs)
+        self.device_list = device_list
+        incident = self.incident
+        if incident is not None and now - incident["updated"] <= self.coalesce_window:
+            new_devices = macs - set(incident["devices"])
+            incident["triggers"] += 1
+            incident["updated"] = now
+            incident["active"] = True
+            incident["devices"] = sorted(set(incident["devices"]) | macs)
+            incident["peak"] = max(incident["peak"], len(macs))
+            self.logger.info(f"🧾 Incident {incident['id']} re-triggered ({incident['triggers']} triggers, "
+                             f"{len(new_devices)} new device(s))")
+            if new_devices:
+                self.notify(["email"], device_count, device_list, now, "updated")
+        else:
+            incident = self.incident = {
+                "id": self.next_id,
+                "opened": now,
+                "updated": now,
+                "active": True,
+                "triggers": 1,
+                "devices": sorted(macs),
+                "peak": len(macs),
+                "notified_peak": len(macs),
+                "tier": TIER_NONE,
+                "notified": [],
+                "limited": []
+            }
+            self.next_id += 1
+            self.logger.info(f"🧾 Incident {incident['id']} opened ({device_count} device(s))")
+        # A new incident gets its email here, a repeat may escalate to voice
+        self.escalate(now, device_count)
+        self.save()
+
+    def update(self, now, device_count):
+        """Every tick while the alarm is active: escalate incidents that persist or grow
+
+        device_count is the number of devices present, the same measure as the
+        macs passed to alarm().
+        """
+        if self.incident is None or not self.incident["active"]:
+            return
+        self.incident["peak"] = max(self.incident["peak"], device_count)
+        if self.escalate(now, device_count):
+            self.save()
+
+    def clear(self, now):
+        """Detection cleared - the incident stays open for coalescing until the window passes"""
+        if self.incident is not None and self.incident["active"]:
+            self.incident["active"] = False
+            self.incident["updated"] = now
+            self.save()
+
+    # Policy
+
+    def escalate(self, now, device_count):
+        """Email until one gets through; call once the incident re-triggers, lasts or grows
+
+        The two tiers are independent: a rate limited email must not hold back
+        the call for an incident that keeps going.
+        """
+        incident = self.incident
+        sent = False
+        if "email" not in incident["notified"]:
+            # First email (retried every tick while rate limited)
+            sent = self.notify(["email"], device_count, self.device_list, now, "opened")
+        if "voice" in incident["notified"]:
+            return sent
+        persists = incident["triggers"] > 1 or now - incident["opened"] >= self.escalate_after
+        grows = incident["peak"] > incident["notified_peak"]
+        if persists or grows:
+            sent |= self.notify(["voice"], device_count, self.device_list, now, "grew" if grows else "persists")
+        return sent
+
+    def notify(self, channels, device_count, device_list, now, reason):
+        """Dispatch the channels the token buckets allow; returns True if anything was sent"""
+        incident = self.incident
+        allowed = []
+        for channel in channels:
+            if self.buckets[channel].take(now):
+                allowed.append(channel)
+            else:
+                self.suppressed[channel] += 1
+                if channel not in incident["limited"]:
+                    incident["limited"].append(channel)
+                    self.logger.warning(f"🧾 Incident {incident['id']} {channel} alert rate limited ({reason})")
+        if not allowed:
+            return False
+
+        header = (f"Incident #{incident['id']} {reason} - {incident['triggers']} trigger(s), "
+                  f"{len(incident['devices'])} device(s) since {(now - incident['opened']) / 60:.0f} min ago")
+        self.dispatcher.dispatch(device_count, f"{header}\n{device_list}", channels=allowed,
+                                 key=f"incident-{incident['id']}-{int(incident['opened'])}")
+        incident["tier"] = max(incident["tier"], TIER_VOICE if "voice" in allowed else TIER_EMAIL)
+        incident["notified"] = sorted(set(incident["notified"]) | set(allowed))
+        incident["notified_peak"] = incident["peak"]
+        self.logger.info(f"🧾 Incident {incident['id']} {reason}: {', '.join(allowed)} dispatched")
+        return True
+
+    # Persistence
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+            self.incident = state.get("incident")
+            self.next_id = state.get("next_id", 1)
+            for channel, (tokens, updated) in state.get("buckets", {}).items():
+                if channel in self.buckets:
+                    self.buckets[channel].tokens = min(tokens, self.buckets[channel].burst)
+                    self.buckets[channel].updated = updated
+            if self.incident is not None:
+                # The restarted monitor starts without a detection: wait for a re-trigger
+                self.incident["active"] = False
+                self.logger.info(f"🧾 Resumed incident {self.incident['id']} (tier {self.incident['tier']})")
+        except Exception as e:
+            self.logger.error(f"Error loading incident state: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        state = {
+            "incident": self.incident,
+            "next_id": self.next_id,
+            "buckets": {channel: bucket.state() for channel, bucket in self.buckets.items()}
+        }
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            self.logger.error(f"Error saving incident state: {e}")
+
+    def stats(self):
+        incident = self.incident
+        return {
+            "incident": None if incident is None else {key: incident[key] for key in
+                                                       ("id", "active", "triggers", "peak", "tier")},
+            "tokens": {channel: round(bucket.tokens, 2) for channel, bucket in self.buckets.items()},
+            "suppressed": dict(self.suppressed)
+        }
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Arm state client for the Bluetooth IDS
+Caches the VPS armed flag, refreshes it in the background over a
+keep-alive session and optionally listens on a server-sent event stream
+so arm/disarm reaches the monitor without blocking the event loop
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+VPS_BASE_URL = 'https://admin.securecaller.online'
+
+# What is_armed() reports once the cached state is older than the TTL
+FAIL_POLICIES = ("closed", "open", "last")
+
+
+class ArmStateClient:
+    def __init__(self, base_url=VPS_BASE_URL, refresh_interval=3.0, ttl=30.0,
+                 fail_policy="closed", push_path=None, timeout=5.0, logger=None):
+        if fail_policy not in FAIL_POLICIES:
+            raise ValueError(f"fail_policy must be one of {FAIL_POLICIES}")
+
+        self.base_url = base_url.rstrip('/')
+        self.refresh_interval = refresh_interval  # seconds between background polls
+        self.ttl = ttl                            # seconds a cached state stays trusted
+        self.fail_policy = fail_policy            # closed = armed, open = disarmed, last = last known
+        self.push_path = push_path                # e.g. '/api/status/stream' for SSE push
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+
+        # Cached state
+        self.armed = None
+        self.last_update = None
+        self.reachable = True
+        self.changed = asyncio.Event()
+
+        self.reconnect_listeners = []
+        self.session = None
+        self.loop = None
+        self.tasks = []
+        self.push_stop = threading.Event()
+
+    def add_reconnect_listener(self, callback):
+        """Register callback() called when the VPS answers again after an outage"""
+        self.reconnect_listeners.append(callback)
+
+    def is_armed(self):
+        """Return the cached arm state without any I/O"""
+        if self.armed is not None and self.last_update is not None:
+            if time.monotonic() - self.last_update <= self.ttl:
+                return self.armed
+
+        if self.fail_policy == "closed":
+            return True
+        if self.fail_policy == "last" and self.armed is not None:
+            return self.armed
+        return False
+
+    def update(self, armed):
+        """Store a fresh arm state and wake anyone waiting on a change"""
+        armed = bool(armed)
+        previous = self.armed
+        self.armed = armed
+        self.last_update = time.monotonic()
+
+        if not self.reachable:
+            self.reachable = True
+            self.logger.info("🌐 VPS reachable again")
+            for listener in self.reconnect_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    self.logger.error(f"Reconnect listener error: {e}")
+
+        if previous != armed:
+            self.logger.info(f"VPS armed status: {armed}")
+            self.changed.set()
+
+    def mark_unreachable(self, error):
+        """Record a failed refresh, logging only the first failure in a row"""
+        if self.reachable:
+            self.reachable = False
+            self.logger.warning(f"🌐 Could not check VPS armed state: {error} (fail policy: {self.fail_policy})")
+        else:
+            self.logger.debug(f"Could not check VPS armed state: {error}")
+
+    def get_session(self):
+        """Return the pooled keep-alive session"""
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+        return self.session
+
+    def fetch_status(self):
+        """Blocking GET of /api/status - runs in a worker thread"""
+        response = self.get_session().get(f"{self.base_url}/api/status", timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception(f"API returned {response.status_code}")
+        return response.json().get("armed", False)
+
+    async def refresh(self):
+        """Poll the VPS once without blocking the event loop"""
+        try:
+            armed = await asyncio.to_thread(self.fetch_status)
+            self.update(armed)
+        except Exception as e:
+            self.mark_unreachable(e)
+
+    async def refresh_loop(self):
+        """Background refresher keeping the cache warm"""
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def push_listener(self):
+        """Blocking SSE reader - runs in its own thread and reconnects with backoff"""
+        import requests
+
+        session = requests.Session()
+        backoff = 1.0
+        while not self.push_stop.is_set():
+            try:
+                with session.get(f"{self.base_url}{self.push_path}", stream=True,
+                                 timeout=(self.timeout, 90),
+                                 headers={'Accept': 'text/event-stream'}) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"API returned {response.status_code}")
+                    backoff = 1.0
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        if self.push_stop.is_set():
+                            break
+                        if not line or not line.startswith('data:'):
+                            continue
+                        data = json.loads(line[5:].strip())
+                        if "armed" in data:
+                            self.loop.call_soon_threadsafe(self.update, data["armed"])
+            except Exception as e:
+                self.logger.debug(f"Arm state push channel error: {e}")
+                self.push_stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def start(self):
+        """Prime the cache and start the background refresher (and push channel)"""
+        if self.tasks:
+            return
+        self.loop = asyncio.get_running_loop()
+        await self.refresh()
+        self.tasks.append(asyncio.create_task(self.refresh_loop()))
+        if self.push_path:
+            self.push_stop.clear()
+            threading.Thread(target=self.push_listener, name="arm-state-push", daemon=True).start()
+
+    async def stop(self):
+        """Stop background refresh and push"""
+        self.push_stop.set()
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+
+    async def wait_for_change(self, timeout):
+        """Sleep up to timeout seconds, returning early when the arm state changes
+
+        A change that arrived since the last call (e.g. while the caller was
+        busy applying the previous one) returns straight away.
+        """
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.changed.clear()
+        return True
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Baseline learning and anomaly scoring for the Bluetooth IDS
+Builds per-MAC, per-hour-of-week presence and RSSI profiles from the
+detection history with NumPy and keeps them in baseline_devices.json
+"patterns". The live scorer flags a device only when it is new, present at
+an unusual hour, or at an unusual signal strength for that hour.
+
+Learning is incremental: each run folds in only the sessions recorded since
+"learned_until", after decaying the old statistics by their age. Sessions
+within auto_learn_quiet_time of an alarm are never learned.
+
+Usage:
+    python3 baseline_profile.py learn
+    python3 baseline_profile.py show AA:BB:CC:DD:EE:FF
+    python3 baseline_profile.py score AA:BB:CC:DD:EE:FF --rssi -62
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # required (requirements.txt); without it every device counts as new
+    np = None
+
+from detection_store import HISTORY_DB, DetectionStore
+
+BASELINE_FILE = "baseline_devices.json"
+HOURS_PER_WEEK = 168
+STATS = 4               # per bin: presence seconds, RSSI seconds, RSSI sum, RSSI squared sum
+EPOCH_WEEKDAY = 3       # 1970-01-01 was a Thursday
+
+
+def utc_offset(timestamp=None):
+    """Local UTC offset in seconds at timestamp (bins follow local wall-clock hours)"""
+    return time.localtime(timestamp).tm_gmtoff
+
+
+def hour_of_week(timestamp):
+    """Monday 00:00 local = 0 ... Sunday 23:00 = 167, in the offset in force at timestamp"""
+    local = time.localtime(timestamp)
+    return local.tm_wday * 24 + local.tm_hour
+
+
+def utc_offsets(timestamps):
+    """utc_offset of every timestamp - one localtime() per distinct hour, as offsets change on the hour"""
+    hours, inverse = np.unique(np.floor(timestamps / 3600).astype(np.int64), return_inverse=True)
+    return np.array([utc_offset(float(hour) * 3600) for hour in hours], dtype=float)[inverse.reshape(-1)]
+
+
+def hour_overlaps(starts, ends):
+    """Split [start, end) intervals at hour boundaries
+
+    Returns (interval index, hour-of-week bin, seconds) arrays with one row
+    per hour each interval touches. Each piece is binned by the local time
+    in force at that piece, so history across a DST change lands in the
+    right wall-clock hours.
+    """
+    starts = np.asarray(starts, dtype=float)
+    offsets = utc_offsets(starts)
+    starts = starts + offsets
+    ends = np.maximum(np.asarray(ends, dtype=float) + offsets, starts + 1.0)  # single sightings count 1 s
+
+    first_hour = np.floor(starts / 3600).astype(np.int64)
+    last_hour = np.floor((ends - 1e-6) / 3600).astype(np.int64)
+    spans = last_hour - first_hour + 1
+
+    rows = np.repeat(np.arange(len(starts)), spans)
+    hours = np.repeat(first_hour, spans) + np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    piece_starts = np.maximum(starts[rows], hours * 3600.0)
+    piece_ends = np.minimum(ends[rows], (hours + 1) * 3600.0)
+    # Middle of each piece back in UTC, binned with the offset of that moment
+    middles = (piece_starts + piece_ends) / 2 - offsets[rows]
+    local = middles + utc_offsets(middles)
+    days = np.floor(local / 86400).astype(np.int64)
+    bins = (days + EPOCH_WEEKDAY) % 7 * 24 + np.floor(local / 3600).astype(np.int64) % 24
+    return rows, bins, piece_ends - piece_starts
+
+
+class BaselineProfile:
+    def __init__(self, path=BASELINE_FILE, min_presence=0.05, z_threshold=3.0, min_std=4.0,
+                 quiet_time=1800.0, half_life_days=28.0, logger=None):
+        self.path = path
+        self.min_presence = min_presence      # presence probability below which an hour is unusual
+        self.z_threshold = z_threshold        # RSSI z-score above which a signal is unusual
+        self.min_std = min_std                # dB floor on the RSSI spread
+        self.quiet_time = quiet_time          # seconds around an alarm that are never learned
+        self.half_life_days = half_life_days  # age at which old statistics count half
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.macs = {}           # MAC -> row
+        self.names = []
+        self.stats = None        # (devices, 168, STATS) sufficient statistics
+        self.observed = None     # (168,) seconds of history per bin
+        self.learned_until = None
+
+        # Derived per-bin scoring tables (rebuilt after every change)
+        self.presence = None
+        self.rssi_mean = None
+        self.rssi_std = None
+
+        if np is None:
+            self.logger.error("❌ numpy not installed - learned baselines disabled, every device is scored "
+                              "as new (pip install -r requirements.txt)")
+            return
+        self.stats = np.zeros((0, HOURS_PER_WEEK, STATS))
+        self.observed = np.zeros(HOURS_PER_WEEK)
+        self.load()
+
+    # Scoring
+
+    def score(self, mac, rssi, timestamp=None):
+        """(anomaly score, reason) - O(1); >= 1.0 means outlier"""
+        row = self.macs.get(mac)
+        if row is None or self.presence is None:
+            return math.inf, "new device"
+
+        hour = hour_of_week(time.time() if timestamp is None else timestamp)
+        presence = float(self.presence[row, hour])
+        if presence < self.min_presence:
+            return self.min_presence / max(presence, 1e-9), "unusual hour"
+
+        z = abs(rssi - float(self.rssi_mean[row, hour])) / float(self.rssi_std[row, hour])
+        return z / self.z_threshold, "unusual signal" if z > self.z_threshold else "normal"
+
+    def is_anomalous(self, mac, rssi, timestamp=None):
+        return self.score(mac, rssi, timestamp)[0] >= 1.0
+
+    def rebuild_tables(self):
+        """Turn sufficient statistics into presence/mean/std lookup tables"""
+        seconds, rssi_seconds, rssi_sum, rssi_sq = np.moveaxis(self.stats, 2, 0)
+
+        # Laplace-smoothed fraction of each observed hour the device was present
+        self.presence = (seconds + 1.0) / (self.observed + 2.0)
+
+        # Per-bin RSSI where the bin has data, the device's overall RSSI otherwise
+        with np.errstate(invalid='ignore', divide='ignore'):
+            overall_seconds = rssi_seconds.sum(axis=1, keepdims=True)
+            overall_mean = rssi_sum.sum(axis=1, keepdims=True) / overall_seconds
+            overall_var = rssi_sq.sum(axis=1, keepdims=True) / overall_seconds - overall_mean ** 2
+            mean = np.where(rssi_seconds > 0, rssi_sum / rssi_seconds, overall_mean)
+            var = np.where(rssi_seconds > 0, rssi_sq / rssi_seconds - mean ** 2, overall_var)
+        self.rssi_mean = np.nan_to_num(mean, nan=-100.0)
+        self.rssi_std = np.maximum(np.sqrt(np.clip(np.nan_to_num(var, nan=0.0), 0, None)), self.min_std)
+
+    # Learning
+
+    def row_for(self, mac, name=None):
+        row = self.macs.get(mac)
+        if row is None:
+            row = self.macs[mac] = len(self.names)
+            self.names.append(name or "Unknown")
+        elif name and name != "Unknown":
+            self.names[row] = name
+        return row
+
+    def fold(self, macs, names, starts, ends, rssi):
+        """Add presence sessions to the statistics - vectorized over sessions"""
+        rows = np.fromiter((self.row_for(mac, name) for mac, name in zip(macs, names)),
+                           dtype=np.int64, count=len(macs))
+        if len(self.names) > self.stats.shape[0]:
+            grown = np.zeros((len(self.names), HOURS_PER_WEEK, STATS))
+            grown[:self.stats.shape[0]] = self.stats
+            self.stats = grown
+
+        session, hours, seconds = hour_overlaps(starts, ends)
+        values = np.asarray(rssi, dtype=float)[session]
+        has_rssi = ~np.isnan(values)
+        values = np.where(has_rssi, values, 0.0)
+        rssi_seconds = seconds * has_rssi
+
+        keys = rows[session] * HOURS_PER_WEEK + hours
+        size = self.stats.shape[0] * HOURS_PER_WEEK
+        for column, weights in enumerate((seconds, rssi_seconds, rssi_seconds * values,
+                                          rssi_seconds * values ** 2)):
+            self.stats[:, :, column] += np.bincount(keys, weights=weights, minlength=size).reshape(-1, HOURS_PER_WEEK)
+
+    def learn(self, store, until=None, settle=600.0):
+        """Fold sessions recorded since the last run into the profile
+
+        The window stops settle seconds before now so sessions still being
+        tracked have been written to the history by the time it is learned.
+        """
+        if np is None:
+            return 0
+        until = time.time() - settle if until is None else until
+        since = self.learned_until
+
+        rows = store.sightings(since=since, until=until)
+        if since is None:
+            if not rows:
+                return 0
+            since = min(row['first_seen'] for row in rows)
+        if until <= since:
+            return 0
+
+        # Older statistics fade so the baseline follows the site's routine
+        if self.learned_until is not None and self.half_life_days:
+            decay = 0.5 ** ((until - since) / (self.half_life_days * 86400))
+            self.stats *= decay
+            self.observed *= decay
+
+        _, hours, seconds = hour_overlaps([since], [until])
+        self.observed += np.bincount(hours, weights=seconds, minlength=HOURS_PER_WEEK)
+
+        # Sessions already learned are clipped at the previous boundary
+        first_seen = np.array([row['first_seen'] for row in rows], dtype=float)
+        last_seen = np.array([row['last_seen'] for row in rows], dtype=float)
+        starts = np.maximum(first_seen, since)
+        ends = np.minimum(last_seen, until)
+        keep = (ends > starts) | (first_seen > since)
+
+        alarms = np.sort(np.array([row['timestamp'] for row in store.events(
+            since=since - self.quiet_time, until=until + self.quiet_time, event="ALARM_TRIGGERED")], dtype=float))
+        if len(alarms):
+            nearest = np.searchsorted(alarms, first_seen - self.quiet_time)
+            near_alarm = nearest < len(alarms)
+            near_alarm[near_alarm] = alarms[nearest[near_alarm]] <= last_seen[near_alarm] + self.quiet_time
+            keep &= ~near_alarm
+
+        selected = np.flatnonzero(keep)
+        if len(selected):
+            self.fold([rows[i]['mac'] for i in selected], [rows[i]['name'] for i in selected],
+                      starts[selected], ends[selected],
+                      [math.nan if rows[i]['rssi'] is None else rows[i]['rssi'] for i in selected])
+
+        self.learned_until = until
+        self.rebuild_tables()
+        self.logger.info(f"Baseline learned {len(selected)} of {len(rows)} sessions "
+                         f"({len(self.macs)} devices profiled)")
+        return len(selected)
+
+    def learned(self, db_path=HISTORY_DB, until=None):
+        """Copy of this profile updated from the history database and saved
+
+        Safe to run in a worker thread: it uses its own database connection
+        and leaves this profile untouched for the live scorer.
+        """
+        profile = BaselineProfile(None, self.min_presence, self.z_threshold, self.min_std,
+                                  self.quiet_time, self.half_life_days, self.logger)
+        profile.path = self.path
+        if np is None:
+            return profile
+        profile.macs = dict(self.macs)
+        profile.names = list(self.names)
+        profile.stats = self.stats.copy()
+        profile.observed = self.observed.copy()
+        profile.learned_until = self.learned_until
+
+        store = DetectionStore(db_path, logger=self.logger)
+        try:
+            profile.learn(store, until)
+        finally:
+            store.close()
+        profile.save()
+        return profile
+
+    # Persistence
+
+    def load(self):
+        """Read the "patterns" map from the baseline file"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                baseline = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error loading baseline patterns: {e}")
+            return
+
+        patterns = baseline.get("patterns", {})
+        self.stats = np.zeros((len(patterns), HOURS_PER_WEEK, STATS))
+        for mac, pattern in patterns.items():
+            row = self.row_for(mac, pattern.get("name"))
+            for hour, values in pattern.get("bins", {}).items():
+                self.stats[row, int(hour)] = values
+        if "observed" in baseline:
+            self.observed = np.array(baseline["observed"], dtype=float)
+        self.learned_until = baseline.get("learned_until")
+        if self.macs:
+            self.rebuild_tables()
+
+    def save(self):
+        """Write patterns back, keeping the rest of the baseline file"""
+        if np is None or not self.path:
+            return
+        baseline = {"devices": [], "patterns": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    baseline = json.load(f)
+            except Exception as e:
+                self.logger.error(f"Error reading baseline file: {e}")
+
+        baseline["patterns"] = {
+            mac: {
+                "name": self.names[row],
+                "bins": {str(hour): [round(value, 2) for value in self.stats[row, hour].tolist()]
+                         for hour in np.flatnonzero(self.stats[row, :, 0] > 0).tolist()}
+            }
+            for mac, row in self.macs.items()
+        }
+        baseline["observed"] = [round(value, 1) for value in self.observed.tolist()]
+        baseline["learned_until"] = self.learned_until
+        baseline["last_updated"] = datetime.now().isoformat()
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluetooth IDS baseline profiles")
+    parser.add_argument("--db", default=HISTORY_DB)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("learn", help="fold new history into the baseline")
+
+    show_cmd = sub.add_parser("show", help="print a device's weekly profile")
+    show_cmd.add_argument("mac")
+
+    score_cmd = sub.add_parser("score", help="score one sighting against the baseline")
+    score_cmd.add_argument("mac")
+    score_cmd.add_argument("--rssi", type=float, required=True)
+    score_cmd.add_argument("--at", help="ISO time (default now)")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if np is None:
+        parser.error("numpy is required for baseline learning")
+
+    profile = BaselineProfile(args.baseline)
+    mac = getattr(args, "mac", "").upper()
+
+    if args.command == "learn":
+        started = time.perf_counter()
+        profile = profile.learned(args.db)
+        print(f"{len(profile.macs)} devices profiled in {time.perf_counter() - started:.2f} s")
+    elif args.command == "show":
+        if mac not in profile.macs:
+            parser.error(f"{mac} has no profile")
+        row = profile.macs[mac]
+        print(f"{mac} ({profile.names[row]})")
+        for day_index, day in enumerate(("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")):
+            hours = range(day_index * 24, day_index * 24 + 24)
+            print(f"  {day} " + "".join(" .:-=+*#%@"[min(9, int(profile.presence[row, hour] * 10))]
+                                        for hour in hours))
+    elif args.command == "score":
+        timestamp = datetime.fromisoformat(args.at).timestamp() if args.at else time.time()
+        score, reason = profile.score(mac, args.rssi, timestamp)
+        print(f"{mac}: score {score:.2f} ({reason})")
+
+
+if __name__ == "__main__":
+    main()
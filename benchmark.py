@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Detection pipeline benchmark for the Bluetooth IDS
+Replays a synthetic crowd (or a recorded trace) through the real
+RemoteSiteIDS detection code in virtual time - no Pi, radio or GPIO needed
+
+Usage:
+    python3 benchmark.py --devices 500 --hours 12
+    python3 benchmark.py --trace night.btr --memory
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from simulation import SyntheticCrowd, build_simulated_ids, load_trace
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_virtual(ids, tick, start, end):
+    """Drive scan/process ticks over virtual time and collect timings"""
+    scanner = ids.scanner
+    tick_times = []
+    dispatch_times = []
+    advertisements = 0
+
+    # Time how long trigger_alarm blocks the loop on notifications
+    dispatch = ids.dispatcher.dispatch
+    futures = []
+
+    def timed_dispatch(*args, **kwargs):
+        started = time.perf_counter()
+        futures.extend(dispatch(*args, **kwargs))
+        dispatch_times.append(time.perf_counter() - started)
+        return futures
+
+    ids.dispatcher.dispatch = timed_dispatch
+
+    # Recorded traces are in the past: start the virtual clock at the trace
+    now = start
+    ids.clock.now = start
+    while now <= end and not (scanner.exhausted and not ids.tracker.devices):
+        ids.clock.advance_to(now)
+        started = time.perf_counter()
+        advertisements += scanner.advance_to(now)
+        found_devices = await ids.scan_devices()
+        ids.process_detections(found_devices)
+        if ids.alarm_active:
+            ids.alerts.update(now, len(ids.detected_devices))
+        if ids.telemetry:
+            ids.telemetry.tick(now)
+        tick_times.append(time.perf_counter() - started)
+        now += tick
+
+    return {
+        'advertisements': advertisements,
+        'tick_times': tick_times,
+        'dispatch_times': dispatch_times,
+        'futures': futures,
+        'virtual_seconds': now - start
+    }
+
+
+def report(results, ids, wall, memory, tick):
+    ticks = results['tick_times']
+    print("=" * 50)
+    print(f"Virtual time replayed:   {results['virtual_seconds'] / 3600:.2f} h in {wall:.2f} s wall")
+    print(f"Advertisements:          {results['advertisements']} ({results['advertisements'] / wall:,.0f}/s)")
+    print(f"Detection ticks:         {len(ticks)} ({len(ticks) / wall:,.0f} scans/s)")
+    print(f"Tick processing:         p50 {percentile(ticks, 0.5) * 1e6:.0f} us, "
+          f"p99 {percentile(ticks, 0.99) * 1e6:.0f} us, max {max(ticks, default=0) * 1e6:.0f} us")
+
+    print(f"Adv-to-decision latency: <= {tick:.2f} s tick wait + {percentile(ticks, 0.99) * 1e3:.2f} ms (p99)")
+    relay_changes = [entry for entry in ids.gpio.history if entry[2] == ids.gpio.HIGH]
+    print(f"Alarms triggered:        {len(relay_changes)}")
+
+    dispatch = results['dispatch_times']
+    if dispatch:
+        print(f"Alert dispatch blocking: max {max(dispatch) * 1e3:.2f} ms")
+    for channel, latency in ids.dispatcher.latencies.items():
+        print(f"Alert channel {channel:<10} {latency:.2f} s" if latency is not None else
+              f"Alert channel {channel:<10} failed")
+
+    print(f"Tracked devices at end:  {len(ids.tracker.devices)}")
+    power = ids.scan_scheduler.stats(ids.clock())
+    if power["radio_duty"] is not None:
+        modes = ", ".join(f"{mode} {stats['seconds'] / 3600:.2f} h" for mode, stats in power["modes"].items())
+        print(f"Radio on:                {power['radio_on_seconds'] / 3600:.2f} h "
+              f"({100 * power['radio_duty']:.0f}% duty; {modes})")
+    if ids.telemetry:
+        telemetry = ids.telemetry.stats()
+        days = max(results['virtual_seconds'], 1.0) / 86400
+        print(f"Telemetry uplink:        {telemetry['batches']} batches, {telemetry['bytes'] / 1024:.1f} KB "
+              f"({telemetry['bytes'] / 1024 / days:.0f} KB/day)")
+    print(f"Max RSS:                 {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    if memory:
+        print(f"Python heap growth:      {memory[0] / 1024:.1f} KB (peak {memory[1] / 1024:.1f} KB)")
+    print("=" * 50)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IDS detection pipeline without hardware")
+    parser.add_argument("--devices", type=int, default=500, help="synthetic devices over the run")
+    parser.add_argument("--hours", type=float, default=12.0, help="virtual duration")
+    parser.add_argument("--residents", type=float, default=0.1, help="fraction of devices present all night")
+    parser.add_argument("--intruders", type=int, default=3)
+    parser.add_argument("--adv-interval", type=float, default=1.0, help="seconds between advertisements per device")
+    parser.add_argument("--tick", type=float, default=1.0, help="detection tick in seconds")
+    parser.add_argument("--trace", help="replay a .btr trace or CSV trace (timestamp,mac,name,rssi) instead")
+    parser.add_argument("--email-latency", type=float, default=0.5)
+    parser.add_argument("--voice-latency", type=float, default=1.0)
+    parser.add_argument("--memory", action="store_true", help="track Python heap growth (slower)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    # Logs, event CSV, history DB and outbox go to a scratch directory removed afterwards;
+    # thresholds come from the repo
+    config_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bt_ids_config.json")
+    if args.trace:
+        args.trace = os.path.abspath(args.trace)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ids-bench-") as scratch:
+        os.chdir(scratch)
+        try:
+            shutil.copy(config_file, "bt_ids_config.json")
+            await benchmark(args)
+        finally:
+            os.chdir(cwd)
+
+
+async def benchmark(args):
+    """One benchmark run in the current (scratch) directory"""
+
+    if args.trace:
+        advertisements = list(load_trace(args.trace))
+        start = advertisements[0][0] if advertisements else 0.0
+        end = advertisements[-1][0] if advertisements else 0.0
+    else:
+        start = time.time()
+        end = start + args.hours * 3600
+        advertisements = SyntheticCrowd(args.devices, args.hours * 3600, start=start,
+                                        residents=args.residents, intruders=args.intruders,
+                                        adv_interval=args.adv_interval)
+        # Residents belong to the site: keep them out the way ignore_devices.txt would
+        with open("ignore_devices.txt", "w") as f:
+            f.write("\n".join(advertisements.residents) + "\n")
+
+    ids = build_simulated_ids(advertisements, email_latency=args.email_latency,
+                              voice_latency=args.voice_latency)
+
+    if args.memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    results = await run_virtual(ids, args.tick, start, end)
+    wall = time.perf_counter() - started
+
+    memory = None
+    if args.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        memory = (current - baseline, peak - baseline)
+        tracemalloc.stop()
+
+    # Let the simulated notifications finish so their latency is reported
+    for future in results['futures']:
+        future.result()
+
+    report(results, ids, wall, memory, args.tick)
+    ids.dispatcher.shutdown(wait=True)
+    ids.outbox.close()
+    ids.event_sink.close()
+    ids.history.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
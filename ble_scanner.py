@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Continuous BLE scanner for the Bluetooth IDS
+Keeps one BlueZ discovery session open per local adapter and feeds every
+advertisement into one in-memory sighting table that the detection loop
+reads on its own tick
+"""
+
+import asyncio
+import functools
+import logging
+import time
+
+
+class ContinuousScanner:
+    def __init__(self, adapter="hci0", sighting_window=15.0, device_filter=None, logger=None):
+        # One adapter name, a comma-separated list or a list of names
+        # (none = fusion-only aggregator without a local radio)
+        self.adapters = [name for name in (adapter.split(",") if isinstance(adapter, str) else adapter)
+                         if name and name != "none"]
+        self.adapter = ",".join(self.adapters)
+        self.sighting_window = sighting_window  # seconds a sighting stays "present"
+        self.device_filter = device_filter      # DeviceFilter applied before the table
+        self.logger = logger or logging.getLogger(__name__)
+
+        # State tracking
+        self.scanners = []
+        self.own_addresses = {}
+        self.running = False
+        self.sightings = {}
+        self.listeners = []
+        self.advertisement_count = 0
+        self.started_at = None
+        self.sessions = 0  # discovery sessions started (duty cycling starts many)
+
+    def add_listener(self, callback):
+        """Register callback(mac, sighting) called for every advertisement"""
+        self.listeners.append(callback)
+
+    def detection_callback(self, device, advertisement_data, adapter=None):
+        """Bleak detection callback - runs on the event loop for every advertisement"""
+        address_type = None
+        if isinstance(device, str):
+            mac = device.upper()
+            name = "Unknown"
+        else:
+            mac = device.address.upper()
+            name = device.name or advertisement_data.local_name or "Unknown"
+            details = device.details if isinstance(device.details, dict) else {}
+            address_type = details.get('props', {}).get('AddressType')
+
+        rssi = advertisement_data.rssi if advertisement_data.rssi is not None else -100
+
+        self.record(mac, {
+            'name': name,
+            'signal': rssi,
+            'last_seen': time.time(),
+            'manufacturer_data': advertisement_data.manufacturer_data,
+            'service_uuids': advertisement_data.service_uuids,
+            'tx_power': advertisement_data.tx_power,
+            'address_type': address_type,
+            'adapter': adapter or self.adapter,
+            'transport': "le"
+        })
+
+    def record(self, mac, sighting):
+        """Store a sighting and notify listeners"""
+        self.advertisement_count += 1
+        if self.device_filter is not None and self.device_filter.is_ignored(mac):
+            return
+
+        self.sightings[mac] = sighting
+
+        for listener in self.listeners:
+            try:
+                listener(mac, sighting)
+            except Exception as e:
+                self.logger.error(f"Sighting listener error: {e}")
+
+    async def start(self):
+        """Start a long-lived discovery session on every adapter concurrently"""
+        if self.running:
+            return
+
+        if self.adapters:
+            from bleak import BleakScanner
+
+            await asyncio.gather(*(self.resolve_own_address(adapter) for adapter in self.adapters))
+            scanners = [
+                BleakScanner(
+                    detection_callback=functools.partial(self.detection_callback, adapter=adapter),
+                    adapter=adapter
+                )
+                for adapter in self.adapters
+            ]
+            results = await asyncio.gather(*(scanner.start() for scanner in scanners), return_exceptions=True)
+
+            for adapter, scanner, result in zip(self.adapters, scanners, results):
+                if isinstance(result, Exception):
+                    self.logger.error(f"Error starting scanner on {adapter}: {result}")
+                else:
+                    self.scanners.append(scanner)
+            if not self.scanners:
+                raise RuntimeError(f"no adapter could scan ({self.adapter})")
+
+        self.running = True
+        self.started_at = time.time()
+        self.sessions += 1
+        self.logger.log(logging.INFO if self.sessions == 1 else logging.DEBUG,
+                        f"📡 Continuous scanning started on {self.adapter or 'no local adapter'}")
+
+    async def resolve_own_address(self, adapter):
+        """Add an adapter's address to the device filter (once)"""
+        if self.device_filter is None or adapter in self.own_addresses:
+            return
+        try:
+            from device_filter import resolve_adapter_address
+            self.own_addresses[adapter] = await resolve_adapter_address(adapter)
+            self.device_filter.add_own_address(self.own_addresses[adapter])
+        except Exception as e:
+            self.logger.error(f"Error getting Pi MAC for {adapter}: {e}")
+
+    async def stop(self):
+        """Stop the discovery sessions"""
+        if not self.running:
+            return
+
+        self.running = False
+        results = await asyncio.gather(*(scanner.stop() for scanner in self.scanners), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                self.logger.error(f"Error stopping scanner: {result}")
+        self.scanners = []
+        self.logger.log(logging.INFO if self.sessions == 1 else logging.DEBUG,
+                        f"📡 Continuous scanning stopped on {self.adapter}")
+
+    def recent(self, window=None, now=None):
+        """Return sightings seen within the window, dropping stale entries
+
+        Classic inquiry results carry a longer 'hold' - they only arrive once
+        per inquiry period.
+        """
+        window = self.sighting_window if window is None else window
+        now = time.time() if now is None else now
+        cutoff = now - window
+
+        stale = [mac for mac, info in self.sightings.items()
+                 if info['last_seen'] < cutoff and info['last_seen'] < now - info.get('hold', 0)]
+        for mac in stale:
+            del self.sightings[mac]
+
+        return dict(self.sightings)
+
+    def apply_filter(self):
+        """Drop sightings that the device filter now ignores"""
+        if self.device_filter is None:
+            return
+        self.sightings = {mac: info for mac, info in self.sightings.items()
+                          if not self.device_filter.is_ignored(mac)}
+
+    def clear(self):
+        """Forget all sightings"""
+        self.sightings = {}
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Classic Bluetooth (BR/EDR) inquiry for the Bluetooth IDS
+Many phones, headsets and car kits are only discoverable by inquiry, which
+BLE scanning never sees. This source opens short BR/EDR discovery windows
+through BlueZ over D-Bus on the scanner's event loop, and feeds the results
+into the scanner's sighting table tagged transport "bredr".
+
+BlueZ merges the discovery filters of all its clients, so while a window is
+open the controller interleaves inquiry with the BLE scan instead of
+replacing it. Windows are short and only opened while the BLE radio is on,
+so the duty cycle and most of the BLE scan time are left alone. Inquiry
+results only arrive once per period, so each one is held as present for
+a whole period instead of the BLE sighting window.
+"""
+
+import asyncio
+import logging
+import time
+
+DEVICE_INTERFACE = "org.bluez.Device1"
+
+# One inquiry length is 1.28 s; 4 of them find most discoverable devices
+DEFAULT_WINDOW = 5.12
+DEFAULT_PERIOD = 30.0
+
+
+class ClassicInquiry:
+    def __init__(self, scanner, adapter="hci0", window=DEFAULT_WINDOW, period=DEFAULT_PERIOD, logger=None):
+        self.scanner = scanner  # ContinuousScanner whose table and listeners get the results
+        self.adapter = adapter
+        self.window = window    # seconds of inquiry per period
+        self.period = period    # seconds between window starts (0 = off)
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.bus = None
+        self.task = None
+        self.devices = {}       # D-Bus object path -> Device1 properties seen so far
+        self.inquiring = False
+        self.windows = 0
+        self.results = 0
+        self.inquiry_time = 0.0
+
+    @property
+    def hold(self):
+        """Seconds a result stays present: until the next window has had its chance"""
+        return self.period + self.window + 2.0
+
+    async def start(self):
+        if self.task is None and self.period > 0:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.end_window()
+        if self.bus is not None:
+            self.bus.disconnect()
+            self.bus = None
+
+    async def run(self):
+        """Open a window every period while the BLE radio is on"""
+        while True:
+            if self.period <= 0 or not self.scanner.running:
+                await asyncio.sleep(1.0)
+                continue
+            started = time.monotonic()
+            try:
+                await self.inquire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Classic inquiry on {self.adapter} failed: {e}")
+                await self.end_window()
+                if self.bus is not None:
+                    self.bus.disconnect()
+                    self.bus = None
+                await asyncio.sleep(60.0)
+                continue
+            await asyncio.sleep(max(0.0, self.period - (time.monotonic() - started)))
+
+    async def inquire(self):
+        """One inquiry window, closed early if the duty cycle turns the radio off"""
+        if self.bus is None:
+            await self.connect()
+        await self.call(f"/org/bluez/{self.adapter}", "org.bluez.Adapter1", "SetDiscoveryFilter", "a{sv}",
+                        [self.discovery_filter()])
+        # Results can arrive before StartDiscovery returns
+        self.inquiring = True
+        self.windows += 1
+        started = time.monotonic()
+        await self.call(f"/org/bluez/{self.adapter}", "org.bluez.Adapter1", "StartDiscovery")
+        try:
+            while time.monotonic() - started < self.window and self.scanner.running:
+                await asyncio.sleep(min(0.5, self.window - (time.monotonic() - started)))
+        finally:
+            self.inquiry_time += time.monotonic() - started
+            await self.end_window()
+
+    async def end_window(self):
+        if not self.inquiring:
+            return
+        self.inquiring = False
+        try:
+            await self.call(f"/org/bluez/{self.adapter}", "org.bluez.Adapter1", "StopDiscovery")
+        except Exception as e:
+            self.logger.debug(f"Stopping classic inquiry: {e}")
+
+    @staticmethod
+    def discovery_filter():
+        from dbus_fast import Variant
+        return {"Transport": Variant("s", "bredr"), "DuplicateData": Variant("b", True)}
+
+    async def connect(self):
+        """Own system bus connection: discovery sessions and filters are per D-Bus client"""
+        from dbus_fast import BusType
+        from dbus_fast.aio import MessageBus
+
+        self.bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+        self.bus.add_message_handler(self.on_message)
+        for rule in (
+            "type='signal',sender='org.bluez',interface='org.freedesktop.DBus.ObjectManager',"
+            "member='InterfacesAdded'",
+            "type='signal',sender='org.bluez',interface='org.freedesktop.DBus.ObjectManager',"
+            "member='InterfacesRemoved'",
+            "type='signal',sender='org.bluez',interface='org.freedesktop.DBus.Properties',"
+            f"member='PropertiesChanged',path_namespace='/org/bluez/{self.adapter}'"
+        ):
+            await self.call("/org/freedesktop/DBus", "org.freedesktop.DBus", "AddMatch", "s", [rule],
+                            destination="org.freedesktop.DBus")
+
+        # Devices BlueZ already knows: properties for later RSSI-only updates
+        reply = await self.call("/", "org.freedesktop.DBus.ObjectManager", "GetManagedObjects")
+        for path, interfaces in reply.body[0].items():
+            if DEVICE_INTERFACE in interfaces and path.startswith(f"/org/bluez/{self.adapter}/"):
+                self.devices[path] = self.unpack(interfaces[DEVICE_INTERFACE])
+        self.logger.info(f"📻 Classic inquiry on {self.adapter}: {self.window:g}s every {self.period:g}s")
+
+    async def call(self, path, interface, member, signature="", body=None, destination="org.bluez"):
+        from dbus_fast import Message, MessageType
+
+        reply = await self.bus.call(Message(destination=destination, path=path, interface=interface,
+                                            member=member, signature=signature, body=body or []))
+        if reply.message_type == MessageType.ERROR:
+            raise Exception(f"{reply.error_name}: {reply.body[0] if reply.body else ''}")
+        return reply
+
+    @staticmethod
+    def unpack(properties):
+        return {name: getattr(value, "value", value) for name, value in properties.items()}
+
+    def on_message(self, message):
+        """D-Bus signal handler - runs on the event loop"""
+        if message.member == "InterfacesAdded":
+            path, interfaces = message.body
+            if DEVICE_INTERFACE not in interfaces or not path.startswith(f"/org/bluez/{self.adapter}/"):
+                return
+            properties = self.devices.setdefault(path, {})
+            properties.update(self.unpack(interfaces[DEVICE_INTERFACE]))
+            self.report(properties)
+        elif message.member == "InterfacesRemoved":
+            # BlueZ forgets devices it has not seen for a while - so do we
+            path, interfaces = message.body
+            if DEVICE_INTERFACE in interfaces:
+                self.devices.pop(path, None)
+        elif message.member == "PropertiesChanged":
+            interface, changed, _invalidated = message.body
+            if interface != DEVICE_INTERFACE:
+                return
+            properties = self.devices.setdefault(message.path, {})
+            properties.update(self.unpack(changed))
+            if "RSSI" in changed:
+                self.report(properties)
+
+    def report(self, properties):
+        """Feed an inquiry result into the scanner's table"""
+        # Only results of our own windows; Class of Device marks a BR/EDR device
+        if not self.inquiring or "RSSI" not in properties or "Class" not in properties:
+            return
+        address = properties.get("Address")
+        if not address:
+            return
+        self.results += 1
+        self.scanner.record(address.upper(), {
+            'name': properties.get("Name") or "Unknown",
+            'signal': properties["RSSI"],
+            'last_seen': time.time(),
+            'manufacturer_data': None,
+            'service_uuids': properties.get("UUIDs"),
+            'tx_power': None,
+            'address_type': "public",
+            'device_class': properties["Class"],
+            'adapter': self.adapter,
+            'transport': "bredr",
+            'hold': self.hold
+        })
+
+    def stats(self):
+        return {
+            "windows": self.windows,
+            "results": self.results,
+            "inquiry_seconds": round(self.inquiry_time, 1)
+        }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Shared configuration cache for the Bluetooth IDS
+Loads and validates each JSON config file once, hands consumers a parsed
+snapshot without any file I/O, and hot-reloads a file when its inode, mtime or
+size changes. A reload that fails to parse or validate keeps the previous
+snapshot. Snapshots are swapped atomically and must be treated as read-only.
+"""
+
+import json
+import logging
+import os
+import time
+
+from arm_state import FAIL_POLICIES
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def config_path(name):
+    """Config files live next to the scripts, wherever they are installed"""
+    return os.path.join(SCRIPT_DIR, name)
+
+
+def require(config, key, kind, check=None, message=None):
+    """Validate one optional key in place (ints are accepted where floats are)"""
+    if key not in config or config[key] is None:
+        return
+    value = config[key]
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        value = config[key] = float(value)
+    if not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+        raise ValueError(f"{key} must be {kind.__name__}, not {type(value).__name__}")
+    if check is not None and not check(value):
+        raise ValueError(f"{key} {message or 'is out of range'}: {value!r}")
+
+
+def validate_email_config(config):
+    require(config, "email_enabled", bool)
+    require(config, "smtp_port", int, lambda port: 0 < port < 65536)
+    require(config, "voice", dict)
+    if config.get("email_enabled"):
+        for key in ("smtp_server", "sender_email", "recipient_email"):
+            if not config.get(key):
+                raise ValueError(f"{key} is required when email is enabled")
+    return config
+
+
+def validate_detection_config(config):
+    require(config, "signal_threshold", float, lambda dbm: -127 <= dbm <= 0)
+    require(config, "confidence_threshold", int, lambda count: count >= 1)
+    require(config, "relay_pin", int, lambda pin: 0 <= pin <= 27, "is not a BCM GPIO")
+    require(config, "auto_learn_quiet_time", float, lambda seconds: seconds >= 0)
+    require(config, "adapters", list)
+    require(config, "fail_policy", str, lambda policy: policy in FAIL_POLICIES, f"must be one of {FAIL_POLICIES}")
+    for key in ("quiet_scan_on", "disarmed_scan_on"):
+        require(config, key, float, lambda seconds: seconds >= 0)
+    for key in ("quiet_scan_period", "disarmed_scan_period"):
+        require(config, key, float, lambda seconds: seconds > 0)
+    for key in ("alert_coalesce_window", "alert_escalate_after"):
+        require(config, key, float, lambda seconds: seconds >= 0)
+    require(config, "classic_inquiry_window", float, lambda seconds: 1.28 <= seconds <= 61.44,
+            "must be 1.28-61.44 s (1-48 inquiry lengths)")
+    require(config, "classic_inquiry_period", float, lambda seconds: seconds >= 0)
+    if config.get("classic_inquiry_period") and config["classic_inquiry_period"] < config.get(
+            "classic_inquiry_window", 5.12) * 2:
+        raise ValueError("classic_inquiry_period must be at least twice the window (or 0 = off)")
+    return config
+
+
+def validate_ids_config(config):
+    require(config, "trigger_threshold", float, lambda seconds: seconds > 0)
+    require(config, "scan_interval", float, lambda seconds: seconds > 0)
+    require(config, "schedule", dict)
+    return config
+
+
+class ConfigFile:
+    def __init__(self, path, defaults=None, validator=None, logger=None):
+        self.path = path
+        self.defaults = defaults or {}
+        self.validator = validator
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.snapshot = dict(self.defaults)
+        self.signature = None
+        self.listeners = []
+        self.load()
+
+    def get(self):
+        """Current parsed config - no I/O"""
+        return self.snapshot
+
+    def add_listener(self, callback):
+        """Register callback(snapshot) called after every successful reload"""
+        self.listeners.append(callback)
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def maybe_reload(self):
+        """Reload if the file changed on disk - one stat()"""
+        if self.file_signature() == self.signature:
+            return False
+        return self.load()
+
+    def load(self):
+        """Parse and validate, then swap the new snapshot in"""
+        self.signature = self.file_signature()
+        if self.signature is None:
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                config = dict(self.defaults, **json.load(f))
+            if self.validator is not None:
+                config = self.validator(config)
+        except Exception as e:
+            self.logger.error(f"Invalid config {os.path.basename(self.path)} - keeping previous values: {e}")
+            return False
+
+        self.snapshot = config
+        for listener in self.listeners:
+            try:
+                listener(config)
+            except Exception as e:
+                self.logger.error(f"Config listener error: {e}")
+        return True
+
+
+class ConfigCache:
+    """Every config file of the IDS, checked for changes at most once per interval"""
+
+    def __init__(self, directory=SCRIPT_DIR, reload_interval=1.0, logger=None):
+        self.directory = directory
+        self.reload_interval = reload_interval  # seconds between mtime checks
+        self.logger = logger or logging.getLogger(__name__)
+        self.files = {}
+        self.last_check = time.monotonic()
+
+        self.register("email", "email_config.json", validator=validate_email_config)
+        self.register("detection", "bt_ids_config.json", validator=validate_detection_config)
+        self.register("ids", "ids_config.json", validator=validate_ids_config)
+
+    def register(self, name, filename, defaults=None, validator=None):
+        self.files[name] = ConfigFile(os.path.join(self.directory, filename), defaults, validator, self.logger)
+        return self.files[name]
+
+    def get(self, name):
+        return self.files[name].get()
+
+    def file(self, name):
+        return self.files[name]
+
+    def maybe_reload(self):
+        """Pick up edits to any config file - cheap enough to call every tick"""
+        now = time.monotonic()
+        if now - self.last_check < self.reload_interval:
+            return False
+        self.last_check = now
+
+        changed = False
+        for config_file in self.files.values():
+            if config_file.maybe_reload():
+                self.logger.info(f"🔧 Reloaded {os.path.basename(config_file.path)}")
+                changed = True
+        return changed
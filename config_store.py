@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Atomic, versioned config store for the Bluetooth IDS
+ids_config.json is written by the schedule daemon and the web UI. Every
+write here happens under an exclusive lock, goes to a temp file that is
+fsynced and renamed over the original (readers never see a partial file),
+and bumps a monotonic "version" field. Updates are read-modify-write under
+the lock, or compare-and-swap against the version the caller last read, so
+concurrent writers can no longer lose each other's changes. An update that
+changes nothing writes nothing.
+
+Readers are notified of changes instead of polling: listeners are called
+for writes made through the store and for changes seen on disk, and
+wait_for_change() blocks on inotify (falling back to stat polling where
+inotify is unavailable).
+"""
+
+import ctypes
+import ctypes.util
+import fcntl
+import json
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+VERSION_KEY = "version"
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class VersionConflict(Exception):
+    """The config changed since the caller read it"""
+
+    def __init__(self, expected, actual):
+        super().__init__(f"config is at version {actual}, expected {expected}")
+        self.expected = expected
+        self.actual = actual
+
+
+class FileWatcher:
+    """inotify on the file's directory, filtered to the file name (renames included)"""
+
+    def __init__(self, path):
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = None
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            return
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return
+            directory = os.fsencode(os.path.dirname(os.path.abspath(path)))
+            if libc.inotify_add_watch(fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+        except (OSError, AttributeError):
+            self.fd = None
+
+    def drain(self):
+        """Consume pending events - True if any of them was for our file"""
+        touched = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return touched
+            offset = 0
+            while offset < len(data):
+                _wd, _mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                if data[offset:offset + length].rstrip(b"\0") == self.name:
+                    touched = True
+                offset += length
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class ConfigStore:
+    def __init__(self, path, poll_interval=0.5, logger=None):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.poll_interval = poll_interval  # seconds between stat checks without inotify
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.version = 0
+        self.config = {}
+        self.signature = None
+        self.listeners = []
+        self.mutex = threading.Lock()
+        self.writes = 0
+        self.watcher = FileWatcher(path)
+        if self.watcher.fd is None:
+            self.logger.debug("inotify unavailable - config changes are polled")
+        self.read()
+
+    # Reading
+
+    def add_listener(self, callback):
+        """Register callback(version, config) called after every change"""
+        self.listeners.append(callback)
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def load(self):
+        """(version, config) straight from disk"""
+        with open(self.path, 'r') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError("config is not a JSON object")
+        return config.get(VERSION_KEY, 0), config
+
+    def read(self):
+        """Latest (version, config); the file is only parsed when it changed"""
+        with self.mutex:
+            return self.refresh()
+
+    def refresh(self):
+        signature = self.file_signature()
+        if signature is None or signature == self.signature:
+            return self.version, self.config
+        try:
+            version, config = self.load()
+        except Exception as e:
+            # Half-written by a writer that bypasses the store - keep the last good copy
+            self.logger.error(f"Error loading config: {e}")
+            return self.version, self.config
+        # A writer that does not know about versions still counts as a change
+        if self.signature is not None and version <= self.version:
+            version = self.version + 1
+        self.signature = signature
+        self.version, self.config = version, config
+        self.notify()
+        return self.version, self.config
+
+    def notify(self):
+        for listener in self.listeners:
+            try:
+                listener(self.version, self.config)
+            except Exception as e:
+                self.logger.error(f"Config listener error: {e}")
+
+    def wait_for_change(self, version, timeout, wake_fd=None):
+        """Block until the config is newer than version, timeout passes or wake_fd is readable
+
+        Returns True when the config changed.
+        """
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            if self.read()[0] != version:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            fds = [fd for fd in (self.watcher.fd, wake_fd) if fd is not None]
+            slice_ = remaining if self.watcher.fd is not None else min(self.poll_interval, remaining)
+            readable, _, _ = select.select(fds, [], [], slice_)
+            if wake_fd is not None and wake_fd in readable:
+                return self.read()[0] != version
+            if self.watcher.fd in readable:
+                self.watcher.drain()
+
+    # Writing
+
+    def update(self, mutate, expected_version=None):
+        """Apply mutate(config) to the latest config under the lock and save it atomically
+
+        mutate edits the dict it is given (or returns a replacement). With
+        expected_version the update is a compare-and-swap and raises
+        VersionConflict if anyone wrote in between. Returns the new version;
+        nothing is written when the config did not change.
+        """
+        with self.mutex, open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have written since our last read
+            version, current = self.refresh()
+            if expected_version is not None and expected_version != version:
+                raise VersionConflict(expected_version, version)
+
+            config = json.loads(json.dumps(current))  # deep copy - snapshots are shared
+            config = mutate(config) or config
+            config.pop(VERSION_KEY, None)
+            if config == {key: value for key, value in current.items() if key != VERSION_KEY}:
+                return version
+
+            config[VERSION_KEY] = version + 1
+            self.write(config)
+            self.signature = self.file_signature()
+            self.version, self.config = config[VERSION_KEY], config
+            self.writes += 1
+            self.notify()
+            return self.version
+
+    def compare_and_swap(self, expected_version, config):
+        """Replace the whole config if nobody wrote since expected_version - returns success"""
+        try:
+            self.update(lambda _current: dict(config), expected_version=expected_version)
+            return True
+        except VersionConflict as e:
+            self.logger.warning(f"Config update rejected: {e}")
+            return False
+
+    def write(self, config):
+        """Temp file, fsync, rename, fsync the directory"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+
+    def close(self):
+        self.watcher.close()
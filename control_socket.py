@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Local control socket for the Bluetooth IDS
+The monitor stays resident and listens on a Unix socket for arm/disarm/status
+commands from the schedule daemon, one JSON object per line
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+
+CONTROL_SOCKET = "/home/andrewdarr/intrusion/ids_control.sock"
+
+
+class ControlServer:
+    def __init__(self, path, handler, logger=None):
+        self.path = path
+        self.handler = handler  # handler(command_dict) -> reply dict
+        self.logger = logger or logging.getLogger(__name__)
+        self.server = None
+
+    async def start(self):
+        """Listen on the Unix socket (owner-only permissions)"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        self.logger.info(f"🎛️  Control socket listening on {self.path}")
+
+    async def stop(self):
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+        self.server = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def handle_client(self, reader, writer):
+        """Answer each command line with one reply line"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.handler(json.loads(line))
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except Exception as e:
+            self.logger.debug(f"Control client error: {e}")
+        finally:
+            writer.close()
+
+
+def send_command(path, command, timeout=2.0, **fields):
+    """Send one command to the monitor and return its reply (blocking)"""
+    request = dict(fields, command=command)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile('rb') as f:
+            reply = f.readline()
+    if not reply:
+        raise ConnectionError("monitor closed the control socket")
+    return json.loads(reply)
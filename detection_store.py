@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Detection history store for the Bluetooth IDS
+SQLite database indexed by time, MAC and event so the dashboard can answer
+"when was this MAC last seen" or "alarms this week" without scanning CSV files
+
+Usage:
+    python3 detection_store.py import detections.csv remote_detections.csv
+    python3 detection_store.py last-seen AA:BB:CC:DD:EE:FF
+    python3 detection_store.py alarms --days 7
+    python3 detection_store.py retention --keep-days 180 --downsample-days 14
+"""
+
+import argparse
+import csv
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+HISTORY_DB = "detections.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    timestamp REAL NOT NULL,
+    event TEXT NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp);
+CREATE INDEX IF NOT EXISTS idx_events_event ON events (event, timestamp);
+
+CREATE TABLE IF NOT EXISTS sightings (
+    mac TEXT NOT NULL,
+    name TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    rssi REAL,
+    count INTEGER NOT NULL DEFAULT 1,
+    event TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sightings_mac ON sightings (mac, last_seen);
+CREATE INDEX IF NOT EXISTS idx_sightings_last_seen ON sightings (last_seen);
+"""
+
+
+def to_timestamp(value):
+    """Accept epoch seconds, datetime or ISO string"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+class DetectionStore:
+    def __init__(self, path=HISTORY_DB, commit_interval=30.0, logger=None):
+        self.path = path
+        self.commit_interval = commit_interval  # seconds buffered rows may wait
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+        self.lock = threading.Lock()
+        self.pending_events = []
+        self.pending_sightings = []
+        self.last_commit = time.monotonic()
+
+    # Writing
+
+    def add_event(self, event, details, timestamp=None):
+        """Buffer one event row"""
+        timestamp = to_timestamp(timestamp) or time.time()
+        with self.lock:
+            self.pending_events.append((timestamp, event, details))
+
+    def add_events(self, rows):
+        """Buffer (timestamp, event, details) rows and commit them now"""
+        with self.lock:
+            self.pending_events.extend((to_timestamp(ts), event, details) for ts, event, details in rows)
+        self.commit()
+
+    def add_sighting(self, mac, entry, event="PRESENCE"):
+        """Buffer one presence session from the tracker"""
+        with self.lock:
+            self.pending_sightings.append((
+                mac, entry.get('name'), entry['first_seen'], entry['last_seen'],
+                entry.get('rssi'), entry.get('count', 1), event
+            ))
+
+    def maybe_commit(self):
+        """Commit buffered rows once commit_interval has passed - call every tick"""
+        if time.monotonic() - self.last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        """Write all buffered rows in one transaction"""
+        self.last_commit = time.monotonic()
+        with self.lock:
+            events, self.pending_events = self.pending_events, []
+            sightings, self.pending_sightings = self.pending_sightings, []
+            if not events and not sightings:
+                return
+            try:
+                with self.db:
+                    self.db.executemany("INSERT INTO events VALUES (?, ?, ?)", events)
+                    self.db.executemany("INSERT INTO sightings VALUES (?, ?, ?, ?, ?, ?, ?)", sightings)
+            except Exception as e:
+                self.logger.error(f"Error writing detection history: {e}")
+
+    # Queries
+
+    def last_seen(self, mac):
+        """Most recent sighting of a MAC, or None"""
+        return self.db.execute(
+            "SELECT * FROM sightings WHERE mac = ? ORDER BY last_seen DESC LIMIT 1",
+            (mac.upper(),)
+        ).fetchone()
+
+    def events(self, since=None, until=None, event=None, limit=None):
+        """Events in a time range, newest first"""
+        query = "SELECT * FROM events WHERE timestamp >= ? AND timestamp <= ?"
+        params = [to_timestamp(since) or 0, to_timestamp(until) or float('inf')]
+        if event:
+            query += " AND event = ?"
+            params.append(event)
+        query += " ORDER BY timestamp DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self.db.execute(query, params).fetchall()
+
+    def count_events(self, event, since=None):
+        """Number of events of one type since a time"""
+        return self.db.execute(
+            "SELECT COUNT(*) FROM events WHERE event = ? AND timestamp >= ?",
+            (event, to_timestamp(since) or 0)
+        ).fetchone()[0]
+
+    def sightings(self, mac=None, since=None, until=None, limit=None):
+        """Presence sessions in a time range, optionally for one MAC"""
+        query = "SELECT * FROM sightings WHERE last_seen >= ? AND first_seen <= ?"
+        params = [to_timestamp(since) or 0, to_timestamp(until) or float('inf')]
+        if mac:
+            query += " AND mac = ?"
+            params.append(mac.upper())
+        query += " ORDER BY last_seen DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self.db.execute(query, params).fetchall()
+
+    def recent_devices(self, since=None, limit=20):
+        """Distinct MACs with their last sighting, newest first"""
+        return self.db.execute(
+            """SELECT mac, MAX(name) AS name, MAX(last_seen) AS last_seen,
+                      SUM(count) AS count, MAX(rssi) AS rssi
+               FROM sightings WHERE last_seen >= ?
+               GROUP BY mac ORDER BY last_seen DESC LIMIT ?""",
+            (to_timestamp(since) or 0, limit)
+        ).fetchall()
+
+    def dashboard_summary(self, days=7):
+        """Recent alarms and devices for templates/dashboard.html"""
+        since = time.time() - days * 86400
+        alarms = self.events(since=since, event="ALARM_TRIGGERED", limit=20)
+        return {
+            'days': days,
+            'alarm_count': self.count_events("ALARM_TRIGGERED", since=since),
+            'alarms': [{'time': datetime.fromtimestamp(row['timestamp']).strftime('%Y-%m-%d %H:%M'),
+                        'details': row['details']} for row in alarms],
+            'devices': [{'mac': row['mac'], 'name': row['name'] or "Unknown",
+                         'last_seen': datetime.fromtimestamp(row['last_seen']).strftime('%Y-%m-%d %H:%M'),
+                         'rssi': round(row['rssi']) if row['rssi'] is not None else None}
+                        for row in self.recent_devices(since=since, limit=10)]
+        }
+
+    # Maintenance
+
+    def apply_retention(self, keep_days=180, downsample_days=14):
+        """Drop rows older than keep_days and fold older sightings into hourly rows"""
+        now = time.time()
+        keep_cutoff = now - keep_days * 86400
+        downsample_cutoff = now - downsample_days * 86400
+
+        self.commit()
+        with self.db:
+            self.db.execute("DELETE FROM events WHERE timestamp < ?", (keep_cutoff,))
+            self.db.execute("DELETE FROM sightings WHERE last_seen < ?", (keep_cutoff,))
+
+            # One row per MAC per hour for everything past the downsample age
+            self.db.execute("""CREATE TEMP TABLE hourly AS
+                SELECT mac, MAX(name) AS name, MIN(first_seen) AS first_seen,
+                       MAX(last_seen) AS last_seen, AVG(rssi) AS rssi,
+                       SUM(count) AS count, MAX(event) AS event
+                FROM sightings WHERE last_seen < ?
+                GROUP BY mac, CAST(first_seen / 3600 AS INTEGER)""", (downsample_cutoff,))
+            self.db.execute("DELETE FROM sightings WHERE last_seen < ?", (downsample_cutoff,))
+            self.db.execute("INSERT INTO sightings SELECT * FROM hourly")
+            self.db.execute("DROP TABLE hourly")
+        self.db.execute("VACUUM")
+
+    def import_csv(self, path):
+        """One-shot import of detections.csv or remote_detections.csv"""
+        imported = 0
+        with open(path, 'r', newline='') as f:
+            # A power cut mid-write leaves NUL padding in front of the next row
+            reader = csv.DictReader(line.replace('\0', '') for line in f)
+            with self.db:
+                for row in reader:
+                    try:
+                        timestamp = to_timestamp(row["Timestamp"])
+                    except (KeyError, ValueError):
+                        continue
+
+                    if "MAC" in row:
+                        # detections.csv: one row per device sighting
+                        rssi = row.get("Signal Strength")
+                        self.db.execute(
+                            "INSERT INTO sightings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (row["MAC"].upper(), row.get("Device Name"), timestamp, timestamp,
+                             float(rssi) if rssi else None, int(row.get("Detection Count") or 1),
+                             row.get("Event"))
+                        )
+                    else:
+                        # remote_detections.csv: monitor events
+                        self.db.execute("INSERT INTO events VALUES (?, ?, ?)",
+                                        (timestamp, row["Event"], row.get("Details")))
+                    imported += 1
+        self.logger.info(f"Imported {imported} rows from {path}")
+        return imported
+
+    def close(self):
+        """Commit buffered rows and close the database"""
+        self.commit()
+        self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluetooth IDS detection history")
+    parser.add_argument("--db", default=HISTORY_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    import_cmd = sub.add_parser("import", help="import existing CSV logs")
+    import_cmd.add_argument("files", nargs="+")
+
+    last_cmd = sub.add_parser("last-seen", help="when was a MAC last seen")
+    last_cmd.add_argument("mac")
+
+    alarms_cmd = sub.add_parser("alarms", help="alarms in the last N days")
+    alarms_cmd.add_argument("--days", type=float, default=7)
+
+    retention_cmd = sub.add_parser("retention", help="apply retention and downsampling")
+    retention_cmd.add_argument("--keep-days", type=float, default=180)
+    retention_cmd.add_argument("--downsample-days", type=float, default=14)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    store = DetectionStore(args.db)
+
+    if args.command == "import":
+        for path in args.files:
+            store.import_csv(path)
+    elif args.command == "last-seen":
+        row = store.last_seen(args.mac)
+        if row is None:
+            print(f"{args.mac.upper()} never seen")
+        else:
+            print(f"{row['mac']} ({row['name'] or 'Unknown'}) last seen "
+                  f"{datetime.fromtimestamp(row['last_seen']).isoformat()}")
+    elif args.command == "alarms":
+        for row in store.events(since=time.time() - args.days * 86400, event="ALARM_TRIGGERED"):
+            print(f"{datetime.fromtimestamp(row['timestamp']).isoformat()}  {row['details']}")
+    elif args.command == "retention":
+        store.apply_retention(args.keep_days, args.downsample_days)
+
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
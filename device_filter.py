@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Device exclusion filter for the Bluetooth IDS
+Merges the adapter's own address, ignore_devices.txt, the baseline device
+list and OUI prefixes into one set checked for every advertisement
+"""
+
+import json
+import logging
+import os
+import time
+
+
+async def resolve_adapter_address(adapter="hci0"):
+    """Read the adapter's BD address from BlueZ over D-Bus"""
+    from dbus_fast import BusType, Message, MessageType
+    from dbus_fast.aio import MessageBus
+
+    bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+    try:
+        reply = await bus.call(Message(
+            destination='org.bluez',
+            path=f'/org/bluez/{adapter}',
+            interface='org.freedesktop.DBus.Properties',
+            member='Get',
+            signature='ss',
+            body=['org.bluez.Adapter1', 'Address']
+        ))
+    finally:
+        bus.disconnect()
+
+    if reply.message_type == MessageType.ERROR:
+        raise Exception(f"{reply.error_name}: {reply.body[0] if reply.body else ''}")
+    return reply.body[0].value.upper()
+
+
+def normalize_mac(value):
+    """Upper-case a MAC or OUI and use ':' separators"""
+    return value.strip().upper().replace('-', ':')
+
+
+class DeviceFilter:
+    def __init__(self, ignore_file="ignore_devices.txt", baseline_file="baseline_devices.json",
+                 oui_prefixes=(), reload_interval=5.0, logger=None):
+        self.ignore_file = ignore_file
+        self.baseline_file = baseline_file
+        self.oui_prefixes = {normalize_mac(p) for p in oui_prefixes}
+        self.reload_interval = reload_interval  # seconds between mtime checks
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.own_macs = set()
+        self.macs = frozenset()
+        self.ouis = frozenset()
+        self.mtimes = None
+        self.last_check = 0.0
+
+        self.reload()
+
+    def is_ignored(self, mac):
+        """O(1) check against the merged exclusion set"""
+        return mac in self.macs or mac[:8] in self.ouis
+
+    def add_own_address(self, mac):
+        """Exclude one of this node's own adapters"""
+        mac = normalize_mac(mac)
+        if mac not in self.own_macs:
+            self.own_macs.add(mac)
+            self.logger.info(f"Pi's Bluetooth MAC: {mac} (will be ignored)")
+            self.reload()
+
+    def file_mtimes(self):
+        """Modification times of the watched files (None when missing)"""
+        mtimes = []
+        for path in (self.ignore_file, self.baseline_file):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def maybe_reload(self):
+        """Reload when a source file changed - cheap enough to call every tick"""
+        now = time.monotonic()
+        if now - self.last_check < self.reload_interval:
+            return False
+        self.last_check = now
+
+        if self.file_mtimes() == self.mtimes:
+            return False
+        self.reload()
+        return True
+
+    def reload(self):
+        """Rebuild the exclusion sets and swap them in"""
+        self.mtimes = self.file_mtimes()
+        macs = set(self.own_macs)
+        ouis = set(self.oui_prefixes)
+
+        try:
+            with open(self.ignore_file, 'r') as f:
+                for line in f:
+                    entry = normalize_mac(line.split('#', 1)[0])
+                    if not entry:
+                        continue
+                    # Three octets (AA:BB:CC) is a manufacturer prefix
+                    if len(entry) == 8:
+                        ouis.add(entry)
+                    else:
+                        macs.add(entry)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error loading ignore list: {e}")
+
+        try:
+            with open(self.baseline_file, 'r') as f:
+                baseline = json.load(f)
+            for entry in baseline.get("devices", []):
+                mac = entry.get("mac") if isinstance(entry, dict) else entry
+                if mac:
+                    macs.add(normalize_mac(mac))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error loading baseline devices: {e}")
+
+        self.macs = frozenset(macs)
+        self.ouis = frozenset(ouis)
+        self.logger.info(f"Device filter loaded: {len(self.macs)} MACs, {len(self.ouis)} OUI prefixes ignored")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Buffered event log for the Bluetooth IDS
+Collects detection events in a ring buffer and writes them in batches with
+one fsync, rotating and compressing old files to spare the Pi's SD card
+"""
+
+import csv
+import gzip
+import io
+import logging
+import logging.handlers
+import os
+import shutil
+import time
+from collections import deque
+from datetime import datetime
+
+from detection_store import DetectionStore
+
+CSV_HEADER = ["Timestamp", "Event", "Details"]
+
+# Events worth an immediate fsync
+URGENT_EVENTS = ("ALARM_TRIGGERED", "DETECTION_CLEARED")
+
+
+def compress_file(source, dest):
+    """Gzip source into dest via a temp file, then remove source"""
+    tmp = dest + ".tmp"
+    with open(source, 'rb') as f_in, gzip.open(tmp, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.replace(tmp, dest)
+    os.remove(source)
+
+
+def make_log_handler(path, max_bytes=1_000_000, backups=5):
+    """Size-rotating log handler that gzips rotated files"""
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+    handler.namer = lambda name: name + ".gz"
+    handler.rotator = compress_file
+    return handler
+
+
+class EventSink:
+    def __init__(self, path="remote_detections.csv", fmt="csv", buffer_size=1024,
+                 flush_batch=32, flush_interval=30.0, max_bytes=1_000_000,
+                 max_age=7 * 86400, backups=10, logger=None):
+        if fmt not in ("csv", "sqlite"):
+            raise ValueError("fmt must be 'csv' or 'sqlite'")
+
+        self.path = path
+        self.fmt = fmt
+        self.flush_batch = flush_batch        # events that force a flush
+        self.flush_interval = flush_interval  # seconds an event may sit in memory
+        self.max_bytes = max_bytes            # rotate CSV past this size
+        self.max_age = max_age                # rotate CSV older than this (seconds)
+        self.backups = backups                # compressed CSV files to keep
+        self.logger = logger or logging.getLogger(__name__)
+
+        # Ring buffer: if the card is unwritable the oldest events go first
+        self.buffer = deque(maxlen=buffer_size)
+        self.last_flush = time.monotonic()
+        self.db = None
+
+        if self.fmt == "csv":
+            self.repair_csv()
+        else:
+            self.open_db()
+
+    def repair_csv(self):
+        """Drop a torn last line left by a power cut mid-write"""
+        try:
+            with open(self.path, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size == 0:
+                    return
+                f.seek(max(0, size - 4096))
+                tail = f.read()
+                if tail.endswith(b'\n'):
+                    return
+                keep = size - len(tail) + tail.rfind(b'\n') + 1
+                f.truncate(keep)
+                os.fsync(f.fileno())
+                self.logger.warning(f"Repaired truncated event log {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error checking event log: {e}")
+
+    def open_db(self):
+        """Open the indexed SQLite history store (WAL mode)"""
+        self.db = DetectionStore(self.path, logger=self.logger)
+
+    def write(self, event_type, details, timestamp=None):
+        """Buffer one event, flushing when the batch is full or the event is urgent"""
+        timestamp = timestamp or datetime.now()
+        self.buffer.append((timestamp.isoformat(), event_type, details))
+
+        if len(self.buffer) >= self.flush_batch or event_type in URGENT_EVENTS:
+            self.flush()
+
+    def maybe_flush(self):
+        """Flush if events have waited longer than flush_interval - call every tick"""
+        if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered events with a single write and fsync"""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+
+        rows = list(self.buffer)
+        try:
+            if self.fmt == "csv":
+                self.write_csv(rows)
+            else:
+                self.db.add_events(rows)
+            self.buffer.clear()
+        except Exception as e:
+            self.logger.error(f"Error logging event: {e}")
+
+    def write_csv(self, rows):
+        """Append rows in one write, then rotate if needed"""
+        text = io.StringIO()
+        writer = csv.writer(text)
+        new_file = not os.path.exists(self.path)
+        if new_file:
+            writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+
+        with open(self.path, 'a', newline='') as f:
+            f.write(text.getvalue())
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.maybe_rotate()
+
+    def maybe_rotate(self):
+        """Rotate the CSV by size or age and gzip the old file"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        too_big = stat.st_size >= self.max_bytes
+        with open(self.path, 'r') as f:
+            f.readline()
+            first = f.readline()
+        try:
+            first_time = datetime.fromisoformat(first.split(',', 1)[0]).timestamp()
+            too_old = time.time() - first_time >= self.max_age
+        except ValueError:
+            too_old = False
+
+        if not (too_big or too_old):
+            return
+
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        rotated = f"{self.path}.{stamp}"
+        suffix = 1
+        while os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{stamp}-{suffix}"
+            suffix += 1
+        os.replace(self.path, rotated)
+        compress_file(rotated, rotated + ".gz")
+        self.logger.info(f"Rotated event log to {rotated}.gz")
+        self.prune_backups()
+
+    def prune_backups(self):
+        """Keep only the newest compressed logs"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + "."
+        backups = sorted((os.path.join(directory, name) for name in os.listdir(directory)
+                          if name.startswith(prefix) and name.endswith(".gz")),
+                         key=os.path.getmtime)
+        for path in backups[:-self.backups]:
+            os.remove(path)
+
+    def close(self):
+        """Flush remaining events"""
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
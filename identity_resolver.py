@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Address-to-identity resolution for the Bluetooth IDS
+Phones rotate resolvable private addresses every ~15 minutes. This stage
+hands a new rotating address over to the identity whose previous address
+was last heard within the handoff window, when the advertisement fingerprint
+(manufacturer data layout, service UUIDs, TX power, name) matches and the
+RSSI is continuous. Candidates come from an index keyed by fingerprint, so
+matching cost does not grow with the population.
+
+A second device of the same model arriving next to the first is merged into
+its identity too: at that moment the old address is indistinguishable from
+one between two advertisements. The merge lasts until the old address
+advertises again, when split() separates the two devices for good.
+
+Dual-mode devices seen by both the BLE scan and classic inquiry are one
+identity: automatically when both radios use the same public address, and
+by name when exactly one identity on the other transport carries the same
+name at a similar RSSI.
+"""
+
+import logging
+from collections import OrderedDict
+
+
+def fingerprint(sighting):
+    """Stable part of an advertisement, or None when there is too little to match on"""
+    manufacturer_data = sighting.get('manufacturer_data') or {}
+    # Company ID, payload length and type byte survive rotation; the rest is rolling state
+    layout = tuple(sorted((company, len(data), bytes(data[:1])) for company, data in manufacturer_data.items()))
+    services = tuple(sorted(sighting.get('service_uuids') or ()))
+    name = sighting.get('name') if sighting.get('name') != "Unknown" else None
+    if not (layout or services or name):
+        return None
+    return layout, services, sighting.get('tx_power'), name
+
+
+def is_rotating(mac, sighting):
+    """Resolvable/non-resolvable private address (static random and public addresses stay put)"""
+    address_type = sighting.get('address_type')
+    top_bits = int(mac[:2], 16) >> 6
+    if address_type == "public":
+        return False
+    if address_type == "random":
+        return top_bits != 0b11
+    return top_bits == 0b01  # address type unknown: only RPAs are recognisable
+
+
+class IdentityResolver:
+    def __init__(self, handoff=30.0, rssi_tolerance=12, retain=120.0, logger=None):
+        self.handoff = handoff                # max seconds between old and new address
+        self.rssi_tolerance = rssi_tolerance  # max dB jump across a handoff
+        self.retain = retain                  # seconds an idle address/identity is remembered
+        self.logger = logger or logging.getLogger(__name__)
+
+        # Both ordered by last_seen so pruning pops from the front
+        self.addresses = OrderedDict()   # mac -> [identity, last_seen]
+        self.identities = OrderedDict()  # identity -> record
+        self.index = {}                  # fingerprint -> {identity}
+        self.names = {}                  # name -> {identity}, for dual-mode matching
+        self.listeners = []
+        self.next_id = 1                 # suffix for an address that already names an identity
+        self.handoffs = 0
+        self.dual_links = 0
+
+    def add_listener(self, callback):
+        """Register callback(identity, sighting) called for every advertisement"""
+        self.listeners.append(callback)
+
+    def observe(self, mac, sighting):
+        """Scanner listener - map the address to an identity and pass the sighting on"""
+        now = sighting['last_seen']
+        address = self.addresses.get(mac)
+        if address is None or address[0] not in self.identities:
+            address = self.addresses[mac] = [self.resolve(mac, sighting, now), now]
+        identity = address[0]
+        address[1] = now
+        self.addresses.move_to_end(mac)
+
+        record = self.identities[identity]
+        if record['mac'] != mac and record['peer'] != mac:
+            self.split(identity, record, mac)
+        record['last_seen'] = now
+        record['rssi'] = sighting['signal']
+        self.identities.move_to_end(identity)
+
+        self.prune(now)
+
+        for listener in self.listeners:
+            try:
+                listener(identity, sighting)
+            except Exception as e:
+                self.logger.error(f"Identity listener error: {e}")
+
+    def resolve(self, mac, sighting, now):
+        """Identity for a new address: a handoff from a matching identity, or a new one
+
+        The matching identity is not required to have gone quiet (see split()).
+        """
+        key = fingerprint(sighting) if is_rotating(mac, sighting) else None
+        if key is not None:
+            best = None
+            best_cost = None
+            for identity in self.index.get(key, ()):
+                record = self.identities[identity]
+                if mac in record['rejected']:
+                    continue
+                gap = now - record['last_seen']
+                jump = abs(sighting['signal'] - record['rssi'])
+                if gap > self.handoff or jump > self.rssi_tolerance:
+                    continue
+                cost = gap / self.handoff + jump / self.rssi_tolerance
+                if best_cost is None or cost < best_cost:
+                    best, best_cost = identity, cost
+            if best is not None:
+                record = self.identities[best]
+                self.logger.debug(f"Address {record['mac']} -> {mac} resolved as {best}")
+                record['mac'] = mac
+                record['rejected'].clear()
+                record['aliases'] += 1
+                self.handoffs += 1
+                return best
+
+        linked = self.dual_mode_match(mac, sighting, now)
+        if linked is not None:
+            return linked
+
+        transport = sighting.get('transport', "le")
+        name = sighting.get('name') if sighting.get('name') != "Unknown" else None
+        identity = mac
+        if mac in self.identities:
+            # Never reused, so a pruned identity cannot hand its suffix to a live one
+            identity = f"{mac}#{self.next_id}"
+            self.next_id += 1
+        self.identities[identity] = {
+            'fingerprint': key,
+            'mac': mac,
+            'last_seen': now,
+            'rssi': sighting['signal'],
+            'aliases': 1,
+            'rejected': set(),  # addresses proven to be another device
+            'transport': transport,
+            'name': name,
+            'hold': sighting.get('hold', 0),
+            'peer': None        # the same device's address on the other transport
+        }
+        if key is not None:
+            self.index.setdefault(key, set()).add(identity)
+        if name is not None:
+            self.names.setdefault(name, set()).add(identity)
+        return identity
+
+    def dual_mode_match(self, mac, sighting, now):
+        """The identity of this device's other radio: same name, other transport, unambiguous"""
+        name = sighting.get('name')
+        if name in (None, "Unknown"):
+            return None
+        transport = sighting.get('transport', "le")
+        matches = []
+        for identity in self.names.get(name, ()):
+            record = self.identities[identity]
+            if record['transport'] == transport or record['peer'] is not None or mac in record['rejected']:
+                continue
+            # Inquiry results arrive once per period, not continuously
+            gap = now - record['last_seen']
+            if gap > max(self.handoff, record['hold'], sighting.get('hold', 0)):
+                continue
+            if abs(sighting['signal'] - record['rssi']) > self.rssi_tolerance:
+                continue
+            matches.append(identity)
+        if len(matches) != 1:
+            return None
+        record = self.identities[matches[0]]
+        record['peer'] = mac
+        record['transport'] = "dual"
+        record['aliases'] += 1
+        self.dual_links += 1
+        self.logger.debug(f"{transport} address {mac} linked to dual-mode device {matches[0]} ({name})")
+        return matches[0]
+
+    def split(self, identity, record, mac):
+        """An older address spoke after a handoff: two devices, not one - undo it"""
+        newer = record['mac']
+        self.logger.debug(f"Address {mac} still active - splitting {newer} from {identity}")
+        record['mac'] = mac
+        record['rejected'].add(newer)
+        record['aliases'] -= 1
+        self.handoffs -= 1
+        self.addresses.pop(newer, None)
+
+    def prune(self, now):
+        """Forget addresses and identities idle for longer than retain"""
+        cutoff = now - self.retain
+        while self.addresses:
+            mac, (identity, last_seen) = next(iter(self.addresses.items()))
+            if last_seen >= cutoff:
+                break
+            del self.addresses[mac]
+
+        while self.identities:
+            identity, record = next(iter(self.identities.items()))
+            if record['last_seen'] >= cutoff:
+                break
+            del self.identities[identity]
+            for index, key in ((self.index, record['fingerprint']), (self.names, record['name'])):
+                candidates = index.get(key)
+                if candidates is not None:
+                    candidates.discard(identity)
+                    if not candidates:
+                        del index[key]
+
+    def aliases(self, identity):
+        """Number of addresses an identity has used"""
+        record = self.identities.get(identity)
+        return record['aliases'] if record else 1
+
+    def clear(self):
+        """Forget all addresses and identities"""
+        self.addresses.clear()
+        self.identities.clear()
+        self.index.clear()
+        self.names.clear()
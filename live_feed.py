@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Live status feed for the Bluetooth IDS
+Streams the monitor's in-memory view (present devices, RSSI, dwell, arm and
+alarm state) to browsers as Server-Sent Events. State is sampled at a fixed
+frame rate and only the changes since the previous frame are sent, encoded
+once and written to every client, so extra browser tabs cost almost nothing
+and an idle feed with no clients costs nothing at all.
+
+Events on GET /live:
+    snapshot  {"t": now, "status": {...}, "devices": {mac: {...}}}   on connect
+    delta     {"t": now, "status": {...}?, "upsert": {mac: {...}}?, "remove": [mac]?}
+Dwell is not streamed: clients compute it from first_seen and "t".
+The feed sends no CORS headers, so only a page served from the same origin
+(the dashboard's default /live) can read it.
+"""
+
+import asyncio
+import json
+import logging
+import time
+
+LIVE_PORT = 8766
+MAX_CLIENTS = 32
+MAX_BUFFERED = 256 * 1024  # bytes queued for a client before it is dropped as too slow
+KEEPALIVE = 15.0           # seconds between comments on an unchanged feed
+
+
+def encode_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode()
+
+
+class LiveFeed:
+    def __init__(self, host, port, state, fps=2.0, logger=None):
+        self.host = host
+        self.port = port
+        self.state = state  # state() -> (status dict, {mac: device dict}) - must be cheap
+        self.fps = fps      # frames per second pushed to clients
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.server = None
+        self.task = None
+        self.clients = set()
+        self.status = None
+        self.devices = {}
+        self.last_send = 0.0
+        self.frames_sent = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.task = asyncio.create_task(self.run())
+        self.logger.info(f"📡 Live feed on http://{self.host}:{self.port}/live")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.server is None:
+            return
+        self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        self.clients.clear()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def handle_client(self, reader, writer):
+        """Minimal HTTP: GET /live upgrades to an event stream, anything else is 404"""
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5.0)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        method, _, rest = request.decode(errors="replace").partition(" ")
+        path = rest.split(" ", 1)[0].split("?", 1)[0]
+
+        if method != "GET" or path != "/live" or len(self.clients) >= MAX_CLIENTS:
+            status = "404 Not Found" if path != "/live" else "503 Service Unavailable"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+            writer.close()
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"X-Accel-Buffering: no\r\n"
+                     b"\r\n"
+                     b"retry: 3000\n\n")
+        # Newcomers get the last frame in full, later frames as deltas like everyone else
+        writer.write(encode_event("snapshot", {"t": self.last_send or time.time(),
+                                               "status": self.status, "devices": self.devices}))
+        self.clients.add(writer)
+        self.logger.debug(f"Live feed client connected ({len(self.clients)} total)")
+
+        # Nothing is read from a client; wait for it to hang up
+        try:
+            await reader.read()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def run(self):
+        """Sample the state once per frame and push the differences"""
+        while True:
+            await asyncio.sleep(1.0 / self.fps)
+            if not self.clients:
+                continue
+            try:
+                self.frame()
+            except Exception as e:
+                self.logger.error(f"Live feed error: {e}")
+
+    def frame(self):
+        now = time.time()
+        status, devices = self.state()
+        delta = {}
+        if status != self.status:
+            delta["status"] = status
+        upsert = {mac: device for mac, device in devices.items() if self.devices.get(mac) != device}
+        if upsert:
+            delta["upsert"] = upsert
+        remove = [mac for mac in self.devices if mac not in devices]
+        if remove:
+            delta["remove"] = remove
+        self.status, self.devices = status, devices
+
+        if delta:
+            delta["t"] = now
+            self.broadcast(encode_event("delta", delta))
+        elif now - self.last_send >= KEEPALIVE:
+            self.broadcast(b": keepalive\n\n")
+        else:
+            return
+        self.last_send = now
+        self.frames_sent += 1
+
+    def broadcast(self, data):
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+                self.logger.debug("Live feed client too slow - dropped")
+                self.clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(data)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Metrics and profiling for the Bluetooth IDS
+Counters, histograms and gauges kept in process, exposed in Prometheus text
+format on a local HTTP port and condensed into a periodic summary line.
+Includes an asyncio loop-lag sampler and a sampling profiler that is toggled
+on SIGUSR1 and dumps its hottest stacks when toggled off.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MONITOR_METRICS_PORT = 9108
+DAEMON_METRICS_PORT = 9109
+
+# Leaf frames of threads parked waiting for work - left out of the hot stacks
+IDLE_FRAMES = ("selectors.py:select", "threading.py:wait", "thread.py:_worker", "queue.py:get")
+
+# Seconds - from sub-millisecond table reads up to slow SMTP sessions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+def rss_bytes():
+    """Current resident set size (0 where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+class Timer:
+    """Context manager observing its elapsed wall time into a histogram"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # label key -> [bucket counts..., +Inf count, sum, max since last summary]
+
+    def observe(self, value, **labels):
+        key = label_key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-2] += value
+        series[-1] = max(series[-1], value)
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+    def snapshot(self):
+        return {key: list(series) for key, series in self.series.items()}
+
+    def quantile(self, counts, q):
+        """Upper bound of the bucket holding quantile q of non-cumulative counts"""
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read  # called at scrape time
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {float(value)}"]
+
+
+class Metrics:
+    def __init__(self, prefix="btids", summary_interval=300.0, logger=None):
+        self.prefix = prefix
+        self.summary_interval = summary_interval  # seconds between summary lines
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.metrics = {}
+        self.server = None
+        self.last_summary = time.monotonic()
+        self.summary_base = {}
+
+        self.gauge("resident_memory_bytes", "Resident set size", rss_bytes)
+
+    def register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text):
+        return self.register(Counter(f"{self.prefix}_{name}", help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(f"{self.prefix}_{name}_seconds", help_text, buckets))
+
+    def gauge(self, name, help_text, read):
+        return self.register(Gauge(f"{self.prefix}_{name}", help_text, read))
+
+    def render(self):
+        """All metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """One compact line: p50/p99/max per histogram since the previous summary"""
+        parts = []
+        for metric in list(self.metrics.values()):
+            if not isinstance(metric, Histogram):
+                continue
+            snapshot = metric.snapshot()
+            for key, series in snapshot.items():
+                base = self.summary_base.get((metric.name, key))
+                counts = series[:len(metric.buckets) + 1]
+                if base is not None:
+                    counts = [now - before for now, before in zip(counts, base)]
+                n = sum(counts)
+                if not n:
+                    continue
+                label = metric.name[len(self.prefix) + 1:].removesuffix("_seconds")
+                if key:
+                    label += "[" + ",".join(str(value) for _, value in key) + "]"
+                p50, p99 = metric.quantile(counts, 0.5), metric.quantile(counts, 0.99)
+                parts.append(f"{label} n={n} p50<={p50 * 1000:g}ms p99<={p99 * 1000:g}ms "
+                             f"max={series[-1] * 1000:.1f}ms")
+                self.summary_base[(metric.name, key)] = series[:len(metric.buckets) + 1]
+                metric.series[key][-1] = 0.0
+        parts.append(f"rss={rss_bytes() / 1e6:.1f}MB")
+        return " | ".join(parts)
+
+    def maybe_log_summary(self):
+        """Log the summary line every summary_interval"""
+        if time.monotonic() - self.last_summary < self.summary_interval:
+            return
+        self.last_summary = time.monotonic()
+        self.logger.info(f"📊 {self.summary()}")
+
+    def start_server(self, port, host="127.0.0.1"):
+        """Serve /metrics from a daemon thread (loopback only by default)"""
+        if self.server is not None or not port:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            self.logger.error(f"Metrics endpoint unavailable on {host}:{port}: {e}")
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        self.logger.info(f"📊 Metrics on http://{host}:{port}/metrics")
+
+    def stop_server(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class LoopLagMonitor:
+    """Measures how late asyncio wakes a sleeping task - blocking calls show up here"""
+
+    def __init__(self, histogram, interval=0.25):
+        self.histogram = histogram
+        self.interval = interval  # seconds between samples
+        self.task = None
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.histogram.observe(max(0.0, loop.time() - expected))
+
+
+class SamplingProfiler:
+    """Samples every thread's stack while enabled; toggle() from SIGUSR1"""
+
+    def __init__(self, interval=0.005, top=15, directory=".", logger=None):
+        self.interval = interval    # seconds between samples
+        self.top = top              # stacks listed in the log
+        self.directory = directory  # where collapsed stack dumps are written
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.stacks = StackCounter()
+        self.samples = 0
+        self.idle = 0
+        self.started = None
+        self.thread = None
+        self.running = False
+
+    def toggle(self, *_signal_args):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def start(self):
+        self.stacks.clear()
+        self.samples = 0
+        self.idle = 0
+        self.started = time.monotonic()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+        self.logger.info("🔬 Sampling profiler started (send SIGUSR1 again to dump)")
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(1.0)
+            self.thread = None
+        self.dump()
+
+    def run(self):
+        own = threading.get_ident()
+        names = {}
+        while self.running:
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if f"{os.path.basename(code.co_filename)}:{code.co_name}" in IDLE_FRAMES:
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def dump(self):
+        """Write collapsed stacks (flamegraph.pl format) and log the hottest ones"""
+        if not self.samples:
+            return None
+        elapsed = time.monotonic() - self.started
+        path = os.path.join(self.directory, datetime.now().strftime("profile-%Y%m%d-%H%M%S.txt"))
+        try:
+            with open(path, "w") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            self.logger.error(f"Could not write profile: {e}")
+            path = None
+
+        self.logger.info(f"🔬 {self.samples} samples over {elapsed:.1f}s ({self.idle} idle thread samples) - "
+                         f"hottest stacks:")
+        for stack, count in self.stacks.most_common(self.top):
+            thread, *calls = stack.split(";")
+            self.logger.info(f"   {100.0 * count / self.samples:5.1f}%  [{thread}] "
+                             f"{' <- '.join(reversed(calls[-4:]))}")
+        if path:
+            self.logger.info(f"🔬 Full profile written to {path}")
+        return path
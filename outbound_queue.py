@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Persistent outbound queue for the Bluetooth IDS
+Store-and-forward for every request the Pi POSTs to the VPS. Requests are
+written to SQLite before anything is sent, so a 4G outage or a reboot
+loses nothing. A worker thread delivers them by priority (alarms before
+telemetry) in batches over one keep-alive session, with exponential backoff
+per request. Each request carries an Idempotency-Key header so the VPS can
+drop duplicates of a retried delivery. Bodies are JSON, or JSON the
+producer already compressed (sent with Content-Encoding: deflate).
+
+Alarms expire: a voice call that arrives long after the intrusion does more
+harm than good, so an alarm that is not delivered within alarm_ttl is
+dropped and reported to the queue's listeners instead of being sent late.
+
+Usage:
+    python3 outbound_queue.py status
+    python3 outbound_queue.py retry     # make every queued request due now
+"""
+
+import argparse
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from arm_state import VPS_BASE_URL
+
+OUTBOUND_DB = "outbound_queue.db"
+
+PRIORITY_ALARM = 0
+PRIORITY_STATUS = 5
+PRIORITY_TELEMETRY = 9
+
+# 4xx answers are final except timeouts and rate limiting
+TRANSIENT_ERRORS = ("HTTP 408", "HTTP 429")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    priority INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (priority, next_attempt, id);
+"""
+
+
+class OutboundQueue:
+    def __init__(self, path=OUTBOUND_DB, base_url=VPS_BASE_URL, batch_size=20, timeout=10.0,
+                 backoff_initial=2.0, backoff_max=300.0, alarm_backoff_max=30.0,
+                 max_age=7 * 86400, alarm_ttl=600.0, logger=None):
+        self.path = path
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size                # requests sent per pass
+        self.timeout = timeout
+        self.backoff_initial = backoff_initial      # first retry delay, doubled per attempt
+        self.backoff_max = backoff_max
+        self.alarm_backoff_max = alarm_backoff_max  # alarms keep probing the link more often
+        self.max_age = max_age                      # seconds before an undelivered request is dropped
+        self.alarm_ttl = alarm_ttl                  # seconds an alarm is still worth delivering
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.running = False
+        self.session = None
+        self.blocked_until = 0.0  # link down: nothing is sent before this
+        self.listeners = []
+
+        # Counters since start
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+        self.expired = 0
+        self.last_delivery = None
+
+    def add_listener(self, callback):
+        """Register callback(key, outcome, row) called when a request leaves the queue
+
+        outcome is "delivered", "expired" or "rejected". Called on the worker thread.
+        """
+        self.listeners.append(callback)
+
+    def notify(self, outcome, rows):
+        for row in rows:
+            for listener in self.listeners:
+                try:
+                    listener(row['key'], outcome, row)
+                except Exception as e:
+                    self.logger.error(f"Outbound queue listener error: {e}")
+
+    # Producers
+
+    def enqueue(self, path, body, priority=PRIORITY_TELEMETRY, key=None, compressed=False, ttl=None):
+        """Persist one POST and wake the worker; returns the idempotency key
+
+        Enqueueing the same key twice is a no-op, so callers can retry freely.
+        A compressed body is zlib-compressed JSON bytes, stored as a blob and
+        sent as Content-Encoding: deflate. path may also be a full URL.
+        ttl is the seconds the request may wait before it expires (alarms
+        default to alarm_ttl, everything else only ages out after max_age).
+        """
+        key = key or uuid.uuid4().hex
+        now = time.time()
+        if ttl is None and priority == PRIORITY_ALARM:
+            ttl = self.alarm_ttl
+        body = sqlite3.Binary(body) if compressed else json.dumps(body)
+        with self.lock:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO outbox (key, priority, path, body, created, next_attempt, expires) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, priority, path, body, now, now, None if ttl is None else now + ttl)
+                )
+        if priority == PRIORITY_ALARM:
+            self.blocked_until = 0.0  # an alarm is worth probing the link for straight away
+        self.wakeup.set()
+        return key
+
+    def link_up(self):
+        """The VPS answered something else - retry everything now instead of waiting out backoff"""
+        with self.lock:
+            with self.db:
+                self.db.execute("UPDATE outbox SET next_attempt = ? WHERE next_attempt > ?",
+                                (time.time(), time.time()))
+        self.blocked_until = 0.0
+        self.wakeup.set()
+
+    # Delivery
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="outbound", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run(self):
+        """Worker: deliver due requests, then sleep until the next one is due"""
+        while self.running:
+            try:
+                self.flush()
+                delay = self.seconds_until_due()
+            except Exception as e:
+                self.logger.error(f"Outbound queue error: {e}")
+                delay = self.backoff_initial
+            self.wakeup.wait(delay)
+            self.wakeup.clear()
+
+    def flush(self):
+        """Send due requests in priority order until none are due or the link fails"""
+        while self.running:
+            self.expire()
+            now = time.time()
+            if now < self.blocked_until:
+                return
+            with self.lock:
+                rows = self.db.execute(
+                    "SELECT * FROM outbox WHERE next_attempt <= ? ORDER BY priority, id LIMIT ?",
+                    (now, self.batch_size)
+                ).fetchall()
+            if not rows:
+                return
+
+            delivered = []
+            rejected = []
+            for row in rows:
+                if row['expires'] is not None and row['expires'] <= time.time():
+                    break  # expired while earlier requests were sent - dropped on the next pass
+                error = self.send(row)
+                if error is None:
+                    delivered.append(row['id'])
+                elif error.startswith("HTTP 4") and error not in TRANSIENT_ERRORS:
+                    # The VPS refused this request itself - retrying cannot help
+                    self.logger.error(f"📤 {row['path']} rejected ({error}) - dropped")
+                    rejected.append(row['id'])
+                else:
+                    # Link or server down: the rest would fail the same way
+                    self.blocked_until = self.retry_later(row, error)
+                    break
+
+            if delivered or rejected:
+                with self.lock:
+                    with self.db:
+                        self.db.executemany("DELETE FROM outbox WHERE id = ?",
+                                            [(i,) for i in delivered + rejected])
+                self.delivered += len(delivered)
+                self.dropped += len(rejected)
+                if delivered:
+                    self.last_delivery = time.time()
+                self.notify("delivered", [row for row in rows if row['id'] in delivered])
+                self.notify("rejected", [row for row in rows if row['id'] in rejected])
+            if len(delivered) + len(rejected) < len(rows):
+                return
+
+    def expire(self):
+        """Drop requests past their deadline (even while the link is down) and old ones"""
+        now = time.time()
+        with self.lock:
+            with self.db:
+                overdue = self.db.execute("SELECT * FROM outbox WHERE expires <= ?", (now,)).fetchall()
+                self.db.execute("DELETE FROM outbox WHERE expires <= ?", (now,))
+                aged = self.db.execute("DELETE FROM outbox WHERE created < ?", (now - self.max_age,)).rowcount
+        for row in overdue:
+            self.logger.error(f"📤 {row['path']} not delivered within {row['expires'] - row['created']:.0f}s "
+                              f"({row['attempts']} attempt(s), {row['last_error'] or 'never sent'}) - dropped")
+        self.expired += len(overdue)
+        self.notify("expired", overdue)
+        if aged:
+            self.dropped += aged
+            self.logger.warning(f"📤 Dropped {aged} request(s) older than {self.max_age / 86400:.0f} days")
+
+    def send(self, row):
+        """POST one request; None on success, otherwise an error string"""
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': row['key']}
+        if isinstance(row['body'], bytes):
+            headers['Content-Encoding'] = 'deflate'
+        url = row['path'] if row['path'].startswith(("http://", "https://")) else self.base_url + row['path']
+        try:
+            response = self.session.post(url, data=row['body'], headers=headers, timeout=self.timeout)
+        except Exception as e:
+            return f"{type(e).__name__}: {str(e)[:120]}"
+        if 200 <= response.status_code < 300:
+            age = time.time() - row['created']
+            # Routine telemetry would drown out the deliveries that matter
+            level = logging.DEBUG if row['priority'] >= PRIORITY_TELEMETRY else logging.INFO
+            self.logger.log(level, f"📤 Delivered {row['path']} after {age:.1f}s ({row['attempts'] + 1} attempt(s))")
+            return None
+        return f"HTTP {response.status_code}"
+
+    def retry_later(self, row, error):
+        """Back off exponentially (with jitter) before the next attempt"""
+        attempts = row['attempts'] + 1
+        cap = self.alarm_backoff_max if row['priority'] == PRIORITY_ALARM else self.backoff_max
+        delay = min(self.backoff_initial * 2 ** (attempts - 1), cap) * random.uniform(0.8, 1.2)
+        with self.lock:
+            with self.db:
+                self.db.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                                (attempts, time.time() + delay, error, row['id']))
+        self.failed_attempts += 1
+        level = logging.WARNING if attempts == 1 else logging.DEBUG
+        self.logger.log(level, f"📤 {row['path']} failed ({error}) - retry {attempts} in {delay:.1f}s")
+        return time.time() + delay
+
+    def seconds_until_due(self):
+        with self.lock:
+            row = self.db.execute("SELECT MIN(next_attempt) AS due, MIN(expires) AS expires FROM outbox").fetchone()
+        if row['due'] is None:
+            return None
+        due = max(0.0, row['due'] - time.time(), self.blocked_until - time.time())
+        # Wake for the next expiry too, so its listeners hear about it on time
+        if row['expires'] is not None:
+            due = min(due, max(0.0, row['expires'] - time.time()))
+        return due
+
+    # Metrics
+
+    def stats(self):
+        """Queue depth, depth per priority and age of the oldest request"""
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT priority, COUNT(*) AS depth, MIN(created) AS oldest FROM outbox GROUP BY priority"
+            ).fetchall()
+        oldest = min((row['oldest'] for row in rows), default=None)
+        return {
+            "depth": sum(row['depth'] for row in rows),
+            "depth_by_priority": {row['priority']: row['depth'] for row in rows},
+            "oldest_age": None if oldest is None else round(now - oldest, 1),
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "dropped": self.dropped,
+            "expired": self.expired
+        }
+
+    def close(self):
+        self.stop()
+        with self.lock:
+            self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluetooth IDS outbound queue")
+    parser.add_argument("--db", default=OUTBOUND_DB)
+    parser.add_argument("command", choices=["status", "retry"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    queue = OutboundQueue(args.db)
+    if args.command == "retry":
+        queue.link_up()
+    stats = queue.stats()
+    print(f"{stats['depth']} request(s) queued, oldest {stats['oldest_age'] or 0:.0f}s old")
+    for row in queue.db.execute("SELECT * FROM outbox ORDER BY priority, id LIMIT 20"):
+        print(f"  p{row['priority']} {row['path']} attempts={row['attempts']} "
+              f"next in {max(0, row['next_attempt'] - time.time()):.0f}s  {row['last_error'] or ''}")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
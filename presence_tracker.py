@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Per-device presence tracker for the Bluetooth IDS
+Keeps first/last seen, a smoothed RSSI and a sighting count per MAC in
+constant time per advertisement, with expiry and a hard size bound. Each
+device is tagged with the transport(s) it was seen on: "le", "bredr" or
+"dual" once both radios of one device have been seen.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+
+
+class PresenceTracker:
+    def __init__(self, expiry=30.0, alpha=0.3, max_devices=1000, logger=None):
+        self.expiry = expiry            # seconds without a sighting before a device leaves
+        self.alpha = alpha              # EWMA weight of the newest RSSI sample
+        self.max_devices = max_devices  # hard bound on tracked devices
+        self.logger = logger or logging.getLogger(__name__)
+
+        # Ordered by last_seen: the stalest device is always first
+        self.devices = OrderedDict()
+        self.expire_listeners = []
+
+    def add_expire_listener(self, callback):
+        """Register callback(mac, entry) called when a device leaves"""
+        self.expire_listeners.append(callback)
+
+    def observe(self, mac, sighting):
+        """Fold one advertisement into the table - O(1)
+
+        Fused batches from other nodes may carry first_seen and count for a
+        whole batch window; dwell is the union of every node's window.
+        """
+        now = sighting['last_seen']
+        rssi = sighting['signal']
+        first_seen = sighting.get('first_seen', now)
+        count = sighting.get('count', 1)
+        transport = sighting.get('transport', "le")
+        hold = sighting.get('hold', 0)
+        entry = self.devices.get(mac)
+
+        if entry is not None and first_seen - entry['last_seen'] > max(self.expiry, entry['hold']):
+            # Device went away and came back: start a new presence session
+            self.remove(mac)
+            entry = None
+
+        if entry is None:
+            if len(self.devices) >= self.max_devices:
+                self.remove(next(iter(self.devices)))
+            self.devices[mac] = {
+                'name': sighting['name'],
+                'first_seen': first_seen,
+                'last_seen': now,
+                'rssi': float(rssi),
+                'signal': rssi,
+                'count': count,
+                'transport': transport,
+                'hold': hold
+            }
+            return
+
+        entry['rssi'] += self.alpha * (rssi - entry['rssi'])
+        entry['signal'] = round(entry['rssi'])
+        entry['first_seen'] = min(entry['first_seen'], first_seen)
+        entry['last_seen'] = max(entry['last_seen'], now)
+        entry['count'] += count
+        if sighting['name'] != "Unknown":
+            entry['name'] = sighting['name']
+        if transport != entry['transport']:
+            entry['transport'] = "dual"
+        entry['hold'] = max(entry['hold'], hold)
+        self.devices.move_to_end(mac)
+
+    def remove(self, mac):
+        """Drop a device and notify expiry listeners"""
+        entry = self.devices.pop(mac, None)
+        if entry is None:
+            return
+        for listener in self.expire_listeners:
+            try:
+                listener(mac, entry)
+            except Exception as e:
+                self.logger.error(f"Expiry listener error: {e}")
+
+    def expire(self, now=None):
+        """Drop devices not seen within the expiry window (or their own longer hold)
+
+        Walks from the stalest device and stops at the first one seen within
+        the window. Held devices (classic inquiry results) still inside their
+        hold are stepped over in place, so the order by last_seen that
+        max_devices eviction relies on is never disturbed.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.expiry
+        stale = []
+        for mac, entry in self.devices.items():
+            if entry['last_seen'] >= cutoff:
+                break
+            if entry['last_seen'] < now - entry['hold']:
+                stale.append(mac)
+        for mac in stale:
+            self.remove(mac)
+
+    def present(self, now=None):
+        """Return the devices currently present"""
+        self.expire(now)
+        return dict(self.devices)
+
+    def qualified(self, signal_threshold, confidence_threshold, now=None):
+        """Present devices strong and consistent enough to count as intruders"""
+        self.expire(now)
+        return {mac: entry for mac, entry in self.devices.items()
+                if entry['rssi'] >= signal_threshold and entry['count'] >= confidence_threshold}
+
+    @staticmethod
+    def dwell(entry):
+        """Seconds a device has been continuously present"""
+        return entry['last_seen'] - entry['first_seen']
+
+    def clear(self):
+        """Forget all devices"""
+        for mac in list(self.devices):
+            self.remove(mac)
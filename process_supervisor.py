@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Child process supervisor for the Bluetooth IDS schedule daemon
+Keeps the Popen handle of the monitoring script so liveness checks need no
+pgrep, stops it with SIGTERM then SIGKILL, and restarts crashes with backoff
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import time
+
+
+class ProcessSupervisor:
+    def __init__(self, command, cwd=None, pidfile=None, stop_timeout=5.0,
+                 backoff_initial=1.0, backoff_max=60.0, stable_after=60.0, logger=None):
+        self.command = command
+        self.cwd = cwd
+        self.pidfile = pidfile
+        self.stop_timeout = stop_timeout        # seconds between SIGTERM and SIGKILL
+        self.backoff_initial = backoff_initial  # first restart delay after a crash
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after        # uptime that resets the backoff
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.process = None
+        self.wanted = False
+        self.started_at = None
+        self.backoff = backoff_initial
+        self.next_restart = None
+
+        self.stop_stale()
+
+    def is_running(self):
+        """Is the child alive? (waitpid, no fork)"""
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Launch the child directly (no shell) and mark it as wanted"""
+        self.wanted = True
+        self.next_restart = None
+        if self.is_running():
+            return True
+
+        try:
+            self.process = subprocess.Popen(self.command, cwd=self.cwd, start_new_session=True)
+            self.started_at = time.monotonic()
+            self.write_pidfile()
+            self.logger.info(f"Monitoring script started (pid {self.process.pid})")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error starting monitoring script: {e}")
+            self.schedule_restart()
+            return False
+
+    def stop(self):
+        """SIGTERM the child, SIGKILL it if it outlives the deadline"""
+        self.wanted = False
+        self.next_restart = None
+        if not self.is_running():
+            self.remove_pidfile()
+            return True
+
+        try:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=self.stop_timeout)
+            except subprocess.TimeoutExpired:
+                self.logger.warning(f"Monitoring script ignored SIGTERM for {self.stop_timeout}s - killing")
+                self.process.kill()
+                self.process.wait()
+            self.logger.info(f"Monitoring script stopped (exit code {self.process.returncode})")
+            self.remove_pidfile()
+            return True
+        except Exception as e:
+            self.logger.error(f"Error stopping monitoring script: {e}")
+            return False
+
+    def check(self):
+        """Reap an exited child and restart it when due - call after SIGCHLD"""
+        if self.process is not None and self.process.poll() is not None and self.wanted \
+                and self.next_restart is None:
+            uptime = time.monotonic() - self.started_at
+            if uptime >= self.stable_after:
+                self.backoff = self.backoff_initial
+            self.logger.warning(f"Monitoring script exited with code {self.process.returncode} "
+                                f"after {uptime:.1f}s")
+            self.remove_pidfile()
+            self.schedule_restart()
+
+        if self.next_restart is not None and time.monotonic() >= self.next_restart:
+            self.logger.info("Restarting monitoring script")
+            self.start()
+
+    def schedule_restart(self):
+        """Queue a restart after the current backoff delay"""
+        self.next_restart = time.monotonic() + self.backoff
+        self.logger.info(f"Restarting monitoring script in {self.backoff:.1f}s")
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+
+    def seconds_until_restart(self):
+        """Seconds until a pending restart, or None"""
+        if self.next_restart is None:
+            return None
+        return max(0.0, self.next_restart - time.monotonic())
+
+    def write_pidfile(self):
+        if not self.pidfile:
+            return
+        try:
+            with open(self.pidfile, 'w') as f:
+                f.write(f"{self.process.pid}\n")
+        except Exception as e:
+            self.logger.error(f"Error writing pidfile: {e}")
+
+    def remove_pidfile(self):
+        if self.pidfile and os.path.exists(self.pidfile):
+            try:
+                os.remove(self.pidfile)
+            except OSError:
+                pass
+
+    def stop_stale(self):
+        """Terminate a child left behind by a previous daemon instance"""
+        if not self.pidfile:
+            return
+        try:
+            with open(self.pidfile, 'r') as f:
+                pid = int(f.read().strip())
+            with open(f"/proc/{pid}/cmdline", 'rb') as f:
+                cmdline = f.read().split(b'\0')
+        except (OSError, ValueError):
+            self.remove_pidfile()
+            return
+
+        if os.fsencode(self.command[-1]) not in cmdline:
+            self.remove_pidfile()
+            return
+
+        self.logger.info(f"Stopping stale monitoring script (pid {pid})")
+        try:
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + self.stop_timeout
+            while os.path.exists(f"/proc/{pid}") and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if os.path.exists(f"/proc/{pid}"):
+                os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.remove_pidfile()
@@ -4,131 +4,414 @@ Remote Site Bluetooth Intrusion Detection - Fixed Version
 Integrates with web dashboard arm/disarm functionality
 """
 
+import argparse
 import asyncio
-import csv
 import logging
 import time
-from datetime import datetime
 import signal
-import sys
 import os
-import subprocess
-import json
 
-import RPi.GPIO as GPIO
-from bleak import BleakScanner
+try:
+    import RPi.GPIO as GPIO
+except ImportError:  # off the Pi - a simulated GPIO backend must be passed in
+    GPIO = None
+
+from adv_trace import TraceRecorder
+from alert_dispatcher import DEVICE_ID, AlertDispatcher
+from alert_policy import AlertPolicy
+from baseline_profile import BaselineProfile
+from config_cache import ConfigCache
+from arm_state import ArmStateClient
+from ble_scanner import ContinuousScanner
+from classic_inquiry import DEFAULT_PERIOD, DEFAULT_WINDOW, ClassicInquiry
+from control_socket import ControlServer
+from detection_store import DetectionStore
+from device_filter import DeviceFilter
+from event_log import EventSink, make_log_handler
+from identity_resolver import IdentityResolver
+from live_feed import LIVE_PORT, LiveFeed
+from metrics import MONITOR_METRICS_PORT, LoopLagMonitor, Metrics, SamplingProfiler, rss_bytes
+from outbound_queue import OutboundQueue
+from presence_tracker import PresenceTracker
+from scan_scheduler import ScanScheduler
+from sensor_fusion import FusionServer, SightingForwarder, parse_endpoint
+from telemetry import TELEMETRY_PATH, TelemetryUplink
 
 class RemoteSiteIDS:
-    def __init__(self):
+    def __init__(self, control_socket=None, standby=False, scanner=None, gpio=None,
+                 arm_state=None, dispatcher=None, record_trace=None, adapters=None,
+                 forward_to=None, aggregate_on=None, config=None, metrics_port=None,
+                 live_on=None, telemetry_url=TELEMETRY_PATH):
         # Configuration
         self.trigger_threshold = 45  # seconds
-        self.scan_interval = 8       # seconds between scans
+        self.scan_interval = 8       # seconds between arm checks while disarmed
+        self.tick_interval = 1.0     # seconds between detection ticks while armed
+        self.sighting_window = 15.0  # seconds a device counts as present after its last advertisement
         self.alarm_duration = 0      # 0 = no auto-stop
         self.relay_pin = 18
+        self.signal_threshold = -100     # minimum smoothed RSSI (dBm) to count a device
+        self.confidence_threshold = 1    # minimum sightings before a device counts
+        self.baseline_file = "baseline_devices.json"
+        self.auto_learn_quiet_time = 1800  # seconds around an alarm never learned as normal
+        self.learn_interval = 3600         # seconds between incremental baseline updates
+        self.adapters = ["hci0"]           # local HCI adapters scanned concurrently
+        self.node_id = os.uname().nodename # name this node reports to an aggregator
+        self.fusion_token = None           # shared secret between nodes and aggregator
+        self.fail_policy = "closed"        # armed state while the VPS is unreachable (closed/open/last)
+        self.quiet_scan_on = 5.0           # radio-on seconds per period once the site is quiet
+        self.quiet_scan_period = 30.0
+        self.disarmed_scan_on = 5.0        # radio-on seconds per period while disarmed (0 = off)
+        self.disarmed_scan_period = 120.0
+        self.alert_coalesce_window = 900.0 # seconds in which repeat triggers update one incident
+        self.alert_escalate_after = 120.0  # seconds an emailed incident must last before voice calls
+        self.classic_inquiry_window = DEFAULT_WINDOW  # seconds of BR/EDR inquiry per period
+        self.classic_inquiry_period = DEFAULT_PERIOD  # seconds between inquiry windows (0 = BLE only)
         
         # State tracking
+        self.clock = time.time
         self.running = True
+        self.local_armed = not standby   # arm/disarm from the schedule daemon
         self.alarm_active = False
         self.first_detection_time = None
         self.detected_devices = {}
+        self.last_learn = time.monotonic()
+        self.learn_task = None
         
         # Setup logging
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
             handlers=[
-                logging.FileHandler('remote_ids.log'),
+                make_log_handler('remote_ids.log'),
                 logging.StreamHandler()
             ]
         )
         self.logger = logging.getLogger(__name__)
         
+        # Parsed, validated and hot-reloaded config files shared by every component
+        self.config = config or ConfigCache(logger=self.logger)
+        self.load_startup_config()
+        self.apply_config()
+        self.config.file("detection").add_listener(self.apply_config)
+        self.config.file("ids").add_listener(self.apply_config)
+        
+        # Instrumentation: local Prometheus endpoint, periodic summary line, SIGUSR1 profiler
+        self.metrics = Metrics(logger=self.logger)
+        self.metrics_port = metrics_port
+        self.scan_time = self.metrics.histogram("scan", "Time to read qualifying devices from the tracker")
+        self.process_time = self.metrics.histogram("process_detections", "Time to evaluate one detection tick")
+        self.arm_check_time = self.metrics.histogram("is_armed", "Time spent checking the arm state")
+        self.loop_lag = LoopLagMonitor(self.metrics.histogram("loop_lag", "Event loop wake-up delay"))
+        self.advertisements = self.metrics.counter("advertisements_total", "Advertisements received")
+        self.alarms = self.metrics.counter("alarms_total", "Alarms triggered")
+        self.profiler = SamplingProfiler(logger=self.logger)
+        self.profiler_task = None
+        self.loop_task = None
+        
+        # Detection events are buffered and written in batches
+        self.event_sink = EventSink('remote_detections.csv', logger=self.logger)
+        
+        # Indexed history of events and per-device presence sessions
+        self.history = DetectionStore(logger=self.logger)
+        
+        # Own adapter, ignore list and baseline devices merged into one filter
+        self.device_filter = DeviceFilter(baseline_file=self.baseline_file, logger=self.logger)
+        
+        # Learned weekly presence/RSSI profiles - only outliers count as intruders
+        self.baseline = BaselineProfile(self.baseline_file, quiet_time=self.auto_learn_quiet_time,
+                                        logger=self.logger)
+        
+        # Long-lived scanner feeding the sighting table (replaceable for simulation)
+        self.scanner = scanner or ContinuousScanner(
+            adapter=adapters or self.adapters,
+            sighting_window=self.sighting_window,
+            logger=self.logger
+        )
+        self.scanner.device_filter = self.device_filter
+        self.scanner.add_listener(lambda mac, sighting: self.advertisements.inc())
+        
+        # Adaptive duty cycle: continuous while anything unexpected is around, short windows when quiet
+        self.scan_scheduler = ScanScheduler(
+            self.scanner,
+            quiet_after=self.auto_learn_quiet_time,
+            quiet_on=self.quiet_scan_on,
+            quiet_period=self.quiet_scan_period,
+            disarmed_on=self.disarmed_scan_on,
+            disarmed_period=self.disarmed_scan_period,
+            logger=self.logger
+        )
+        
+        # Classic BR/EDR inquiry windows on the first adapter, merged into the same sighting table
+        self.classic = None
+        if getattr(self.scanner, "adapters", None) and type(self.scanner) is ContinuousScanner:
+            self.classic = ClassicInquiry(self.scanner, adapter=self.scanner.adapters[0],
+                                          window=self.classic_inquiry_window,
+                                          period=self.classic_inquiry_period, logger=self.logger)
+        
+        # Rotating private addresses (and both radios of dual-mode devices) folded into one identity
+        self.resolver = IdentityResolver(logger=self.logger)
+        self.scanner.add_listener(self.resolver.observe)
+        
+        # Per-device presence state fed by every advertisement, keyed by identity
+        self.tracker = PresenceTracker(expiry=self.sighting_window, logger=self.logger)
+        self.resolver.add_listener(self.tracker.observe)
+        self.tracker.add_expire_listener(self.history.add_sighting)
+        
+        # Optional raw advertisement recording for offline threshold tuning
+        self.trace = TraceRecorder(record_trace, logger=self.logger) if record_trace else None
+        if self.trace:
+            self.scanner.add_listener(self.trace.record)
+        
+        # Sensor node: forward sightings and leave the trigger decision to the aggregator
+        self.forwarder = None
+        if forward_to:
+            host, port = parse_endpoint(forward_to)
+            self.forwarder = SightingForwarder(host, port, node_id=self.node_id, token=self.fusion_token,
+                                               logger=self.logger)
+            self.scanner.add_listener(self.forwarder.record)
+        
+        # Aggregator: fuse other nodes' sightings into the local pipeline
+        self.fusion = None
+        if aggregate_on:
+            host, port = parse_endpoint(aggregate_on)
+            self.fusion = FusionServer(host, port, self.scanner.record, token=self.fusion_token,
+                                       logger=self.logger)
+        
+        # Server-Sent Events feed of the in-memory state for the dashboard
+        self.live = None
+        if live_on:
+            host, port = parse_endpoint(live_on, LIVE_PORT)
+            self.live = LiveFeed(host, port, self.live_state, logger=self.logger)
+        
+        # Cached VPS arm state (fail closed: stay armed if the VPS is unreachable)
+        self.arm_state = arm_state or ArmStateClient(fail_policy=self.fail_policy, logger=self.logger)
+        
+        # Local arm/disarm commands from the schedule daemon
+        self.control = ControlServer(control_socket, self.handle_command, logger=self.logger) if control_socket else None
+        
+        # Store-and-forward queue for requests to the VPS (survives 4G outages and reboots)
+        self.outbox = OutboundQueue(logger=self.logger)
+        if hasattr(self.arm_state, "add_reconnect_listener"):
+            self.arm_state.add_reconnect_listener(self.outbox.link_up)
+        
+        # Batched, compressed heartbeat to the VPS - rare when quiet, frequent during an incident
+        self.telemetry = None
+        if telemetry_url:
+            self.telemetry = TelemetryUplink(self.outbox, DEVICE_ID, self.telemetry_status, self.telemetry_gauges,
+                                             histograms={"loop_lag": self.loop_lag.histogram,
+                                                         "process": self.process_time},
+                                             url=telemetry_url, logger=self.logger)
+            self.scanner.add_listener(self.telemetry.record)
+        
+        # Email/voice notifications run on a worker pool
+        self.dispatcher = dispatcher or AlertDispatcher(config=self.config.file("email"), outbox=self.outbox,
+                                                        logger=self.logger)
+        self.dispatcher.metrics = self.metrics
+        
+        # Coalesces repeat triggers into incidents, rate limits and escalates email -> voice
+        self.alerts = AlertPolicy(self.dispatcher, coalesce_window=self.alert_coalesce_window,
+                                  escalate_after=self.alert_escalate_after, logger=self.logger)
+        
+        self.metrics.gauge("tracked_devices", "Devices in the presence table", lambda: len(self.tracker.devices))
+        self.metrics.gauge("armed", "Effective arm state", lambda: self.is_armed())
+        self.metrics.gauge("alarm_active", "Relay energised", lambda: self.alarm_active)
+        self.metrics.gauge("outbox_depth", "Requests waiting for the VPS", lambda: self.outbox.stats()["depth"])
+        self.metrics.gauge("radio_on_seconds", "Seconds the BLE radio has been scanning",
+                           lambda: self.scan_scheduler.radio_seconds(self.clock()))
+        self.metrics.gauge("cpu_seconds", "Process CPU time", time.process_time)
+        
         # Setup GPIO
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.relay_pin, GPIO.OUT)
-        GPIO.output(self.relay_pin, GPIO.LOW)
-        self.logger.info("GPIO setup complete - Pin 18 ready")
-        
-        # Setup signal handlers
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
+        self.gpio = gpio or GPIO
+        self.gpio.setwarnings(False)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.relay_pin, self.gpio.OUT)
+        self.gpio.output(self.relay_pin, self.gpio.LOW)
+        self.logger.info(f"GPIO setup complete - Pin {self.relay_pin} ready")
     
-    def get_pi_mac(self):
-        """Get Pi's Bluetooth MAC address to ignore it"""
-        try:
-            result = subprocess.run(['/usr/bin/hciconfig', 'hci0'], capture_output=True, text=True)
-            for line in result.stdout.split('\n'):
-                if 'BD Address:' in line:
-                    mac = line.split('BD Address: ')[1].split()[0].upper()
-                    self.logger.info(f"Pi's Bluetooth MAC: {mac} (will be ignored)")
-                    return mac
-        except Exception as e:
-            self.logger.error(f"Error getting Pi MAC: {e}")
-        return None
+    def load_startup_config(self):
+        """Settings from bt_ids_config.json that need a restart (hardware, files, identity)"""
+        config = self.config.get("detection")
+        self.baseline_file = config.get("baseline_file", self.baseline_file)
+        self.relay_pin = config.get("relay_pin", self.relay_pin)
+        self.adapters = config.get("adapters", self.adapters)
+        self.node_id = config.get("node_id", self.node_id)
+        self.fusion_token = config.get("fusion_token", self.fusion_token)
+        self.fail_policy = config.get("fail_policy", self.fail_policy)
+    
+    def apply_config(self, _snapshot=None):
+        """Apply hot-reloadable thresholds from the cached config snapshots"""
+        detection = self.config.get("detection")
+        ids_config = self.config.get("ids")
+        settings = {
+            "signal_threshold": detection.get("signal_threshold", self.signal_threshold),
+            "confidence_threshold": detection.get("confidence_threshold", self.confidence_threshold),
+            "auto_learn_quiet_time": detection.get("auto_learn_quiet_time", self.auto_learn_quiet_time),
+            "quiet_scan_on": detection.get("quiet_scan_on", self.quiet_scan_on),
+            "quiet_scan_period": detection.get("quiet_scan_period", self.quiet_scan_period),
+            "disarmed_scan_on": detection.get("disarmed_scan_on", self.disarmed_scan_on),
+            "disarmed_scan_period": detection.get("disarmed_scan_period", self.disarmed_scan_period),
+            "alert_coalesce_window": detection.get("alert_coalesce_window", self.alert_coalesce_window),
+            "alert_escalate_after": detection.get("alert_escalate_after", self.alert_escalate_after),
+            "classic_inquiry_window": detection.get("classic_inquiry_window", self.classic_inquiry_window),
+            "classic_inquiry_period": detection.get("classic_inquiry_period", self.classic_inquiry_period),
+            "trigger_threshold": ids_config.get("trigger_threshold", self.trigger_threshold),
+            "scan_interval": ids_config.get("scan_interval", self.scan_interval)
+        }
+        for name, value in settings.items():
+            if getattr(self, name) != value:
+                if hasattr(self, "baseline"):
+                    self.logger.info(f"🔧 {name}: {getattr(self, name)} -> {value}")
+                setattr(self, name, value)
+        if hasattr(self, "baseline"):
+            self.baseline.quiet_time = self.auto_learn_quiet_time
+        if hasattr(self, "scan_scheduler"):
+            self.scan_scheduler.quiet_after = self.auto_learn_quiet_time
+            self.scan_scheduler.quiet_on = self.quiet_scan_on
+            self.scan_scheduler.quiet_period = self.quiet_scan_period
+            self.scan_scheduler.disarmed_on = self.disarmed_scan_on
+            self.scan_scheduler.disarmed_period = self.disarmed_scan_period
+        if hasattr(self, "alerts"):
+            self.alerts.coalesce_window = self.alert_coalesce_window
+            self.alerts.escalate_after = self.alert_escalate_after
+        if getattr(self, "classic", None):
+            self.classic.window = self.classic_inquiry_window
+            self.classic.period = self.classic_inquiry_period
     
     def is_armed(self):
-        """Check if system is armed by querying VPS"""
-        try:
-            import requests
-            response = requests.get(
-                'https://admin.securecaller.online/api/status',
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                armed = data.get("armed", False)
-                self.logger.debug(f"VPS armed status: {armed}")
-                return armed
-            else:
-                self.logger.debug(f"VPS status check failed: {response.status_code}")
-                return False
-        except Exception as e:
-            self.logger.debug(f"Could not check VPS armed state: {e}")
-            return False
+        """Check if system is armed locally (schedule daemon) and on the VPS"""
+        return self.local_armed and self.arm_state.is_armed()
+    
+    def handle_command(self, request):
+        """Handle a control socket command from the schedule daemon"""
+        command = request.get("command")
+        
+        if command in ("arm", "disarm"):
+            armed = command == "arm"
+            if armed != self.local_armed:
+                self.local_armed = armed
+                self.logger.info(f"🎛️  Local {'ARM' if armed else 'DISARM'} command received")
+                # Wake the loop so the change applies immediately
+                self.arm_state.changed.set()
+        elif command != "status":
+            return {"ok": False, "error": f"unknown command: {command}"}
+        
+        return {
+            "ok": True,
+            "local_armed": self.local_armed,
+            "armed": self.is_armed(),
+            "alarm_active": self.alarm_active,
+            "devices": len(self.detected_devices),
+            "outbox": self.outbox.stats(),
+            "power": self.scan_scheduler.stats(self.clock()),
+            "alerts": self.alerts.stats(),
+            "classic": self.classic.stats() if self.classic else None,
+            "telemetry": self.telemetry.stats() if self.telemetry else None
+        }
+    
+    def live_state(self):
+        """Status and device table pushed by the live feed"""
+        status = {
+            "armed": self.is_armed(),
+            "alarm": self.alarm_active,
+            "detecting_since": self.first_detection_time,
+            "trigger_threshold": self.trigger_threshold
+        }
+        devices = {mac: {
+            "name": entry['name'],
+            "rssi": entry['signal'],
+            "first_seen": round(entry['first_seen'], 1),
+            "intruder": mac in self.detected_devices,
+            "transport": entry['transport'],
+            "addresses": self.resolver.aliases(mac)
+        } for mac, entry in self.tracker.devices.items()}
+        return status, devices
+    
+    def telemetry_status(self):
+        """Cheap per-tick state for the telemetry uplink: (profile, armed, alarm)"""
+        armed = self.is_armed()
+        if self.alarm_active:
+            profile = "incident"
+        elif armed and self.first_detection_time is not None:
+            profile = "active"
+        else:
+            profile = "quiet"
+        return profile, armed, self.alarm_active
+    
+    def telemetry_gauges(self):
+        """Current values sampled into each telemetry sample"""
+        incident = self.alerts.incident
+        return {
+            "armed": self.is_armed(),
+            "alarm": self.alarm_active,
+            "scan_mode": self.scan_scheduler.mode,
+            "scanning": self.scanner.running,
+            "present": len(self.tracker.devices),
+            "intruders": len(self.detected_devices),
+            "incident": incident["id"] if incident and incident["active"] else None,
+            "alert_tier": incident["tier"] if incident and incident["active"] else None,
+            "outbox": self.outbox.stats()["depth"],
+            "rss_mb": round(rss_bytes() / 1e6, 1),
+            "cpu_s": round(time.process_time(), 1)
+        }
     
     async def scan_devices(self):
-        """Scan for Bluetooth devices"""
+        """Read qualifying devices from the presence tracker"""
         try:
-            devices = await BleakScanner.discover(timeout=5.0, return_adv=True)
-            found_devices = {}
-            pi_mac = self.get_pi_mac()
+            now = self.clock()
+            await self.scan_scheduler.apply(now)
             
-            for device, adv_data in devices.items():
-                # Handle device data properly
-                if isinstance(device, str):
-                    mac = device.upper()
-                    name = "Unknown"
-                else:
-                    mac = device.address.upper()
-                    name = device.name or "Unknown"
-                
-                # Skip Pi's own Bluetooth
-                if mac == pi_mac:
-                    continue
-                    
-                rssi = adv_data.rssi if hasattr(adv_data, 'rssi') else -100
-                
-                found_devices[mac] = {
-                    'name': name,
-                    'signal': rssi,
-                    'last_seen': datetime.now()
-                }
+            # Pick up edits to ignore_devices.txt / baseline_devices.json
+            if self.device_filter.maybe_reload():
+                self.scanner.apply_filter()
+                for mac in list(self.tracker.devices):
+                    if self.device_filter.is_ignored(mac):
+                        self.tracker.remove(mac)
             
-            return found_devices
+            self.scanner.recent(now=now)
+            qualified = self.tracker.qualified(self.signal_threshold, self.confidence_threshold, now)
+            found = {mac: info for mac, info in qualified.items()
+                     if self.baseline.is_anomalous(mac, info['rssi'], now)}
+            
+            # Anything non-baseline ramps straight back to continuous scanning
+            self.scan_scheduler.update(True, bool(found), now)
+            await self.scan_scheduler.apply(now)
+            return found
             
         except Exception as e:
             self.logger.error(f"Scan error: {e}")
             return {}
     
-    def log_event(self, event_type, details):
-        """Log detection events to CSV"""
+    async def forward_tick(self):
+        """Node mode: keep the scanner and filter current; the forwarder batches sightings"""
+        if not self.scanner.running:
+            await self.scanner.start()
+        if self.device_filter.maybe_reload():
+            self.scanner.apply_filter()
+        now = self.clock()
+        self.scanner.recent(now=now)
+        self.tracker.expire(now)
+    
+    def maybe_learn(self):
+        """Start an incremental baseline update in a worker thread when due"""
+        if self.learn_task is not None or time.monotonic() - self.last_learn < self.learn_interval:
+            return
+        self.last_learn = time.monotonic()
+        self.history.commit()
+        self.learn_task = asyncio.create_task(self.update_baseline())
+    
+    async def update_baseline(self):
+        """Learn new history off the loop, then swap the profile in"""
         try:
-            with open('remote_detections.csv', 'a', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([datetime.now().isoformat(), event_type, details])
+            self.baseline = await asyncio.to_thread(self.baseline.learned, self.history.path)
         except Exception as e:
-            self.logger.error(f"Error logging event: {e}")
+            self.logger.error(f"Baseline learning error: {e}")
+        finally:
+            self.learn_task = None
+    
+    def log_event(self, event_type, details):
+        """Log detection events to the buffered event sink"""
+        self.event_sink.write(event_type, details)
+        self.history.add_event(event_type, details)
     
     def trigger_alarm(self, device_count):
         """Trigger alarm and send notifications"""
@@ -136,194 +419,34 @@ class RemoteSiteIDS:
             return
             
         self.alarm_active = True
+        self.alarms.inc()
         self.logger.warning(f"🚨 ALARM TRIGGERED! {device_count} device(s) detected for {self.trigger_threshold}+ seconds")
         
         # Activate relay
-        GPIO.output(self.relay_pin, GPIO.HIGH)
+        self.gpio.output(self.relay_pin, self.gpio.HIGH)
         
         # Create device list for notifications
-        device_list = "\n".join([f"- {info['name']} ({mac}) - {info['signal']}dBm" 
-                                for mac, info in self.detected_devices.items()])
+        device_list = "\n".join([f"- {info['name']} ({mac}) - {info['signal']}dBm"
+                                 + (f" [{info['transport']}]" if info.get('transport', "le") != "le" else "")
+                                 + (f" [{self.resolver.aliases(mac)} addresses]" if self.resolver.aliases(mac) > 1 else "")
+                                 for mac, info in self.detected_devices.items()])
         
-        # Send notifications
-        self.send_email_alert(device_count, device_list)
-        self.send_voice_alerts(device_count, device_list)
+        # Notifications go out in the background as the alert policy allows
+        self.alerts.alarm(self.detected_devices, device_count, device_list, self.clock())
         
         self.log_event("ALARM_TRIGGERED", f"{device_count} devices detected")
     
     def stop_alarm(self):
         """Stop the alarm"""
         if self.alarm_active:
-            GPIO.output(self.relay_pin, GPIO.LOW)
+            self.gpio.output(self.relay_pin, self.gpio.LOW)
             self.alarm_active = False
+            self.alerts.clear(self.clock())
             self.logger.info("🔇 Alarm stopped")
     
-    def send_email_alert(self, device_count, device_list):
-        """Send email notification"""
-        try:
-            import smtplib
-            from email.message import EmailMessage
-            
-            # Load email config
-            with open("/home/andrewdarr/intrusion/email_config.json", "r") as f:
-                email_config = json.load(f)
-            
-            if not email_config.get("email_enabled", False):
-                return
-            
-            # Create message
-            msg = EmailMessage()
-            body = f"""🚨 SECURITY ALERT 🚨
-
-INTRUSION DETECTED at {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-
-Number of devices detected: {device_count}
-Device ID: {email_config.get("device_id", "Unknown Device")}
-Device details:
-{device_list}
-
-System Status: ARMED and TRIGGERED
-Relay: ACTIVATED
-"""
-            
-            msg.set_content(body)
-            msg["Subject"] = email_config["subject"]
-            msg["From"] = email_config["sender_email"]
-            msg["To"] = email_config["recipient_email"]
-            
-            # Send email
-            server = smtplib.SMTP(email_config["smtp_server"], email_config["smtp_port"])
-            server.starttls()
-            server.login(email_config["sender_email"], email_config["sender_password"])
-            server.send_message(msg)
-            server.quit()
-            
-            self.logger.info("📧 Email alert sent!")
-            
-        except Exception as e:
-            self.logger.error(f"📧 Email failed: {e}")
-    
-    def send_voice_alerts(self, device_count, device_list):
-        """Send voice call notifications"""
-        try:
-            import smtplib
-            from email.message import EmailMessage
-            
-            # Load email config (which contains voice settings)
-            with open("/home/andrewdarr/intrusion/email_config.json", "r") as f:
-                email_config = json.load(f)
-            
-            voice_config = email_config.get("voice", {})
-            
-            if not voice_config.get("enabled", False):
-                self.logger.info("Voice calls disabled, skipping...")
-                return
-            
-            # Get phone numbers and message
-            phone_numbers = [
-                voice_config.get("phone1", ""),
-                voice_config.get("phone2", ""),
-                voice_config.get("phone3", "")
-            ]
-            message = voice_config.get("message", "Security alert detected")[:60]
-            
-            success_count = 0
-            for phone in phone_numbers:
-                if phone.strip():
-                    try:
-                        # Convert to E.164 format for Telnyx
-                        import requests
-                        phone_formatted = phone.strip()
-                        if phone_formatted.startswith('0'):
-                            phone_formatted = '+61' + phone_formatted[1:]
-                        elif not phone_formatted.startswith('+'):
-                            phone_formatted = '+' + phone_formatted
-                        
-                        # Call VPS Telnyx API
-                        response = requests.post(
-                            'https://admin.securecaller.online/api/make-call',
-                            json={
-                                'phone_numbers': [phone_formatted],
-                                'message': message,
-                                'device_id': 'btids001'
-                            },
-                            timeout=10
-                        )
-                        
-                        if response.status_code != 200:
-                            raise Exception(f"API returned {response.status_code}")
-                        
-                        self.logger.info(f"📞 Voice call sent to {phone}")
-                        success_count += 1
-                        
-                    except Exception as e:
-                        self.logger.error(f"📞 Voice call failed to {phone}: {e}")
-            
-            self.logger.info(f"📞 Voice alerts completed: {success_count} calls sent")
-            
-            # Send additional email notifications
-            self.send_additional_emails(device_count, device_list, email_config)
-            
-        except Exception as e:
-            self.logger.error(f"📞 Voice alert system failed: {e}")
-    
-    def send_additional_emails(self, device_count, device_list, email_config):
-        """Send alerts to additional email addresses"""
-        try:
-            import smtplib
-            from email.message import EmailMessage
-            
-            voice_config = email_config.get("voice", {})
-            additional_emails = [
-                voice_config.get("email1", ""),
-                voice_config.get("email2", ""),
-                voice_config.get("email3", "")
-            ]
-            
-            success_count = 0
-            for email in additional_emails:
-                if email.strip():
-                    try:
-                        # Create email message
-                        msg = EmailMessage()
-                        email_body = f"""
-SECURITY ALERT - Bluetooth Intrusion Detected
-
-Device ID: {email_config.get('device_id', 'BT-IDS')}
-Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Devices Detected: {device_count}
-
-Device Details:
-{device_list}
-
-This is an automated alert from your Bluetooth Intrusion Detection System.
-"""
-                        msg.set_content(email_body)
-                        msg["Subject"] = email_config.get("subject", "Security Alert")
-                        msg["From"] = email_config["sender_email"]
-                        msg["To"] = email.strip()
-                        
-                        # Send email
-                        server = smtplib.SMTP(email_config["smtp_server"], email_config["smtp_port"])
-                        server.starttls()
-                        server.login(email_config["sender_email"], email_config["sender_password"])
-                        server.send_message(msg)
-                        server.quit()
-                        
-                        self.logger.info(f"📧 Additional email sent to {email}")
-                        success_count += 1
-                        
-                    except Exception as e:
-                        self.logger.error(f"📧 Email failed to {email}: {e}")
-            
-            self.logger.info(f"📧 Additional emails completed: {success_count} emails sent")
-            
-        except Exception as e:
-            self.logger.error(f"📧 Additional email system failed: {e}")
-    
     def process_detections(self, found_devices):
-        """Process detected devices and trigger alarms if needed"""
-        current_time = datetime.now()
+        """Process present devices and trigger alarms on per-device dwell time"""
+        current_time = self.clock()
         
         if found_devices:
             # Devices detected
@@ -335,15 +458,17 @@ This is an automated alert from your Bluetooth Intrusion Detection System.
                 for mac, info in found_devices.items():
                     self.logger.info(f"   Device: {info['name']} ({mac}) - {info['signal']}dBm")
             
-            self.detected_devices.update(found_devices)
+            self.detected_devices = found_devices
             
-            # Check if we should trigger alarm
+            # Trigger once any single device has stayed long enough
             if not self.alarm_active:
-                time_elapsed = (current_time - self.first_detection_time).total_seconds()
-                self.logger.info(f"⏱️  Devices present for {time_elapsed:.1f}s (trigger at {self.trigger_threshold}s)")
+                dwelling = [mac for mac, info in found_devices.items()
+                            if self.tracker.dwell(info) >= self.trigger_threshold]
+                longest = max(self.tracker.dwell(info) for info in found_devices.values())
+                self.logger.debug(f"⏱️  Longest device dwell {longest:.1f}s (trigger at {self.trigger_threshold}s)")
                 
-                if time_elapsed >= self.trigger_threshold:
-                    self.trigger_alarm(len(found_devices))
+                if dwelling:
+                    self.trigger_alarm(len(dwelling))
                     
         else:
             # No devices detected
@@ -360,59 +485,173 @@ This is an automated alert from your Bluetooth Intrusion Detection System.
         self.logger.info(f"⚙️  Configuration: {self.trigger_threshold}s trigger, {self.alarm_duration}s alarm duration")
         self.logger.info("👀 Monitoring for Bluetooth devices...")
         
-        while self.running:
-            try:
-                # Check if system is armed
-                if not self.is_armed():
-                    # System is disarmed, clear any active detection state
-                    if self.first_detection_time is not None:
-                        self.logger.info("🔓 System disarmed - clearing detection state")
-                        self.first_detection_time = None
-                        self.detected_devices = {}
-                        self.stop_alarm()
+        self.outbox.start()
+        self.metrics.start_server(self.metrics_port)
+        await self.loop_lag.start()
+        if self.forwarder:
+            await self.forwarder.start()
+        else:
+            await self.arm_state.start()
+        if self.control:
+            await self.control.start()
+        if self.fusion:
+            await self.fusion.start()
+        if self.live:
+            await self.live.start()
+        if self.classic:
+            await self.classic.start()
+        
+        # Signals are handled on the event loop, never in the middle of a tick
+        self.loop_task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, self.request_stop)
+        loop.add_signal_handler(signal.SIGTERM, self.request_stop)
+        loop.add_signal_handler(signal.SIGUSR1, self.toggle_profiler)
+        
+        try:
+            while self.running:
+                try:
+                    # Batched writes of buffered events and history
+                    self.event_sink.maybe_flush()
+                    self.history.maybe_commit()
+                    self.config.maybe_reload()
+                    self.metrics.maybe_log_summary()
+                    if self.telemetry:
+                        self.telemetry.tick(self.clock())
+                    self.maybe_learn()
                     
-                    await asyncio.sleep(self.scan_interval)
-                    continue
-                
-                # System is armed, proceed with detection
-                found_devices = await self.scan_devices()
-                self.process_detections(found_devices)
-                await asyncio.sleep(self.scan_interval)
-                
-            except Exception as e:
-                self.logger.error(f"Monitoring loop error: {e}")
-                await asyncio.sleep(5)
+                    # Sensor node: keep scanning, the aggregator decides
+                    if self.forwarder:
+                        await self.forward_tick()
+                        await asyncio.sleep(self.tick_interval)
+                        continue
+                    
+                    # Check if system is armed
+                    with self.arm_check_time.time():
+                        armed = self.is_armed()
+                    if not armed:
+                        # System is disarmed, clear any active detection state
+                        if self.first_detection_time is not None:
+                            self.logger.info("🔓 System disarmed - clearing detection state")
+                            self.first_detection_time = None
+                            self.detected_devices = {}
+                            self.tracker.clear()
+                            self.stop_alarm()
+                        
+                        # Scan rarely (or not at all) while disarmed
+                        now = self.clock()
+                        self.scan_scheduler.update(False, False, now)
+                        await self.scan_scheduler.apply(now)
+                        await self.arm_state.wait_for_change(
+                            min(self.scan_interval, self.scan_scheduler.seconds_until_change(now) or self.scan_interval))
+                        continue
+                    
+                    # System is armed, evaluate the sighting table on every tick
+                    with self.scan_time.time():
+                        found_devices = await self.scan_devices()
+                    with self.process_time.time():
+                        self.process_detections(found_devices)
+                    if self.alarm_active:
+                        self.alerts.update(self.clock(), len(self.detected_devices))
+                    
+                    # Radio off between quiet-mode windows: nothing to evaluate until the next one
+                    idle = None if self.scanner.running else self.scan_scheduler.seconds_until_change(self.clock())
+                    if idle and idle > self.tick_interval:
+                        await self.arm_state.wait_for_change(idle)
+                    else:
+                        await asyncio.sleep(self.tick_interval)
+                    
+                except Exception as e:
+                    self.logger.error(f"Monitoring loop error: {e}")
+                    await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            if self.running:  # cancelled by someone else, not by request_stop()
+                raise
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1):
+                loop.remove_signal_handler(sig)
+            if self.classic:
+                await self.classic.stop()
+            if self.live:
+                await self.live.stop()
+            await self.loop_lag.stop()
+            self.metrics.stop_server()
+            if self.fusion:
+                await self.fusion.stop()
+            if self.forwarder:
+                await self.forwarder.stop()
+            if self.control:
+                await self.control.stop()
+            await self.arm_state.stop()
+            await self.scanner.stop()
     
-    def signal_handler(self, sig, frame):
-        """Handle shutdown signals"""
+    def request_stop(self):
+        """SIGINT/SIGTERM: leave the monitoring loop, which cleans up behind it"""
         self.logger.info("Received shutdown signal...")
-        self.shutdown()
+        self.running = False
+        # Wake the loop from whatever wait it is in
+        if self.loop_task is not None:
+            self.loop_task.cancel()
+    
+    def toggle_profiler(self):
+        """SIGUSR1: start profiling, or stop and write the report off the event loop"""
+        if not self.profiler.running:
+            self.profiler.start()
+        elif self.profiler_task is None or self.profiler_task.done():
+            self.profiler_task = asyncio.ensure_future(asyncio.to_thread(self.profiler.stop))
     
     def shutdown(self):
-        """Clean shutdown"""
+        """Clean shutdown - call once the monitoring loop has returned"""
         self.logger.info("🔥 Shutting down Remote Site IDS...")
         self.running = False
         self.stop_alarm()
-        GPIO.cleanup()
+        self.dispatcher.shutdown()
+        if self.telemetry:
+            self.telemetry.flush(self.clock())
+        self.outbox.close()
+        self.event_sink.close()
+        if self.trace:
+            self.trace.close()
+        self.tracker.clear()
+        self.history.close()
+        self.gpio.cleanup()
         self.logger.info("Shutdown complete")
-        sys.exit(0)
 
 async def main():
+    parser = argparse.ArgumentParser(description="Remote Site Bluetooth Intrusion Detection")
+    parser.add_argument("--control-socket", help="Unix socket for arm/disarm commands from the schedule daemon")
+    parser.add_argument("--standby", action="store_true", help="start locally disarmed until an arm command arrives")
+    parser.add_argument("--record-trace", metavar="PATH", help="append raw advertisements to a binary trace (.btr)")
+    parser.add_argument("--adapters", help="comma-separated HCI adapters to scan (default from config, hci0)")
+    parser.add_argument("--forward-to", metavar="HOST:PORT", help="sensor node: forward sightings to an aggregator")
+    parser.add_argument("--aggregate", metavar="[HOST:]PORT", help="aggregator: accept sightings from sensor nodes")
+    parser.add_argument("--metrics-port", type=int, default=MONITOR_METRICS_PORT,
+                        help="local Prometheus endpoint port (0 = off)")
+    parser.add_argument("--live", metavar="[HOST:]PORT", default=f"127.0.0.1:{LIVE_PORT}",
+                        help="Server-Sent Events feed for the dashboard ('' = off)")
+    parser.add_argument("--telemetry-url", default=TELEMETRY_PATH,
+                        help="telemetry endpoint: a path on the VPS or a full URL such as the "
+                             "telemetry.py stand-in ('' = off)")
+    args = parser.parse_args()
+    
     print("🔥  Remote Site Bluetooth Intrusion Detection")
     print("=" * 50)
     print("Mode: Respects web dashboard ARM/DISARM state")
     print("Press Ctrl+C to stop")
     print("=" * 50)
     
-    ids = RemoteSiteIDS()
+    ids = RemoteSiteIDS(control_socket=args.control_socket, standby=args.standby,
+                        record_trace=args.record_trace, adapters=args.adapters,
+                        forward_to=args.forward_to, aggregate_on=args.aggregate,
+                        metrics_port=args.metrics_port, live_on=args.live,
+                        telemetry_url=args.telemetry_url)
     
     try:
         await ids.monitoring_loop()
-    except KeyboardInterrupt:
-        ids.shutdown()
     except Exception as e:
         ids.logger.error(f"Fatal error: {e}")
-        ids.shutdown()
+    # Blocking cleanup (worker joins, final flushes) off the event loop
+    await asyncio.to_thread(ids.shutdown)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Adaptive scan duty cycle for the Bluetooth IDS
+Scans continuously while armed and anything unexpected is (or recently was)
+around, drops to short scan windows once the site has been quiet for
+quiet_after seconds, and scans rarely or not at all while disarmed.
+Radio-on time and process CPU time are accounted per mode for battery and
+solar sizing.
+"""
+
+import logging
+import time
+
+CONTINUOUS = "continuous"
+QUIET = "quiet"
+DISARMED = "disarmed"
+MODES = (CONTINUOUS, QUIET, DISARMED)
+
+
+class ScanScheduler:
+    def __init__(self, scanner, quiet_after=1800.0, quiet_on=5.0, quiet_period=30.0,
+                 disarmed_on=5.0, disarmed_period=120.0, logger=None):
+        self.scanner = scanner
+        self.quiet_after = quiet_after          # seconds without activity before scanning backs off
+        self.quiet_on = quiet_on                # radio-on seconds per quiet period
+        self.quiet_period = quiet_period
+        self.disarmed_on = disarmed_on          # radio-on seconds per disarmed period (0 = radio off)
+        self.disarmed_period = disarmed_period
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.mode = CONTINUOUS
+        self.mode_since = None
+        self.last_activity = None
+        self.radio_on_since = None
+        self.radio_on_time = 0.0
+        self.started = None
+        self.accounted_at = None
+
+        # Per-mode accounting (scheduler clock for time, process CPU for load)
+        self.mode_time = dict.fromkeys(MODES, 0.0)
+        self.mode_cpu = dict.fromkeys(MODES, 0.0)
+        self.mode_wall = dict.fromkeys(MODES, 0.0)
+        self.cpu_mark = time.process_time()
+        self.wall_mark = time.monotonic()
+
+    def duty(self, mode=None):
+        """(on, period) for a duty-cycled mode, None for continuous"""
+        mode = mode or self.mode
+        if mode == QUIET:
+            return self.quiet_on, self.quiet_period
+        if mode == DISARMED:
+            return self.disarmed_on, self.disarmed_period
+        return None
+
+    def update(self, armed, active, now):
+        """Pick the mode from the arm state and whether anything non-baseline is present"""
+        if self.started is None:
+            self.started = self.mode_since = self.last_activity = self.accounted_at = now
+        if active:
+            self.last_activity = now
+
+        if not armed:
+            mode = DISARMED
+        elif active or now - self.last_activity < self.quiet_after:
+            mode = CONTINUOUS
+        else:
+            mode = QUIET
+
+        if mode != self.mode:
+            self.account(now)
+            previous, self.mode, self.mode_since = self.mode, mode, now
+            duty = self.duty()
+            window = "continuous" if duty is None else (f"{duty[0]:g}s every {duty[1]:g}s" if duty[0] > 0 else "off")
+            self.logger.info(f"🔋 Scanning {previous} -> {mode} ({window}) - {self.summary(now)}")
+
+    def account(self, now):
+        """Charge time and CPU since the last accounting to the current mode"""
+        if self.accounted_at is None:
+            return
+        cpu, wall = time.process_time(), time.monotonic()
+        self.mode_time[self.mode] += now - self.accounted_at
+        self.mode_cpu[self.mode] += cpu - self.cpu_mark
+        self.mode_wall[self.mode] += wall - self.wall_mark
+        self.accounted_at, self.cpu_mark, self.wall_mark = now, cpu, wall
+
+    def radio_wanted(self, now):
+        duty = self.duty()
+        if duty is None:
+            return True
+        on, period = duty
+        return on > 0 and (now - self.mode_since) % period < on
+
+    def seconds_until_change(self, now):
+        """Seconds until the radio is next switched (None while continuous or off)"""
+        duty = self.duty()
+        if duty is None or duty[0] <= 0:
+            return None
+        on, period = duty
+        phase = (now - self.mode_since) % period
+        return on - phase if phase < on else period - phase
+
+    async def apply(self, now):
+        """Switch the radio to match the current mode and phase"""
+        if self.scanner.running and self.radio_on_since is None:
+            self.radio_on_since = now
+        wanted = self.radio_wanted(now)
+        if wanted and not self.scanner.running:
+            await self.scanner.start()
+            self.radio_on_since = now
+        elif not wanted and self.scanner.running:
+            await self.scanner.stop()
+            self.radio_on_time += now - self.radio_on_since
+            self.radio_on_since = None
+
+    def radio_seconds(self, now):
+        return self.radio_on_time + (now - self.radio_on_since if self.radio_on_since is not None else 0.0)
+
+    def stats(self, now):
+        """Radio-on time, duty and CPU load overall and per mode"""
+        self.account(now)
+        elapsed = sum(self.mode_time.values())
+        cpu = sum(self.mode_cpu.values())
+        wall = sum(self.mode_wall.values())
+        return {
+            "mode": self.mode,
+            "radio_on_seconds": round(self.radio_seconds(now), 1),
+            "radio_duty": round(self.radio_seconds(now) / elapsed, 3) if elapsed else None,
+            "cpu_seconds": round(cpu, 2),
+            "cpu_load": round(cpu / wall, 4) if wall else None,
+            "modes": {mode: {"seconds": round(self.mode_time[mode], 1),
+                             "cpu_load": round(self.mode_cpu[mode] / self.mode_wall[mode], 4)
+                             if self.mode_wall[mode] else None}
+                      for mode in MODES if self.mode_time[mode]}
+        }
+
+    def summary(self, now):
+        stats = self.stats(now)
+        if stats["radio_duty"] is None:
+            return "no time accounted yet"
+        return (f"radio on {stats['radio_on_seconds']:.0f}s ({100 * stats['radio_duty']:.0f}%), "
+                f"CPU {100 * (stats['cpu_load'] or 0):.1f}%")
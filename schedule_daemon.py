@@ -1,28 +1,48 @@
 #!/usr/bin/env python3
 """
 Schedule Daemon for Bluetooth IDS
-Automatically starts/stops monitoring script based on schedule and manual overrides
+Keeps the monitoring script resident and arms/disarms it over its control
+socket based on schedule and manual overrides
 """
 
-import json
 import os
-import subprocess
 import time
 import logging
 import signal
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from config_cache import config_path
+from config_store import ConfigStore
+from control_socket import send_command
+from metrics import DAEMON_METRICS_PORT, Metrics, SamplingProfiler
+from process_supervisor import ProcessSupervisor
+from schedule_engine import WeeklySchedule
 
 class ScheduleDaemon:
     def __init__(self):
-        self.config_file = "/home/andrewdarr/intrusion/ids_config.json"
+        self.config_file = config_path("ids_config.json")
         self.monitoring_script = "/home/andrewdarr/intrusion/remote_site_with_email.py"
         self.venv_path = "/home/andrewdarr/intrusion/.venv"
         self.working_dir = "/home/andrewdarr/intrusion"
+        self.control_socket = "/home/andrewdarr/intrusion/ids_control.sock"
+        
+        self.liveness_interval = 30   # seconds between monitoring script health checks
+        self.watch_interval = 0.5     # seconds between config file checks where inotify is unavailable
+        self.command_retry = 0.5      # seconds between attempts to reach the monitor
         
         self.running = True
         self.last_effective_status = None
-        self.last_config_check = None
+        self.config_version = None
+        self.schedule = WeeklySchedule({})
+        # SIGCHLD wakes the sleeping loop through a pipe it selects on alongside the config watch
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        os.set_blocking(self.wakeup_read, False)
+        os.set_blocking(self.wakeup_write, False)
+        
+        # Last arm state the monitor acknowledged, and for which child instance
+        self.commanded_status = None
+        self.commanded_start = None
         
         # Setup logging
         logging.basicConfig(
@@ -35,90 +55,100 @@ class ScheduleDaemon:
         )
         self.logger = logging.getLogger(__name__)
         
+        # Shared with the web UI: atomic, versioned writes and change notification
+        self.store = ConfigStore(self.config_file, poll_interval=self.watch_interval, logger=self.logger)
+        
+        # Instrumentation: local Prometheus endpoint, periodic summary line, SIGUSR1 profiler
+        self.metrics = Metrics(prefix="btids_daemon", logger=self.logger)
+        self.evaluation_time = self.metrics.histogram("evaluation", "Time to evaluate the arm state once")
+        self.command_time = self.metrics.histogram("command", "Control socket round trip to the monitor")
+        self.config_loads = self.metrics.counter("config_loads_total", "ids_config.json reloads")
+        self.metrics.gauge("config_version", "ids_config.json version", lambda: self.config_version)
+        self.metrics.gauge("config_writes", "ids_config.json writes by the daemon", lambda: self.store.writes)
+        self.metrics.gauge("monitor_running", "Monitoring script alive", lambda: self.supervisor.is_running())
+        self.metrics.gauge("armed", "Effective arm state", lambda: self.last_effective_status)
+        self.profiler = SamplingProfiler(logger=self.logger)
+        
+        # Monitoring script stays resident as a supervised child (venv interpreter, no shell)
+        # and starts disarmed until it is told otherwise over the control socket
+        self.supervisor = ProcessSupervisor(
+            [f"{self.venv_path}/bin/python3", self.monitoring_script,
+             "--standby", "--control-socket", self.control_socket],
+            cwd=self.working_dir,
+            pidfile=f"{self.working_dir}/remote_site_with_email.pid",
+            logger=self.logger
+        )
+        
         # Signal handlers
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
+        signal.signal(signal.SIGCHLD, self.child_handler)
+        signal.signal(signal.SIGUSR1, self.profiler.toggle)
     
     def load_config(self):
-        """Load configuration from JSON file"""
-        try:
-            with open(self.config_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"Error loading config: {e}")
-            return {}
+        """Latest configuration from the store, compiling its schedule when it changed"""
+        version, config = self.store.read()
+        if version != self.config_version:
+            self.config_version = version
+            self.config_loads.inc()
+            self.schedule = WeeklySchedule(config.get("schedule", {}))
+        return config
     
-    def save_config(self, config):
-        """Save configuration to JSON file"""
+    def save_config(self, changes, expected=None):
+        """Merge changes into the latest config in one atomic, versioned write
+        
+        expected maps keys to the values the change was based on - if another
+        writer moved any of them in the meantime the change is dropped.
+        """
+        def mutate(config):
+            if expected and any(config.get(key) != value for key, value in expected.items()):
+                return config
+            config.update(changes)
+            return config
+        
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            self.store.update(mutate)
         except Exception as e:
             self.logger.error(f"Error saving config: {e}")
     
+    def wait_for_config_change(self, timeout):
+        """Sleep until timeout, a config change or a wakeup - returns True on change"""
+        changed = self.store.wait_for_change(self.config_version, timeout, wake_fd=self.wakeup_read)
+        try:
+            while os.read(self.wakeup_read, 64):
+                pass
+        except BlockingIOError:
+            pass
+        return changed
+    
     def get_next_schedule_transition_time(self, config):
         """Calculate when the next schedule transition will occur"""
         try:
-            current_time = datetime.now()
-            
-            # Check today and next few days for transitions
-            for days_ahead in range(0, 7):  # Check up to 1 week ahead
-                check_date = current_time.date() + timedelta(days=days_ahead)
-                check_day = check_date.strftime('%A').lower()
-                
-                day_schedule = config.get("schedule", {}).get(check_day, {})
-                if not day_schedule.get("enabled", False):
-                    continue
-                
-                start_time_str = day_schedule.get("start", "18:00")
-                end_time_str = day_schedule.get("end", "06:00")
-                
-                start_time = datetime.combine(check_date, 
-                    datetime.strptime(start_time_str, '%H:%M').time())
-                end_time = datetime.combine(check_date, 
-                    datetime.strptime(end_time_str, '%H:%M').time())
-                
-                # Handle overnight schedules
-                if start_time.time() > end_time.time():
-                    end_time += timedelta(days=1)
-                
-                # Find next transition after current time
-                if days_ahead == 0:  # Today
-                    if current_time < start_time:
-                        return start_time
-                    elif current_time < end_time:
-                        return end_time
-                else:  # Future days
-                    return start_time
-            
-            return None
+            return self.schedule.next_transition(datetime.now())
         except Exception as e:
             self.logger.error(f"Error calculating next transition: {e}")
             return None
     
     def check_override_expiry(self, config):
-        """Check if manual override has expired"""
+        """Check if manual override has expired (config snapshots are read-only)"""
         if not config.get("manual_override", False):
-            return config, False
+            return False
         
         override_expires = config.get("override_expires")
         if not override_expires:
-            return config, False
+            return False
         
         try:
             expire_time = datetime.fromisoformat(override_expires)
             current_time = datetime.now()
             
             if current_time >= expire_time:
-                # Override has expired, revert to schedule
-                config["manual_override"] = False
-                config["override_expires"] = None
                 self.logger.info(f"Manual override expired, reverting to schedule control")
-                return config, True
+                return True
         except Exception as e:
             self.logger.error(f"Error checking override expiry: {e}")
         
-        return config, False
+        return False
     
     def check_schedule_status(self, config):
         """Check if system should be armed based on current schedule"""
@@ -126,33 +156,37 @@ class ScheduleDaemon:
             return False, False
         
         try:
-            current_time = datetime.now()
-            current_day = current_time.strftime('%A').lower()
-            current_time_obj = current_time.time()
-            
-            day_schedule = config.get("schedule", {}).get(current_day, {})
-            
-            if not day_schedule.get("enabled", False):
-                return True, False
-            
-            start_time_str = day_schedule.get("start", "18:00")
-            end_time_str = day_schedule.get("end", "06:00")
-            
-            start_time_obj = datetime.strptime(start_time_str, '%H:%M').time()
-            end_time_obj = datetime.strptime(end_time_str, '%H:%M').time()
-            
-            # Handle overnight schedules
-            if start_time_obj > end_time_obj:
-                should_be_armed = current_time_obj >= start_time_obj or current_time_obj <= end_time_obj
-            else:
-                should_be_armed = start_time_obj <= current_time_obj <= end_time_obj
-            
-            return True, should_be_armed
-            
+            return True, self.schedule.is_active(datetime.now())
         except Exception as e:
             self.logger.error(f"Error checking schedule: {e}")
             return False, False
     
+    def seconds_until_next_event(self, config):
+        """Seconds until the next schedule edge, override expiry, restart or health check"""
+        current_time = datetime.now()
+        candidates = [self.liveness_interval]
+        
+        restart_in = self.supervisor.seconds_until_restart()
+        if restart_in is not None:
+            candidates.append(restart_in)
+        
+        # Monitor still booting or unreachable - retry the pending command soon
+        if self.command_pending():
+            candidates.append(self.command_retry)
+        
+        if config.get("manual_override", False) and config.get("override_expires"):
+            try:
+                expire_time = datetime.fromisoformat(config["override_expires"])
+                candidates.append((expire_time - current_time).total_seconds())
+            except Exception:
+                pass
+        elif config.get("schedule_enabled", False):
+            next_transition = self.schedule.next_transition(current_time)
+            if next_transition:
+                candidates.append((next_transition - current_time).total_seconds())
+        
+        return max(0.0, min(candidates))
+    
     def get_effective_arm_status(self, config):
         """Get effective arm status considering manual override and schedule"""
         # If manual override is active, use manual setting
@@ -168,63 +202,58 @@ class ScheduleDaemon:
     
     def is_monitoring_script_running(self):
         """Check if monitoring script is currently running"""
+        return self.supervisor.is_running()
+    
+    def command_pending(self):
+        """Does the running monitor still need to hear the current arm state?"""
+        return (self.supervisor.is_running() and
+                (self.commanded_start != self.supervisor.started_at or
+                 self.commanded_status != self.last_effective_status))
+    
+    def send_arm_state(self, should_be_armed):
+        """Tell the resident monitor to arm or disarm"""
         try:
-            result = subprocess.run(['/usr/bin/pgrep', '-f', 'remote_site_with_email.py'], 
-                                  capture_output=True, text=True)
-            return len(result.stdout.strip()) > 0
-        except:
+            with self.command_time.time():
+                reply = send_command(self.control_socket, "arm" if should_be_armed else "disarm")
+            if not reply.get("ok"):
+                raise Exception(reply.get("error"))
+            self.commanded_status = should_be_armed
+            self.commanded_start = self.supervisor.started_at
+            self.logger.info(f"Monitoring {'ARMED' if should_be_armed else 'DISARMED'} via control socket")
+            return True
+        except Exception as e:
+            self.logger.debug(f"Monitor not reachable on control socket yet: {e}")
             return False
     
     def start_monitoring_script(self):
         """Start the monitoring script"""
-        try:
-            cmd = f"cd {self.working_dir} && source {self.venv_path}/bin/activate && python3 {self.monitoring_script}"
-            subprocess.Popen(["/bin/bash", "-c", cmd], cwd=self.working_dir)
-            
-            # Wait and verify it started
-            time.sleep(3)
-            if self.is_monitoring_script_running():
-                self.logger.info("Monitoring script started successfully")
-                return True
-            else:
-                self.logger.error("Failed to start monitoring script")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"Error starting monitoring script: {e}")
-            return False
+        return self.supervisor.start()
     
     def stop_monitoring_script(self):
         """Stop the monitoring script"""
-        try:
-            subprocess.run(['/usr/bin/pkill', '-f', 'remote_site_with_email.py'])
-            time.sleep(2)
-            
-            if not self.is_monitoring_script_running():
-                self.logger.info("Monitoring script stopped successfully")
-                return True
-            else:
-                self.logger.warning("Monitoring script may still be running")
-                return False
-                
-        except Exception as e:
-            self.logger.error(f"Error stopping monitoring script: {e}")
-            return False
+        return self.supervisor.stop()
     
     def daemon_loop(self):
-        """Main daemon loop"""
+        """Main daemon loop - wakes on schedule edges, override expiry or config changes"""
         self.logger.info("Schedule Daemon started")
+        self.metrics.start_server(DAEMON_METRICS_PORT)
         
         while self.running:
             try:
-                # Load current configuration
+                started = time.perf_counter()
+                
+                # Latest configuration (parsed only when it changed)
                 config = self.load_config()
-                config_changed = False
                 
-                # Check if override has expired
-                config, override_expired = self.check_override_expiry(config)
-                if override_expired:
-                    config_changed = True
+                # Revert an expired override - unless the web UI set a new one meanwhile
+                if self.check_override_expiry(config):
+                    self.save_config({"manual_override": False, "override_expires": None},
+                                     expected={"manual_override": True,
+                                               "override_expires": config.get("override_expires")})
+                    config = self.load_config()
+                
+                # Reap/restart a crashed monitoring script
+                self.supervisor.check()
                 
                 # Get effective arm status
                 should_be_armed, control_source = self.get_effective_arm_status(config)
@@ -237,30 +266,32 @@ class ScheduleDaemon:
                     self.last_effective_status = should_be_armed
                 
                 # Debug logging
-                self.logger.info(f"Debug: should_be_armed={should_be_armed}, script_is_running={script_is_running}")
+                self.logger.debug(f"Debug: should_be_armed={should_be_armed}, script_is_running={script_is_running}")
                 
-                # Manage script lifecycle
-                if should_be_armed and not script_is_running:
-                    self.logger.info("System should be armed but script not running - starting monitoring")
+                # Keep the monitor resident (crash restarts are left to the supervisor's backoff)
+                if not self.supervisor.wanted:
+                    self.logger.info("Monitoring script not running - starting it in standby")
                     self.start_monitoring_script()
-                    
-                elif not should_be_armed and script_is_running:
-                    self.logger.info("System should be disarmed but script running - stopping monitoring")
-                    self.stop_monitoring_script()
                 
-                # Update next transition time for manual overrides
+                # Arm/disarm the warm monitor instead of restarting it
+                if self.command_pending():
+                    self.send_arm_state(should_be_armed)
+                
+                # Update next transition time for manual overrides (written only when it moved)
                 if config.get("schedule_enabled", False):
                     next_transition = self.get_next_schedule_transition_time(config)
                     if next_transition and not config.get("manual_override", False):
-                        config["next_transition"] = next_transition.isoformat()
-                        config_changed = True
+                        if config.get("next_transition") != next_transition.isoformat():
+                            self.save_config({"next_transition": next_transition.isoformat()},
+                                             expected={"manual_override": False})
+                            config = self.load_config()
                 
-                # Save config if changes were made
-                if config_changed:
-                    self.save_config(config)
+                self.evaluation_time.observe(time.perf_counter() - started)
+                self.metrics.maybe_log_summary()
                 
-                # Sleep before next check
-                time.sleep(30)  # Check every 30 seconds
+                # Sleep exactly until the next thing that can change the state
+                if self.wait_for_config_change(self.seconds_until_next_event(config)):
+                    self.logger.info("Config changed - re-evaluating")
                 
             except Exception as e:
                 self.logger.error(f"Daemon loop error: {e}")
@@ -270,9 +301,17 @@ class ScheduleDaemon:
         self.logger.info("Received shutdown signal")
         self.shutdown()
     
+    def child_handler(self, sig, frame):
+        """SIGCHLD - wake the loop so a crashed script is noticed immediately"""
+        try:
+            os.write(self.wakeup_write, b"\0")
+        except BlockingIOError:
+            pass
+    
     def shutdown(self):
         self.logger.info("Shutting down Schedule Daemon")
         self.running = False
+        self.supervisor.stop()
         sys.exit(0)
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Weekly schedule engine for the Bluetooth IDS
+Compiles the per-day start/end times from ids_config.json into a sorted
+table of armed intervals over the week, so "armed now?" and "when is the
+next transition?" are a binary search instead of strptime on every check
+"""
+
+import bisect
+from datetime import datetime, timedelta
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+def parse_time_of_day(value):
+    """'HH:MM' -> seconds after midnight"""
+    parsed = datetime.strptime(value, '%H:%M')
+    return parsed.hour * 3600 + parsed.minute * 60
+
+
+def week_offset(dt):
+    """Seconds since Monday 00:00 of dt's week"""
+    return dt.weekday() * SECONDS_PER_DAY + dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+
+
+class WeeklySchedule:
+    def __init__(self, schedule):
+        intervals = []
+
+        for index, day in enumerate(DAYS):
+            day_schedule = schedule.get(day, {})
+            if not day_schedule.get("enabled", False):
+                continue
+
+            start = index * SECONDS_PER_DAY + parse_time_of_day(day_schedule.get("start", "18:00"))
+            end = index * SECONDS_PER_DAY + parse_time_of_day(day_schedule.get("end", "06:00"))
+            if end == start:
+                continue
+
+            # Overnight schedules run into the next morning
+            if end < start:
+                end += SECONDS_PER_DAY
+
+            # Sunday night wraps into Monday morning of the next week
+            if end > SECONDS_PER_WEEK:
+                intervals.append((start, SECONDS_PER_WEEK))
+                intervals.append((0, end - SECONDS_PER_WEEK))
+            else:
+                intervals.append((start, end))
+
+        # Merge overlapping/adjacent windows
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        self.starts = [start for start, _ in merged]
+        self.ends = [end for _, end in merged]
+
+        # Edges where the armed state actually flips; a window running through
+        # Sunday midnight into Monday has no edge at the week boundary
+        wraps = bool(merged) and merged[0][0] == 0 and merged[-1][1] == SECONDS_PER_WEEK
+        edges = set()
+        for start, end in merged:
+            if not (wraps and start == 0):
+                edges.add(start % SECONDS_PER_WEEK)
+            if not (wraps and end == SECONDS_PER_WEEK):
+                edges.add(end % SECONDS_PER_WEEK)
+        self.edges = sorted(edges)
+
+    def is_active_offset(self, offset):
+        """Armed at this week offset?"""
+        index = bisect.bisect_right(self.starts, offset) - 1
+        return index >= 0 and offset < self.ends[index]
+
+    def is_active(self, dt):
+        """Should the system be armed at dt?"""
+        return self.is_active_offset(week_offset(dt))
+
+    def next_transition(self, dt):
+        """Datetime of the next arm/disarm edge after dt, or None if the state never changes"""
+        if not self.edges:
+            return None
+
+        offset = week_offset(dt)
+        index = bisect.bisect_right(self.edges, offset)
+        if index < len(self.edges):
+            delta = self.edges[index] - offset
+        else:
+            delta = SECONDS_PER_WEEK - offset + self.edges[0]
+
+        return dt + timedelta(seconds=delta)
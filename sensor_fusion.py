@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Multi-node sensor fusion for the Bluetooth IDS
+Scanner nodes on a large site forward compact sighting batches to one
+aggregator node, which feeds them into its own scanner pipeline so a single
+tracker fuses them (per-batch max RSSI, EWMA across nodes, union of dwell)
+and makes the one trigger decision.
+
+Wire format: on connect the aggregator sends a 16-byte random challenge.
+Every batch is then a 4-byte little-endian length + 32-byte tag +
+zlib-compressed JSON
+    {"node": ..., "now": node time,
+     "sightings": [[mac, name, rssi, first_age, last_age, count,
+                    address_type, tx_power, {company: hex}, [uuids],
+                    transport, hold], ...]}
+The tag is HMAC-SHA256 under the shared fusion token over challenge +
+8-byte batch sequence number + compressed body, so the token never crosses
+the wire, and a batch recorded on one connection, or replayed or reordered
+within one, is rejected. The tag is checked before anything is decompressed.
+Ages are relative to the node's "now", so node clocks need not agree. The
+aggregator acknowledges each batch with one byte; unacknowledged batches are
+merged back and resent.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+
+FUSION_PORT = 8765
+FRAME = struct.Struct("<I")
+MAX_FRAME = 1 << 20     # bytes on the wire per batch
+MAX_BATCH = 16 << 20    # bytes of JSON a batch may decompress to
+CHALLENGE_SIZE = 16
+TAG_SIZE = hashlib.sha256().digest_size
+ACK = b"\x06"
+
+
+def parse_endpoint(value, default_port=FUSION_PORT):
+    """"host:port", "host" or "port" -> (host, port)"""
+    if value.isdigit():
+        return "0.0.0.0", int(value)
+    host, _, port = value.rpartition(":") if ":" in value else (value, "", "")
+    return host or "0.0.0.0", int(port) if port else default_port
+
+
+def frame_tag(token, challenge, seq, body):
+    return hmac.new(token.encode(), challenge + seq.to_bytes(8, "little") + body, hashlib.sha256).digest()
+
+
+def encode_batch(token, challenge, seq, node, now, entries):
+    """One length-prefixed, authenticated batch frame"""
+    body = zlib.compress(json.dumps(
+        {"node": node, "now": now, "sightings": entries},
+        separators=(",", ":")
+    ).encode())
+    payload = frame_tag(token, challenge, seq, body) + body
+    return FRAME.pack(len(payload)) + payload
+
+
+def decode_batch(token, challenge, seq, payload):
+    """Verify and unpack one frame payload (without its length prefix)"""
+    tag, body = payload[:TAG_SIZE], payload[TAG_SIZE:]
+    if not hmac.compare_digest(tag, frame_tag(token, challenge, seq, body)):
+        raise PermissionError("bad batch signature")
+    decompressor = zlib.decompressobj()
+    data = decompressor.decompress(body, MAX_BATCH)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"batch decompresses to more than {MAX_BATCH} bytes")
+    return json.loads(data)
+
+
+def require_token(token):
+    if not token:
+        raise ValueError("sensor fusion needs a shared fusion_token in bt_ids_config.json")
+
+
+class SightingForwarder:
+    def __init__(self, host, port=FUSION_PORT, node_id="node", token=None, interval=1.0,
+                 max_devices=2000, logger=None):
+        require_token(token)
+        self.host = host
+        self.port = port
+        self.node_id = node_id
+        self.token = token
+        self.interval = interval        # seconds between batches
+        self.max_devices = max_devices  # bound on the pending batch while the aggregator is down
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.pending = {}
+        self.reader = None
+        self.writer = None
+        self.challenge = None
+        self.seq = 0
+        self.task = None
+        self.backoff = 1.0
+        self.batches_sent = 0
+
+    def record(self, mac, sighting):
+        """Scanner listener - merge the advertisement into the pending batch"""
+        entry = self.pending.get(mac)
+        if entry is None:
+            if len(self.pending) >= self.max_devices:
+                return
+            manufacturer_data = sighting.get('manufacturer_data') or {}
+            self.pending[mac] = [
+                mac, sighting['name'], sighting['signal'], sighting['last_seen'], sighting['last_seen'], 1,
+                sighting.get('address_type'), sighting.get('tx_power'),
+                {str(company): bytes(data).hex() for company, data in manufacturer_data.items()},
+                list(sighting.get('service_uuids') or ()),
+                sighting.get('transport', "le"), sighting.get('hold', 0)
+            ]
+            return
+        entry[2] = max(entry[2], sighting['signal'])
+        entry[3] = min(entry[3], sighting['last_seen'])
+        entry[4] = max(entry[4], sighting['last_seen'])
+        entry[5] += 1
+        if sighting['name'] != "Unknown":
+            entry[1] = sighting['name']
+        if sighting.get('transport', "le") != entry[10]:
+            entry[10] = "dual"
+        entry[11] = max(entry[11], sighting.get('hold', 0))
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await self.disconnect()
+
+    async def run(self):
+        """Send the pending batch every interval, reconnecting with backoff"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.pending:
+                continue
+            batch, self.pending = self.pending, {}
+            try:
+                await self.send(batch)
+                self.backoff = 1.0
+            except Exception as e:
+                self.logger.warning(f"Aggregator {self.host}:{self.port} unreachable: {e}")
+                await self.disconnect()
+                # Keep the newest data: merge the failed batch back under anything newer
+                for mac, entry in batch.items():
+                    self.pending.setdefault(mac, entry)
+                await asyncio.sleep(self.backoff)
+                self.backoff = min(self.backoff * 2, 30.0)
+
+    async def send(self, batch):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), 5.0)
+            self.challenge = await asyncio.wait_for(self.reader.readexactly(CHALLENGE_SIZE), 5.0)
+            self.seq = 0
+            self.logger.info(f"🔗 Forwarding sightings to aggregator {self.host}:{self.port}")
+        now = time.time()
+        entries = [[mac, name, rssi, round(now - first, 2), round(now - last, 2), *rest]
+                   for mac, name, rssi, first, last, *rest in batch.values()]
+        self.writer.write(encode_batch(self.token, self.challenge, self.seq, self.node_id, now, entries))
+        self.seq += 1
+        await asyncio.wait_for(self.writer.drain(), 5.0)
+        if await asyncio.wait_for(self.reader.readexactly(1), 5.0) != ACK:
+            raise ConnectionError("batch not acknowledged")
+        self.batches_sent += 1
+
+    async def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class FusionServer:
+    def __init__(self, host, port, handler, token=None, logger=None):
+        require_token(token)  # it listens on every interface by default
+        self.host = host
+        self.port = port
+        self.handler = handler  # handler(mac, sighting) - normally the local scanner's record()
+        self.token = token
+        self.logger = logger or logging.getLogger(__name__)
+        self.server = None
+        self.clients = set()
+        self.nodes = {}         # node id -> last batch time
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.logger.info(f"🔗 Aggregating sightings on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server is None:
+            return
+        self.server.close()
+        for writer in list(self.clients):
+            writer.close()
+        await self.server.wait_closed()
+        self.server = None
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        self.clients.add(writer)
+        challenge = os.urandom(CHALLENGE_SIZE)
+        seq = 0
+        try:
+            writer.write(challenge)
+            await writer.drain()
+            while True:
+                (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+                if length > MAX_FRAME:
+                    raise ValueError(f"frame of {length} bytes")
+                batch = decode_batch(self.token, challenge, seq, await reader.readexactly(length))
+                seq += 1
+                self.ingest(batch)
+                writer.write(ACK)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            self.logger.warning(f"Dropping sensor node {peer}: {e}")
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    def ingest(self, batch):
+        """Rebase node ages onto the local clock and feed the local pipeline"""
+        now = time.time()
+        node = batch.get("node")
+        self.nodes[node] = now
+        for mac, name, rssi, first_age, last_age, count, address_type, tx_power, manufacturer, services, *rest \
+                in batch["sightings"]:
+            # Nodes from before classic inquiry send BLE sightings without transport and hold
+            transport, hold = rest if rest else ("le", 0)
+            self.handler(mac, {
+                'name': name,
+                'signal': rssi,
+                'first_seen': now - first_age,
+                'last_seen': now - last_age,
+                'count': count,
+                'address_type': address_type,
+                'tx_power': tx_power,
+                'manufacturer_data': {int(company): bytes.fromhex(data) for company, data in manufacturer.items()},
+                'service_uuids': services,
+                'transport': transport,
+                'hold': hold,
+                'node': node
+            })
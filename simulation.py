@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Simulation backends for the Bluetooth IDS
+Stand-ins for RPi.GPIO, the BLE radio, the VPS arm state and the alert
+senders so RemoteSiteIDS can be driven on any Linux box - by replaying
+recorded advertisement traces or synthetic crowds in real or virtual time
+"""
+
+import asyncio
+import csv
+import heapq
+import logging
+import os
+import random
+import sqlite3
+import time
+
+from adv_trace import TraceReader
+from alert_dispatcher import AlertDispatcher
+from ble_scanner import ContinuousScanner
+from config_cache import ConfigCache
+
+
+class MockGPIO:
+    """Drop-in for the RPi.GPIO calls the IDS makes; records relay changes"""
+    BCM = "BCM"
+    OUT = "OUT"
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.pins = {}
+        self.history = []
+
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, mode):
+        self.pins[pin] = self.LOW
+
+    def output(self, pin, value):
+        if self.pins.get(pin) != value:
+            self.history.append((self.clock(), pin, value))
+        self.pins[pin] = value
+
+    def cleanup(self):
+        self.pins = {}
+
+
+class StaticArmState:
+    """Arm state that only changes when told to - no VPS"""
+
+    def __init__(self, armed=True):
+        self.armed = armed
+        self.changed = asyncio.Event()
+
+    def is_armed(self):
+        return self.armed
+
+    def set(self, armed):
+        self.armed = armed
+        self.changed.set()
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def wait_for_change(self, timeout):
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.changed.clear()
+        return True
+
+
+class SimulatedDispatcher(AlertDispatcher):
+    """AlertDispatcher whose channels sleep instead of talking to SMTP/the VPS"""
+
+    def __init__(self, email_latency=0.5, voice_latency=1.0, logger=None):
+        super().__init__(config_file=None, logger=logger)
+        self.email_latency = email_latency
+        self.voice_latency = voice_latency
+        self.sent = []
+
+    def load_config(self):
+        return {
+            "email_enabled": True,
+            "subject": "Simulated alert",
+            "sender_email": "ids@example.invalid",
+            "recipient_email": "owner@example.invalid",
+            "voice": {"enabled": True, "phone1": "0400000000"}
+        }
+
+    def send_emails(self, email_config, messages):
+        time.sleep(self.email_latency)
+        self.sent.append(("email", len(messages)))
+        messages.clear()
+
+    def send_voice(self, email_config, key=None):
+        time.sleep(self.voice_latency)
+        self.sent.append(("voice", 1))
+
+
+class SimClock:
+    """Virtual clock for replaying hours of traffic in seconds"""
+
+    def __init__(self, start=None):
+        self.now = time.time() if start is None else start
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, timestamp):
+        self.now = max(self.now, timestamp)
+
+
+class ReplayScanner(ContinuousScanner):
+    """ContinuousScanner fed from an iterable of advertisements instead of BlueZ
+
+    Advertisements are (timestamp, mac, name, rssi) tuples in time order.
+    In virtual time the caller pulls them with advance_to(); with realtime=True
+    start() replays them on the event loop at their original pace. While the
+    scanner is stopped (radio off) advertisements pass by unseen.
+    """
+
+    def __init__(self, advertisements, realtime=False, speed=1.0, sighting_window=15.0, logger=None):
+        super().__init__(adapter="sim", sighting_window=sighting_window, logger=logger)
+        self.advertisements = iter(advertisements)
+        self.pending = None
+        self.realtime = realtime
+        self.speed = speed
+        self.task = None
+        self.exhausted = False
+
+    def feed(self, timestamp, mac, name, rssi):
+        """Inject one advertisement"""
+        if not self.running:
+            return
+        self.record(mac.upper(), {'name': name or "Unknown", 'signal': rssi, 'last_seen': timestamp})
+
+    def advance_to(self, timestamp):
+        """Feed every advertisement up to timestamp; returns how many were fed"""
+        fed = 0
+        while True:
+            if self.pending is None:
+                self.pending = next(self.advertisements, None)
+                if self.pending is None:
+                    self.exhausted = True
+                    return fed
+            if self.pending[0] > timestamp:
+                return fed
+            self.feed(*self.pending)
+            self.pending = None
+            fed += 1
+
+    async def replay(self):
+        """Replay advertisements at their recorded pace (scaled by speed)"""
+        first = None
+        started = time.monotonic()
+        for advertisement in self.advertisements:
+            first = advertisement[0] if first is None else first
+            delay = (advertisement[0] - first) / self.speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.feed(time.time(), *advertisement[1:])
+        self.exhausted = True
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.started_at = time.time()
+        self.sessions += 1
+        if self.realtime and self.task is None:
+            self.task = asyncio.create_task(self.replay())
+
+    async def stop(self):
+        # The replay keeps its pace while the radio is off
+        self.running = False
+
+
+def load_csv_trace(path):
+    """Yield (timestamp, mac, name, rssi) from a CSV trace with those columns"""
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            yield float(row["timestamp"]), row["mac"], row.get("name") or "Unknown", int(row["rssi"])
+
+
+def load_trace(path):
+    """Yield (timestamp, mac, name, rssi) from a binary .btr trace or a CSV trace"""
+    if not path.endswith(".btr"):
+        yield from load_csv_trace(path)
+        return
+    reader = TraceReader(path)
+    try:
+        yield from reader
+    finally:
+        reader.close()
+
+
+def load_history(db_path, since=None, spacing=2.0):
+    """Yield (timestamp, mac, name, rssi) re-created from DetectionStore presence sessions
+
+    Sessions only keep first/last seen, mean RSSI and a sighting count, so each
+    one becomes evenly spaced advertisements at its mean RSSI (at most one per
+    spacing seconds). Sessions are merged lazily in time order.
+    """
+    db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = db.execute(
+            "SELECT mac, name, first_seen, last_seen, rssi, count FROM sightings "
+            "WHERE last_seen >= ? ORDER BY first_seen",
+            (since or 0.0,)
+        )
+        heap = []
+        pending = next(rows, None)
+        sequence = 0
+        while heap or pending is not None:
+            if pending is not None and (not heap or pending[2] <= heap[0][0]):
+                mac, name, first_seen, last_seen, rssi, count = pending
+                step = max(spacing, (last_seen - first_seen) / max((count or 1) - 1, 1))
+                rssi = int(round(rssi)) if rssi is not None else -100
+                heapq.heappush(heap, (first_seen, sequence, mac, name or "Unknown", rssi, step, last_seen))
+                sequence += 1
+                pending = next(rows, None)
+                continue
+            timestamp, order, mac, name, rssi, step, last_seen = heapq.heappop(heap)
+            yield timestamp, mac, name, rssi
+            if timestamp + step <= last_seen:
+                heapq.heappush(heap, (timestamp + step, order, mac, name, rssi, step, last_seen))
+    finally:
+        db.close()
+
+
+def random_mac(rng):
+    return ":".join(f"{rng.randrange(256):02X}" for _ in range(6))
+
+
+class SyntheticCrowd:
+    """Time-ordered advertisements from residents, passers-by and intruders
+
+    Residents advertise for the whole run, passers-by for 5-60 s, intruders
+    for 2-10 minutes. Iterating yields (timestamp, mac, kind, rssi) with the
+    device kind as its name; memory stays O(devices) because devices are
+    merged lazily through a heap.
+    """
+
+    def __init__(self, devices=100, duration=3600.0, start=0.0, residents=0.2, intruders=1,
+                 adv_interval=1.0, seed=1):
+        self.duration = duration
+        self.start = start
+        self.adv_interval = adv_interval
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.devices = []
+
+        resident_count = int(devices * residents)
+        for _ in range(resident_count):
+            self.add_device("resident", start + self.rng.uniform(0, adv_interval), start + duration)
+        for _ in range(intruders):
+            arrive = start + self.rng.uniform(0, max(0.0, duration - 600))
+            self.add_device("intruder", arrive, arrive + self.rng.uniform(120, 600))
+        for _ in range(max(0, devices - resident_count - intruders)):
+            arrive = start + self.rng.uniform(0, duration)
+            self.add_device("passer", arrive, arrive + self.rng.uniform(5, 60))
+
+        self.residents = [device[1] for device in self.devices if device[2] == "resident"]
+
+    def add_device(self, kind, arrive, leave):
+        mac = random_mac(self.rng)
+        self.devices.append((arrive, mac, kind, leave, self.rng.randint(-90, -45)))
+
+    def __iter__(self):
+        rng = random.Random(self.seed + 1)
+        heap = list(self.devices)
+        heapq.heapify(heap)
+        end = self.start + self.duration
+
+        while heap:
+            timestamp, mac, kind, leave, rssi = heapq.heappop(heap)
+            if timestamp > end:
+                break
+            yield timestamp, mac, kind, rssi + rng.randint(-4, 4)
+            next_time = timestamp + self.adv_interval * rng.uniform(0.8, 1.2)
+            if next_time < leave:
+                heapq.heappush(heap, (next_time, mac, kind, leave, rssi))
+
+
+def build_simulated_ids(advertisements, realtime=False, armed=True, email_latency=0.5,
+                        voice_latency=1.0, logger=None):
+    """RemoteSiteIDS wired to replay/mock backends (runs in the current directory)"""
+    from remote_site_with_email import RemoteSiteIDS
+
+    logger = logger or logging.getLogger(__name__)
+    clock = time.time if realtime else SimClock()
+    scanner = ReplayScanner(advertisements, realtime=realtime, logger=logger)
+    ids = RemoteSiteIDS(
+        scanner=scanner,
+        gpio=MockGPIO(clock=clock),
+        arm_state=StaticArmState(armed=armed),
+        dispatcher=SimulatedDispatcher(email_latency, voice_latency, logger=logger),
+        config=ConfigCache(directory=os.getcwd(), logger=logger)
+    )
+    ids.clock = clock
+    return ids
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Telemetry heartbeat for the Bluetooth IDS
+Aggregates advertisement counts, an RSSI histogram, loop health and
+arm/alarm state into samples, and sends them to the VPS in batches through
+the outbound queue (lowest priority, so alarms always go first).
+
+Sampling and sending adapt to the site: a quiet site sends one batch every
+15 minutes, a site with devices present every 2 minutes and an incident
+every 15 seconds. Arm and alarm changes flush the batch straight away.
+
+Wire format: POST /api/telemetry, Content-Encoding: deflate, JSON body
+    {"device_id": ..., "boot": start time, "seq": n, "t": first sample time,
+     "samples": [{full sample}, {"dt": s, changed keys...}, ...]}
+The first sample of a batch is complete and each later one only carries
+what changed since the sample before it, so every batch decodes on its own
+and a lost batch costs nothing but its own samples.
+
+Usage:
+    python3 telemetry.py serve --port 8080   # local stand-in for the VPS endpoint
+"""
+
+import argparse
+import json
+import logging
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from outbound_queue import PRIORITY_TELEMETRY
+
+TELEMETRY_PATH = "/api/telemetry"
+
+# RSSI histogram upper bounds (dBm); the last bucket holds everything stronger
+RSSI_BUCKETS = (-90, -80, -70, -60, -50)
+
+# (seconds between samples, seconds between batches)
+INTERVALS = {
+    "quiet": (60.0, 900.0),
+    "active": (15.0, 120.0),
+    "incident": (5.0, 15.0)
+}
+
+MAX_SAMPLES = 200  # bound on one batch, oldest samples go first
+
+
+def delta_encode(samples):
+    """Full first sample, then only the keys that changed since the previous one"""
+    encoded = []
+    previous = None
+    for sample in samples:
+        if previous is None:
+            encoded.append(dict(sample))
+        else:
+            delta = {key: value for key, value in sample.items()
+                     if key != "t" and previous.get(key) != value}
+            delta["dt"] = round(sample["t"] - previous["t"], 1)
+            encoded.append(delta)
+        previous = sample
+    return encoded
+
+
+def decode_batch(body, encoding=None):
+    """Inverse of TelemetryUplink.flush - (batch, [full samples])"""
+    if encoding == "deflate":
+        body = zlib.decompress(body)
+    batch = json.loads(body)
+    samples = []
+    for entry in batch["samples"]:
+        if not samples:
+            samples.append(dict(entry))
+            continue
+        sample = dict(samples[-1], **entry)
+        sample["t"] = round(samples[-1]["t"] + sample.pop("dt"), 1)
+        samples.append(sample)
+    return batch, samples
+
+
+class TelemetryUplink:
+    def __init__(self, outbox, device_id, status, gauges, histograms=None, url=TELEMETRY_PATH,
+                 stall_after=300.0, logger=None):
+        self.outbox = outbox
+        self.device_id = device_id
+        self.status = status                # status() -> (profile, armed, alarm) - called every tick
+        self.gauges = gauges                # gauges() -> dict of current values - called per sample
+        self.histograms = histograms or {}  # name -> metrics.Histogram, reported as p99 per sample
+        self.url = url                      # path on the VPS, or a full URL (e.g. a local stand-in)
+        self.stall_after = stall_after      # seconds without advertisements while scanning = stalled
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.boot = int(time.time())
+        self.started = None
+        self.seq = 0
+        self.profile = "quiet"
+        self.samples = []
+        self.last_sample = None
+        self.last_flush = None
+        self.last_key_state = None
+        self.batches = 0
+        self.bytes_sent = 0
+
+        # Counters since the last sample
+        self.advertisements = 0
+        self.addresses = set()
+        self.rssi = [0] * (len(RSSI_BUCKETS) + 1)
+        self.last_advertisement = None
+        self.histogram_base = {}
+        self.stalled = False
+
+    def record(self, mac, sighting):
+        """Scanner listener - count the advertisement"""
+        self.advertisements += 1
+        if len(self.addresses) < 5000:
+            self.addresses.add(mac)
+        signal = sighting['signal']
+        for i, bound in enumerate(RSSI_BUCKETS):
+            if signal <= bound:
+                self.rssi[i] += 1
+                break
+        else:
+            self.rssi[-1] += 1
+        self.last_advertisement = sighting['last_seen']
+
+    def tick(self, now):
+        """Called every loop iteration: sample and send when due"""
+        if self.last_flush is None:
+            self.started = self.last_sample = self.last_flush = now
+        profile, *key_state = self.status()
+        changed = self.last_key_state is not None and key_state != self.last_key_state
+        self.last_key_state = key_state
+        if profile != self.profile:
+            self.logger.debug(f"Telemetry {self.profile} -> {profile}")
+            self.profile = profile
+
+        sample_every, flush_every = INTERVALS[self.profile]
+        if changed or now - self.last_sample >= sample_every:
+            self.sample(now)
+        if changed or (self.samples and now - self.last_flush >= flush_every):
+            self.flush(now)
+
+    def sample(self, now):
+        gauges = self.gauges()
+        sample = {"t": round(now, 1)}
+        sample.update(gauges)
+        sample["adv"] = self.advertisements
+        sample["addresses"] = len(self.addresses)
+        sample["rssi"] = list(self.rssi)
+
+        # Loop health: p99 of each histogram over this sample, and a silent scanner
+        for name, histogram in self.histograms.items():
+            sample[f"{name}_p99_ms"] = self.p99(name, histogram)
+        silent = now - (self.last_advertisement or self.started)
+        stalled = bool(gauges.get("scanning")) and silent > self.stall_after
+        if stalled and not self.stalled:
+            self.logger.warning(f"📶 No advertisements for {silent:.0f}s while scanning - scanner stalled?")
+        self.stalled = stalled
+        sample["stalled"] = stalled
+
+        self.samples.append(sample)
+        if len(self.samples) > MAX_SAMPLES:
+            del self.samples[0]
+        self.last_sample = now
+        self.advertisements = 0
+        self.addresses.clear()
+        self.rssi = [0] * (len(RSSI_BUCKETS) + 1)
+
+    def p99(self, name, histogram):
+        counts = [0] * (len(histogram.buckets) + 1)
+        for series in histogram.snapshot().values():
+            counts = [total + count for total, count in zip(counts, series)]
+        base, self.histogram_base[name] = self.histogram_base.get(name), counts
+        if base is not None:
+            counts = [now - before for now, before in zip(counts, base)]
+        bound = histogram.quantile(counts, 0.99)
+        return None if bound is None else (round(bound * 1000, 1) if bound != float("inf") else -1)
+
+    def flush(self, now):
+        """Compress the pending samples into one batch and hand it to the outbound queue"""
+        self.last_flush = now
+        if not self.samples:
+            return
+        self.seq += 1
+        batch = {
+            "device_id": self.device_id,
+            "boot": self.boot,
+            "seq": self.seq,
+            "t": self.samples[0]["t"],
+            "samples": delta_encode(self.samples)
+        }
+        payload = zlib.compress(json.dumps(batch, separators=(",", ":")).encode(), 9)
+        self.outbox.enqueue(self.url, payload, priority=PRIORITY_TELEMETRY,
+                            key=f"telemetry-{self.device_id}-{self.boot}-{self.seq}", compressed=True)
+        self.logger.debug(f"Telemetry batch {self.seq}: {len(self.samples)} sample(s), {len(payload)} bytes")
+        self.samples = []
+        self.batches += 1
+        self.bytes_sent += len(payload)
+
+    def stats(self):
+        return {
+            "profile": self.profile,
+            "batches": self.batches,
+            "bytes": self.bytes_sent,
+            "pending_samples": len(self.samples),
+            "stalled": self.stalled
+        }
+
+
+def serve(host, port):
+    """Stand-in for the VPS endpoint: decode, check sequence gaps and print every sample"""
+    last_seq = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                batch, samples = decode_batch(body, self.headers.get("Content-Encoding"))
+            except Exception as e:
+                print(f"!! undecodable batch ({len(body)} bytes): {e}")
+                self.send_response(400)
+                self.end_headers()
+                return
+            source = (batch["device_id"], batch["boot"])
+            gap = "" if last_seq.get(source, batch["seq"] - 1) == batch["seq"] - 1 else " (gap)"
+            last_seq[source] = batch["seq"]
+            print(f"== {batch['device_id']} seq {batch['seq']}{gap}: {len(samples)} sample(s), "
+                  f"{len(body)} bytes compressed, key {self.headers.get('Idempotency-Key')}")
+            for sample in samples:
+                print("   " + json.dumps(sample, separators=(",", ":")))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Telemetry stand-in on http://{host}:{port}{TELEMETRY_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bluetooth IDS telemetry")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The IDS modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound_queue import OutboundQueue  # noqa: E402
+
+
+class Recorder:
+    """Local stand-in for the VPS: answers with the queued status codes, then 200"""
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+
+        recorder = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                recorder.requests.append((self.path, self.headers.get("Idempotency-Key"), body))
+                self.send_response(recorder.statuses.pop(0) if recorder.statuses else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def vps():
+    recorder = Recorder()
+    yield recorder
+    recorder.close()
+
+
+@pytest.fixture
+def queue(tmp_path, vps):
+    outbox = OutboundQueue(str(tmp_path / "outbox.db"), base_url=vps.url, timeout=2.0, backoff_initial=1.0)
+    outbox.running = True  # flush() by hand instead of the worker thread
+    yield outbox
+    outbox.close()
@@ -0,0 +1,113 @@
+import pytest
+
+from adv_trace import RECORD, TraceReader, TraceRecorder
+
+START = 1_760_000_000.0
+
+
+def advertisement(now, signal=-60, name="Unknown", **fields):
+    return dict({'name': name, 'signal': signal, 'last_seen': now}, **fields)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "night.btr")
+
+
+def test_round_trip_keeps_every_field(path):
+    recorder = TraceRecorder(path, min_interval=0)
+    recorder.record("4A:11:22:33:44:55", advertisement(
+        START, signal=-71, address_type="random", tx_power=12,
+        manufacturer_data={0x004C: b"\x10\x05\x01"}, service_uuids=["fe9f", "180f"]))
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START + 1.25, signal=-40, name="Car Kit"))
+    recorder.close()
+
+    reader = TraceReader(path)
+    try:
+        assert len(reader) == 2
+        assert list(reader) == [(START, "4A:11:22:33:44:55", "Unknown", -71),
+                                (START + 1.25, "AA:BB:CC:DD:EE:FF", "Car Kit", -40)]
+        first, second = reader.records()
+        assert first['address_type'] == "random"
+        assert first['tx_power'] == 12
+        assert first['manufacturer_data'] == {0x004C: b"\x10\x05\x01"}
+        assert first['service_uuids'] == ["180f", "fe9f"]
+        assert second['tx_power'] is None
+        assert second['address_type'] is None
+        assert second['service_uuids'] == []
+    finally:
+        reader.close()
+
+
+def test_reopening_appends_to_the_trace(path):
+    recorder = TraceRecorder(path, min_interval=0)
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START, name="Car Kit"))
+    recorder.close()
+
+    recorder = TraceRecorder(path, min_interval=0)
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START + 60, name="Car Kit"))
+    recorder.record("11:22:33:44:55:66", advertisement(START + 61, name="Watch"))
+    recorder.close()
+
+    reader = TraceReader(path)
+    try:
+        assert reader.base_time == START
+        assert [(timestamp - START, mac, name) for timestamp, mac, name, _ in reader] == [
+            (0, "AA:BB:CC:DD:EE:FF", "Car Kit"), (60, "AA:BB:CC:DD:EE:FF", "Car Kit"),
+            (61, "11:22:33:44:55:66", "Watch")]
+        assert reader.strings.count(b"Car Kit") == 1  # the string table was reused
+    finally:
+        reader.close()
+
+
+def test_torn_record_is_ignored(path):
+    recorder = TraceRecorder(path, min_interval=0)
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START))
+    recorder.close()
+    with open(path, "ab") as f:
+        f.write(b"\x01" * (RECORD.size // 2))
+
+    reader = TraceReader(path)
+    assert len(reader) == 1
+    reader.close()
+
+
+def test_unchanged_advertisements_are_throttled(path):
+    recorder = TraceRecorder(path, min_interval=5.0, rssi_step=10)
+    for second in range(12):
+        recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START + second))
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START + 12, signal=-45))  # big RSSI change
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START + 13, signal=-45,
+                                                       manufacturer_data={0x004C: b"\x01"}))  # new payload
+    recorder.record("11:22:33:44:55:66", advertisement(START + 13))  # another device
+    recorder.close()
+
+    reader = TraceReader(path)
+    try:
+        assert [(timestamp - START, mac[:2]) for timestamp, mac, _, _ in reader] == [
+            (0, "AA"), (5, "AA"), (10, "AA"), (12, "AA"), (13, "AA"), (13, "11")]
+    finally:
+        reader.close()
+
+
+def test_numpy_view_matches_the_records(path):
+    np = pytest.importorskip("numpy")
+    recorder = TraceRecorder(path, min_interval=0)
+    recorder.record("4A:11:22:33:44:55", advertisement(START, signal=-71, address_type="random", tx_power=-8))
+    recorder.record("AA:BB:CC:DD:EE:FF", advertisement(START + 2.5, signal=-40, name="Car Kit"))
+    recorder.close()
+
+    reader = TraceReader(path)
+    try:
+        records = reader.to_numpy()
+        assert records.dtype.itemsize == RECORD.size
+        assert records['offset_ms'].tolist() == [0, 2500]
+        assert records['rssi'].tolist() == [-71, -40]
+        assert records['tx_power'].tolist() == [-8, -128]
+        assert records['address_type'].tolist() == [2, 0]
+        assert [reader.strings[index] for index in records['mac']] == [b"4A:11:22:33:44:55", b"AA:BB:CC:DD:EE:FF"]
+        assert [reader.strings[index] for index in records['name']] == [b"", b"Car Kit"]
+        assert records['rssi'].dtype == np.int8
+        del records  # release the view before the map closes
+    finally:
+        reader.close()
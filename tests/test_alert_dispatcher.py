@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from alert_dispatcher import AlertDispatcher
+
+ALERT_CONFIG = {
+    "email_enabled": True,
+    "subject": "Alert",
+    "sender_email": "ids@example.invalid",
+    "recipient_email": "owner@example.invalid",
+    "voice": {"enabled": True, "phone1": "0400000000"}
+}
+
+
+class Flaky(AlertDispatcher):
+    """Email fails once, voice never gets through"""
+
+    def __init__(self, release=None):
+        super().__init__(config_file=None, retries=2, backoff=0.0)
+        self.release = release
+        self.attempts = {"email": 0, "voice": 0}
+
+    def load_config(self):
+        return ALERT_CONFIG
+
+    def send_emails(self, email_config, messages):
+        if self.release is not None:
+            self.release.wait(5.0)
+        self.attempts["email"] += 1
+        if self.attempts["email"] == 1:
+            raise ConnectionError("SMTP server busy")
+
+    def send_voice(self, email_config, key=None):
+        self.attempts["voice"] += 1
+        raise ConnectionError("VPS unreachable")
+
+
+def test_each_channel_retries_on_its_own():
+    dispatcher = Flaky()
+    results = [future.result() for future in dispatcher.dispatch(2, "- AA\n- BB")]
+    dispatcher.shutdown(wait=True)
+
+    assert results == [True, False]
+    assert dispatcher.attempts == {"email": 2, "voice": 2}
+    assert dispatcher.latencies["email"] >= 0.0
+    assert dispatcher.latencies["voice"] is None
+
+
+def test_dispatch_does_not_wait_for_slow_channels():
+    release = threading.Event()
+    dispatcher = Flaky(release)
+    futures = dispatcher.dispatch(1, "- AA")
+    assert not futures[0].done()
+    release.set()
+    assert futures[0].result(timeout=5.0)
+    dispatcher.shutdown(wait=True)
+
+
+CONFIG = {
+    "email_enabled": False,
+    "voice": {"enabled": True, "phone1": "0400000000"}
+}
+
+
+class Dispatcher(AlertDispatcher):
+    def __init__(self, outbox):
+        super().__init__(config_file=None, retries=1, outbox=outbox)
+        self.emails = []
+
+    def load_config(self):
+        return CONFIG
+
+    def send_emails(self, email_config, messages):
+        self.emails.extend(messages)
+
+
+@pytest.fixture
+def dispatcher(queue):
+    dispatcher = Dispatcher(queue)
+    yield dispatcher
+    dispatcher.shutdown(wait=True)
+
+
+def test_voice_latency_is_measured_at_delivery(dispatcher, queue, vps):
+    for future in dispatcher.dispatch(1, "- Phone", channels=("voice",), key="incident-1"):
+        assert future.result()
+    assert "voice" not in dispatcher.latencies  # only queued so far
+
+    time.sleep(0.2)  # the link is slow today
+    queue.flush()
+
+    assert [key for _, key, _ in vps.requests] == ["make-call-btids001-incident-1"]
+    assert dispatcher.latencies["voice"] >= 0.2
+    assert dispatcher.pending_voice == {}
+
+
+def test_undelivered_voice_alarm_is_reported(dispatcher, queue, vps):
+    CONFIG["email_enabled"] = True
+    CONFIG.update(subject="Alert", sender_email="ids@example.invalid", recipient_email="owner@example.invalid")
+    try:
+        vps.statuses = [400]
+        dispatcher.dispatch(1, "- Phone", channels=("voice",), key="incident-2")[0].result()
+        queue.flush()
+        dispatcher.executor.shutdown(wait=True)
+    finally:
+        CONFIG["email_enabled"] = False
+
+    assert dispatcher.latencies["voice"] is None
+    assert len(dispatcher.emails) == 1
+    assert "not delivered" in dispatcher.emails[0]["Subject"]
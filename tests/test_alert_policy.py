@@ -0,0 +1,96 @@
+import pytest
+
+from alert_policy import TIER_EMAIL, TIER_VOICE, AlertPolicy, TokenBucket
+
+
+class Dispatcher:
+    def __init__(self):
+        self.sent = []
+
+    def dispatch(self, device_count, device_list, channels=("email", "voice"), key=None):
+        self.sent.append((tuple(channels), key))
+        return []
+
+
+@pytest.fixture
+def dispatcher():
+    return Dispatcher()
+
+
+@pytest.fixture
+def policy(tmp_path, dispatcher):
+    return AlertPolicy(dispatcher, path=str(tmp_path / "incidents.json"))
+
+
+def channels(dispatcher):
+    return [sent for sent, _ in dispatcher.sent]
+
+
+def test_token_bucket_refills_up_to_burst():
+    bucket = TokenBucket(per_hour=6.0, burst=2)
+    assert bucket.take(0.0) and bucket.take(1.0)
+    assert not bucket.take(2.0)
+    assert not bucket.take(500.0)  # 0.83 of a token
+    assert bucket.take(601.0)
+    bucket.refill(100000.0)
+    assert bucket.tokens == 2
+
+
+def test_repeat_triggers_coalesce_into_one_incident(policy, dispatcher):
+    policy.alarm(["AA"], 1, "- AA", 0.0)
+    policy.clear(30.0)
+    policy.alarm(["AA"], 1, "- AA", 60.0)
+
+    assert policy.incident["id"] == 1
+    assert policy.incident["triggers"] == 2
+    assert channels(dispatcher) == [("email",), ("voice",)]  # the re-trigger persists
+    assert len({key for _, key in dispatcher.sent}) == 1
+
+    policy.clear(70.0)
+    policy.alarm(["AA"], 1, "- AA", 70.0 + policy.coalesce_window + 1)
+    assert policy.incident["id"] == 2
+
+
+def test_lasting_incident_escalates_to_voice(policy, dispatcher):
+    policy.alarm(["AA"], 1, "- AA", 0.0)
+    policy.update(60.0, 1)
+    assert channels(dispatcher) == [("email",)]
+    assert policy.incident["tier"] == TIER_EMAIL
+
+    policy.update(policy.escalate_after, 1)
+    assert channels(dispatcher) == [("email",), ("voice",)]
+    assert policy.incident["tier"] == TIER_VOICE
+
+    policy.update(policy.escalate_after + 60.0, 3)  # one call per incident
+    assert len(dispatcher.sent) == 2
+
+
+def test_rate_limited_email_does_not_hold_back_voice(policy, dispatcher):
+    policy.buckets["email"].tokens = 0.0
+    policy.buckets["email"].updated = 0.0
+    policy.alarm(["AA"], 1, "- AA", 0.0)
+    for t in range(1, 600):
+        policy.update(float(t), 3)
+
+    assert channels(dispatcher) == [("voice",)]
+    assert policy.incident["limited"] == ["email"]
+
+    policy.update(600.0, 3)  # the email bucket has refilled one token
+    assert channels(dispatcher) == [("voice",), ("email",)]
+
+
+def test_restart_resumes_incident_as_inactive(tmp_path, policy, dispatcher):
+    policy.alarm(["AA", "BB"], 2, "- AA\n- BB", 0.0)
+    policy.update(policy.escalate_after, 2)
+
+    restarted = AlertPolicy(Dispatcher(), path=policy.path)
+    assert restarted.incident["id"] == 1
+    assert restarted.incident["tier"] == TIER_VOICE
+    assert restarted.incident["active"] is False
+    assert restarted.next_id == 2
+    assert restarted.buckets["voice"].tokens == pytest.approx(1.0, abs=0.01)
+
+    # The same intrusion seen again after the restart is the same incident, already called
+    restarted.alarm(["AA"], 1, "- AA", policy.escalate_after + 30.0)
+    assert restarted.incident["id"] == 1
+    assert restarted.dispatcher.sent == []
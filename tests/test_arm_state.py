@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from arm_state import ArmStateClient
+
+
+def test_change_during_apply_is_not_lost():
+    async def run():
+        client = ArmStateClient()
+        client.update(True)
+        assert await client.wait_for_change(0.01)  # the initial state counts as a change
+        assert not await client.wait_for_change(0.01)
+
+        # Disarm arrives while the monitor is still busy with the previous change
+        client.update(False)
+        return await asyncio.wait_for(client.wait_for_change(5.0), 0.5)
+
+    assert asyncio.run(run())
+
+
+@pytest.mark.parametrize("policy, last, expected", [
+    ("closed", False, True),
+    ("open", True, False),
+    ("last", True, True),
+    ("last", False, False),
+])
+def test_fail_policy_once_stale(policy, last, expected):
+    client = ArmStateClient(fail_policy=policy, ttl=0.0)
+    client.update(last)
+    client.last_update -= 1.0
+    assert client.is_armed() is expected
+
+
+def test_unknown_fail_policy_is_refused():
+    with pytest.raises(ValueError):
+        ArmStateClient(fail_policy="armed")
@@ -0,0 +1,52 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from baseline_profile import hour_of_week, hour_overlaps
+
+
+@pytest.fixture
+def sydney():
+    """A zone with DST: AEST +10 until 2024-10-06 02:00, AEDT +11 after"""
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Australia/Sydney"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def local(*args):
+    return time.mktime(datetime(*args).timetuple())
+
+
+def test_hour_of_week_follows_wall_clock_across_dst(sydney):
+    before = local(2024, 9, 30, 10, 30)   # Monday 10:30 AEST
+    after = local(2024, 10, 7, 10, 30)    # Monday 10:30 AEDT
+    assert after - before == 7 * 86400 - 3600
+    assert hour_of_week(before) == hour_of_week(after) == 10
+
+
+def test_hour_overlaps_bin_each_piece_in_its_own_offset(sydney):
+    # Saturday 23:30 AEST to Sunday 04:30 AEDT: 02:00 does not exist that night
+    start = local(2024, 10, 5, 23, 30)
+    end = local(2024, 10, 6, 4, 30)
+    rows, bins, seconds = hour_overlaps([start], [end])
+
+    assert list(rows) == [0] * 5
+    assert list(bins) == [5 * 24 + 23, 6 * 24, 6 * 24 + 1, 6 * 24 + 3, 6 * 24 + 4]
+    assert list(seconds) == [1800.0, 3600.0, 3600.0, 3600.0, 1800.0]
+    assert seconds.sum() == end - start
+
+
+def test_single_sighting_counts_one_second():
+    rows, bins, seconds = hour_overlaps([1000.0], [1000.0])
+    assert list(seconds) == [1.0]
+    assert list(bins) == [hour_of_week(1000.0)]
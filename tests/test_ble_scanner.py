@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from ble_scanner import ContinuousScanner
+
+
+def sighting(now, signal=-60, **fields):
+    return dict({'name': "Unknown", 'signal': signal, 'last_seen': now}, **fields)
+
+
+def test_recent_keeps_the_latest_sighting_inside_the_window():
+    scanner = ContinuousScanner(sighting_window=15.0)
+    seen = []
+    scanner.add_listener(lambda mac, info: seen.append((mac, info['signal'])))
+    scanner.record("AA:BB:CC:DD:EE:01", sighting(0.0))
+    scanner.record("AA:BB:CC:DD:EE:02", sighting(5.0))
+    scanner.record("AA:BB:CC:DD:EE:01", sighting(10.0, signal=-50))
+
+    assert scanner.recent(now=20.0) == {"AA:BB:CC:DD:EE:01": sighting(10.0, signal=-50),
+                                        "AA:BB:CC:DD:EE:02": sighting(5.0)}
+    assert list(scanner.recent(now=21.0)) == ["AA:BB:CC:DD:EE:01"]
+    assert scanner.recent(window=5.0, now=21.0) == {}
+    assert scanner.sightings == {}  # stale entries are dropped, not just hidden
+    assert seen == [("AA:BB:CC:DD:EE:01", -60), ("AA:BB:CC:DD:EE:02", -60), ("AA:BB:CC:DD:EE:01", -50)]
+    assert scanner.advertisement_count == 3
+
+
+def test_listener_error_does_not_stop_the_scan():
+    scanner = ContinuousScanner()
+    seen = []
+    scanner.add_listener(lambda mac, info: 1 / 0)
+    scanner.add_listener(lambda mac, info: seen.append(mac))
+    scanner.record("AA:BB:CC:DD:EE:01", sighting(0.0))
+    assert seen == ["AA:BB:CC:DD:EE:01"]
+
+
+def test_detection_callback_records_bleak_advertisements():
+    scanner = ContinuousScanner()
+    device = SimpleNamespace(address="aa:bb:cc:dd:ee:01", name=None, details=None)
+    advertisement = SimpleNamespace(rssi=None, local_name="Watch", manufacturer_data={}, service_uuids=[],
+                                    tx_power=None)
+    scanner.detection_callback(device, advertisement)
+
+    info = scanner.sightings["AA:BB:CC:DD:EE:01"]
+    assert (info['name'], info['signal']) == ("Watch", -100)
+
+
+class IgnoreList:
+    def __init__(self, *macs):
+        self.macs = set(macs)
+
+    def is_ignored(self, mac):
+        return mac in self.macs
+
+
+def test_ignored_devices_never_reach_the_table_or_listeners():
+    scanner = ContinuousScanner(device_filter=IgnoreList("AA:BB:CC:DD:EE:01"))
+    seen = []
+    scanner.add_listener(lambda mac, info: seen.append(mac))
+    scanner.record("AA:BB:CC:DD:EE:01", sighting(0.0))
+    scanner.record("AA:BB:CC:DD:EE:02", sighting(0.0))
+    assert seen == ["AA:BB:CC:DD:EE:02"]
+    assert list(scanner.recent(now=1.0)) == ["AA:BB:CC:DD:EE:02"]
+    assert scanner.advertisement_count == 2
+
+    scanner.device_filter.macs.add("AA:BB:CC:DD:EE:02")  # ignore list reloaded
+    scanner.apply_filter()
+    assert scanner.recent(now=1.0) == {}
+
+
+def test_classic_sightings_are_held_for_the_inquiry_period():
+    scanner = ContinuousScanner(sighting_window=15.0)
+    scanner.record("AA:BB:CC:DD:EE:01", sighting(0.0, transport="bredr", hold=37.0))
+    scanner.record("AA:BB:CC:DD:EE:02", sighting(0.0))
+
+    assert list(scanner.recent(now=20.0)) == ["AA:BB:CC:DD:EE:01"]
+    assert list(scanner.recent(now=37.0)) == ["AA:BB:CC:DD:EE:01"]
+    assert scanner.recent(now=37.5) == {}
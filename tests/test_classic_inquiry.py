@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+from classic_inquiry import DEVICE_INTERFACE, ClassicInquiry
+
+
+class Variant:
+    """Just the part of dbus_fast.Variant that unpack() reads"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Scanner:
+    running = True
+
+    def __init__(self):
+        self.sightings = []
+
+    def record(self, mac, sighting):
+        self.sightings.append((mac, sighting))
+
+
+def message(member, body, path="/org/freedesktop/DBus"):
+    return SimpleNamespace(member=member, body=body, path=path)
+
+
+DEVICE = "/org/bluez/hci0/dev_00_1A_7D_DA_71_13"
+
+
+def added(path=DEVICE, **properties):
+    return message("InterfacesAdded", [path, {DEVICE_INTERFACE: {k: Variant(v) for k, v in properties.items()}}])
+
+
+def test_inquiry_result_is_recorded_as_bredr():
+    scanner = Scanner()
+    inquiry = ClassicInquiry(scanner, window=5.12, period=30.0)
+    inquiry.inquiring = True
+
+    inquiry.on_message(added(Address="00:1a:7d:da:71:13", Name="Car Kit", RSSI=-67, Class=0x240404))
+
+    [(mac, seen)] = scanner.sightings
+    assert mac == "00:1A:7D:DA:71:13"
+    assert seen['name'] == "Car Kit"
+    assert seen['signal'] == -67
+    assert seen['transport'] == "bredr"
+    assert seen['device_class'] == 0x240404
+    assert seen['hold'] == inquiry.hold == 30.0 + 5.12 + 2.0
+    assert inquiry.results == 1
+
+
+def test_rssi_update_reports_known_device():
+    scanner = Scanner()
+    inquiry = ClassicInquiry(scanner)
+    inquiry.on_message(added(Address="00:1A:7D:DA:71:13", Class=0x240404))
+    inquiry.inquiring = True
+
+    inquiry.on_message(message("PropertiesChanged", [DEVICE_INTERFACE, {"RSSI": Variant(-71)}, []], path=DEVICE))
+
+    assert [(mac, seen['signal']) for mac, seen in scanner.sightings] == [("00:1A:7D:DA:71:13", -71)]
+
+
+def test_results_outside_a_window_or_without_class_are_ignored():
+    scanner = Scanner()
+    inquiry = ClassicInquiry(scanner)
+
+    # Not our window: another client's discovery or a cached device
+    inquiry.on_message(added(Address="00:1A:7D:DA:71:13", RSSI=-60, Class=0x240404))
+    inquiry.inquiring = True
+    # BLE-only device: no Class of Device
+    inquiry.on_message(added(path="/org/bluez/hci0/dev_11", Address="11:22:33:44:55:66", RSSI=-60))
+    # Another adapter's device
+    inquiry.on_message(added(path="/org/bluez/hci1/dev_22", Address="22:22:33:44:55:66", RSSI=-60, Class=1))
+    # Not a device
+    inquiry.on_message(message("PropertiesChanged", ["org.bluez.Adapter1", {"RSSI": Variant(-50)}, []],
+                               path="/org/bluez/hci0"))
+
+    assert scanner.sightings == []
+
+
+def test_removed_device_is_forgotten():
+    inquiry = ClassicInquiry(Scanner())
+    inquiry.on_message(added(Address="00:1A:7D:DA:71:13", Class=0x240404))
+    assert DEVICE in inquiry.devices
+
+    inquiry.on_message(message("InterfacesRemoved", [DEVICE, [DEVICE_INTERFACE]]))
+    assert inquiry.devices == {}
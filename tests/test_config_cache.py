@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from config_cache import ConfigCache, ConfigFile, validate_detection_config, validate_email_config
+
+
+def write(path, config):
+    """Rewrite in place with a visibly newer mtime"""
+    mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    path.write_text(json.dumps(config))
+    os.utime(path, ns=(mtime + 1_000_000_000, mtime + 1_000_000_000))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write(tmp_path / "email_config.json", {"email_enabled": False, "smtp_port": 587})
+    write(tmp_path / "bt_ids_config.json", {"signal_threshold": -80, "confidence_threshold": 2})
+    write(tmp_path / "ids_config.json", {"trigger_threshold": 45})
+    return tmp_path
+
+
+def test_snapshots_are_validated_and_coerced(directory):
+    config = ConfigCache(directory=str(directory))
+    assert config.get("detection") == {"signal_threshold": -80.0, "confidence_threshold": 2}
+    assert isinstance(config.get("detection")["signal_threshold"], float)
+    assert config.get("ids")["trigger_threshold"] == 45.0
+
+
+@pytest.mark.parametrize("validator, config", [
+    (validate_detection_config, {"signal_threshold": 10}),
+    (validate_detection_config, {"confidence_threshold": 1.5}),
+    (validate_detection_config, {"relay_pin": 40}),
+    (validate_detection_config, {"confidence_threshold": True}),
+    (validate_detection_config, {"fail_policy": "sideways"}),
+    (validate_email_config, {"smtp_port": 0}),
+    (validate_email_config, {"email_enabled": True, "smtp_server": "smtp.example.invalid"}),
+])
+def test_invalid_values_are_rejected(validator, config):
+    with pytest.raises(ValueError):
+        validator(config)
+
+
+def test_edit_is_picked_up_and_listeners_notified(directory):
+    config = ConfigCache(directory=str(directory), reload_interval=0.0)
+    seen = []
+    config.file("detection").add_listener(seen.append)
+    assert not config.maybe_reload()
+
+    write(directory / "bt_ids_config.json", {"signal_threshold": -70})
+    assert config.maybe_reload()
+    assert config.get("detection") == {"signal_threshold": -70.0}
+    assert seen == [{"signal_threshold": -70.0}]
+    assert not config.maybe_reload()
+
+
+def test_bad_edit_keeps_the_previous_snapshot(directory):
+    config = ConfigCache(directory=str(directory), reload_interval=0.0)
+    seen = []
+    config.file("ids").add_listener(seen.append)
+    previous = config.get("ids")
+
+    (directory / "ids_config.json").write_text('{"trigger_threshold": 4')  # saved mid-edit
+    os.utime(directory / "ids_config.json", ns=(1, 1))
+    assert not config.maybe_reload()
+    write(directory / "ids_config.json", {"trigger_threshold": -5})
+    assert not config.maybe_reload()
+
+    assert config.get("ids") is previous
+    assert seen == []
+
+
+def test_reload_checks_are_rate_limited(directory):
+    config = ConfigCache(directory=str(directory), reload_interval=3600.0)
+    write(directory / "ids_config.json", {"trigger_threshold": 90})
+    assert not config.maybe_reload()
+    assert config.get("ids")["trigger_threshold"] == 45.0
+
+
+def test_missing_file_uses_defaults(tmp_path):
+    config_file = ConfigFile(str(tmp_path / "absent.json"), defaults={"trigger_threshold": 45})
+    assert config_file.get() == {"trigger_threshold": 45}
+    assert not config_file.maybe_reload()
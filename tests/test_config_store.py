@@ -0,0 +1,83 @@
+import json
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from config_store import ConfigStore, VersionConflict
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "ids_config.json"
+    path.write_text(json.dumps({"trigger_threshold": 45}))
+    return str(path)
+
+
+def test_compare_and_swap_rejects_a_stale_version(path):
+    web, daemon = ConfigStore(path), ConfigStore(path)
+    version, config = web.read()
+
+    assert daemon.update(lambda current: current.update(override_armed=True)) == version + 1
+    assert not web.compare_and_swap(version, dict(config, trigger_threshold=30))
+    with pytest.raises(VersionConflict) as conflict:
+        web.update(lambda current: current.update(trigger_threshold=30), expected_version=version)
+    assert conflict.value.actual == version + 1
+
+    # Retried against what is on disk now: nothing is lost
+    latest, _ = web.read()
+    assert web.compare_and_swap(latest, dict(web.read()[1], trigger_threshold=30))
+    on_disk = json.loads(open(path).read())
+    assert on_disk["trigger_threshold"] == 30
+    assert on_disk["override_armed"] is True
+    assert on_disk["version"] == version + 2
+
+
+def test_unchanged_update_writes_nothing(path):
+    store = ConfigStore(path)
+    version = store.update(lambda current: current.update(trigger_threshold=45))
+    assert store.writes == 0
+    assert store.update(lambda current: None) == version
+
+
+def test_writer_without_versions_still_counts_as_a_change(path):
+    store = ConfigStore(path)
+    version, _ = store.read()
+    time.sleep(0.01)
+    with open(path, "w") as f:
+        json.dump({"trigger_threshold": 60}, f)
+    new_version, config = store.read()
+    assert new_version > version
+    assert config["trigger_threshold"] == 60
+
+
+def test_wait_for_change_wakes_on_another_writer(path):
+    store, writer = ConfigStore(path), ConfigStore(path)
+    version, _ = store.read()
+    timer = threading.Timer(0.1, writer.update, [lambda current: current.update(trigger_threshold=10)])
+    timer.start()
+    started = time.monotonic()
+    try:
+        assert store.wait_for_change(version, timeout=5.0)
+    finally:
+        timer.join()
+    assert time.monotonic() - started < 2.0
+    assert store.read()[1]["trigger_threshold"] == 10
+
+
+def increment(path, times):
+    store = ConfigStore(path)
+    for _ in range(times):
+        store.update(lambda current: current.update(counter=current.get("counter", 0) + 1))
+
+
+def test_concurrent_writers_lose_no_update(path):
+    processes = [multiprocessing.Process(target=increment, args=(path, 25)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    config = json.loads(open(path).read())
+    assert config["counter"] == 100
+    assert config["version"] == 100
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+from control_socket import ControlServer, send_command
+
+
+def run_server(path, handler, client):
+    """Serve handler on path while the blocking client runs in a thread"""
+    async def run():
+        server = ControlServer(path, handler)
+        await server.start()
+        try:
+            return os.stat(path).st_mode, await asyncio.to_thread(client)
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+
+
+def test_commands_round_trip_over_an_owner_only_socket(tmp_path):
+    path = str(tmp_path / "ids_control.sock")
+    commands = []
+
+    def handler(command):
+        commands.append(command)
+        if command["command"] == "fail":
+            raise ValueError("no such command")
+        return {"ok": True, "armed": command.get("armed")}
+
+    def client():
+        return [send_command(path, "arm", armed=True), send_command(path, "fail")]
+
+    mode, replies = run_server(path, handler, client)
+
+    assert stat.S_ISSOCK(mode)
+    assert stat.S_IMODE(mode) == 0o600
+    assert replies == [{"ok": True, "armed": True}, {"ok": False, "error": "no such command"}]
+    assert commands == [{"command": "arm", "armed": True}, {"command": "fail"}]
+    assert not os.path.exists(path)
+
+
+def test_stale_socket_file_is_replaced(tmp_path):
+    path = tmp_path / "ids_control.sock"
+    path.write_text("left over from a crash")
+    _, reply = run_server(str(path), lambda command: {"ok": True}, lambda: send_command(str(path), "status"))
+    assert reply == {"ok": True}
+
+
+def test_no_monitor_listening(tmp_path):
+    with pytest.raises(OSError):
+        send_command(str(tmp_path / "ids_control.sock"), "status")
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from detection_store import DetectionStore
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DetectionStore(str(tmp_path / "detections.db"))
+    yield store
+    store.close()
+
+
+def session(now, rssi=-60, count=1):
+    return {'name': "Phone", 'first_seen': now - 10, 'last_seen': now, 'rssi': rssi, 'count': count}
+
+
+def test_imports_nul_damaged_remote_log(store):
+    with open(os.path.join(REPO, "remote_detections.csv"), 'rb') as f:
+        data = f.read()
+    assert b"\0" in data  # the shipped log really is damaged
+    rows = data.replace(b"\0", b"").count(b"\n") - 1
+
+    assert store.import_csv(os.path.join(REPO, "remote_detections.csv")) == rows
+    damaged = store.events(since="2025-08-19T10:04:29.6", until="2025-08-19T10:04:29.7")
+    assert [row['event'] for row in damaged] == ["FIRST_DETECTION"]
+
+
+def test_imports_device_sightings(store, tmp_path):
+    path = tmp_path / "detections.csv"
+    path.write_text("Timestamp,MAC,Device Name,Event,Signal Strength,Detection Count,Learning Mode\r\n"
+                    "2025-08-18T17:24:02,40:c9:98:fb:af:e9,Unknown,BASELINE_DEVICE,-39,1,True\r\n"
+                    "2025-08-18T18:00:00,40:C9:98:FB:AF:E9,Unknown,NEW_DEVICE,-45,3,False\r\n"
+                    "not a time,11:22:33:44:55:66,Unknown,NEW_DEVICE,-45,1,False\r\n")
+
+    assert store.import_csv(str(path)) == 2
+    row = store.last_seen("40:c9:98:fb:af:e9")
+    assert row['event'] == "NEW_DEVICE"
+    assert row['count'] == 3
+    assert store.last_seen("11:22:33:44:55:66") is None
+
+
+def test_last_seen_includes_buffered_sightings_after_commit(store):
+    now = time.time()
+    store.add_sighting("AA:BB:CC:DD:EE:FF", session(now - 600))
+    store.add_sighting("AA:BB:CC:DD:EE:FF", session(now))
+    assert store.last_seen("aa:bb:cc:dd:ee:ff") is None  # still buffered
+
+    store.commit()
+    assert store.last_seen("aa:bb:cc:dd:ee:ff")['last_seen'] == now
+
+
+def test_summary_counts_every_alarm_in_the_window(store):
+    now = time.time()
+    store.add_events([(now - 3600 * i, "ALARM_TRIGGERED", f"{i} devices") for i in range(30)])
+    store.add_events([(now - 8 * 86400, "ALARM_TRIGGERED", "last week"), (now, "ALARM_STOPPED", "timer")])
+
+    summary = store.dashboard_summary(days=7)
+    assert summary['alarm_count'] == 30
+    assert len(summary['alarms']) == 20
+
+
+def test_retention_downsamples_old_sightings_hourly(store):
+    now = time.time()
+    hour = (now - 30 * 86400) // 3600 * 3600
+    for minute in (5, 20, 40):
+        store.add_sighting("AA:BB:CC:DD:EE:FF", session(hour + minute * 60, rssi=-50 - minute, count=2))
+    store.add_sighting("AA:BB:CC:DD:EE:FF", session(now - 400 * 86400))  # past keep_days
+    store.add_sighting("AA:BB:CC:DD:EE:FF", session(now - 60))
+    store.add_sighting("AA:BB:CC:DD:EE:FF", session(now - 30))
+    store.add_event("ALARM_TRIGGERED", "ancient", timestamp=now - 400 * 86400)
+
+    store.apply_retention(keep_days=180, downsample_days=14)
+
+    rows = store.sightings("AA:BB:CC:DD:EE:FF")
+    assert len(rows) == 3  # two recent sessions kept as-is, one hourly row
+    hourly = rows[-1]
+    assert hourly['count'] == 6
+    assert hourly['first_seen'] == hour + 5 * 60 - 10
+    assert hourly['last_seen'] == hour + 40 * 60
+    assert hourly['rssi'] == pytest.approx(-50 - 65 / 3)
+    assert store.events() == []
@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+from device_filter import DeviceFilter
+
+
+@pytest.fixture
+def files(tmp_path):
+    ignore = tmp_path / "ignore_devices.txt"
+    baseline = tmp_path / "baseline_devices.json"
+    ignore.write_text("# neighbours\naa-bb-cc-dd-ee-01\n\n11:22:33   # their car, any device of this vendor\n")
+    baseline.write_text(json.dumps({"devices": [{"mac": "aa:bb:cc:dd:ee:02"}, "AA:BB:CC:DD:EE:03"]}))
+    return ignore, baseline
+
+
+def test_merges_ignore_list_baseline_ouis_and_own_address(files):
+    ignore, baseline = files
+    device_filter = DeviceFilter(str(ignore), str(baseline), oui_prefixes=["de-ad-be"])
+    device_filter.add_own_address("b8:27:eb:00:00:01")
+
+    for mac in ("AA:BB:CC:DD:EE:01", "AA:BB:CC:DD:EE:02", "AA:BB:CC:DD:EE:03", "11:22:33:44:55:66",
+                "DE:AD:BE:EF:00:01", "B8:27:EB:00:00:01"):
+        assert device_filter.is_ignored(mac), mac
+    for mac in ("AA:BB:CC:DD:EE:04", "11:22:34:44:55:66", "B8:27:EB:00:00:02"):
+        assert not device_filter.is_ignored(mac), mac
+
+
+def test_missing_files_ignore_nothing(tmp_path):
+    device_filter = DeviceFilter(str(tmp_path / "none.txt"), str(tmp_path / "none.json"))
+    assert not device_filter.is_ignored("AA:BB:CC:DD:EE:01")
+    assert not device_filter.maybe_reload()
+
+
+def test_edited_ignore_list_is_reloaded(files):
+    ignore, baseline = files
+    device_filter = DeviceFilter(str(ignore), str(baseline), reload_interval=0.0)
+    device_filter.add_own_address("B8:27:EB:00:00:01")
+    assert not device_filter.maybe_reload()  # nothing changed
+
+    ignore.write_text("AA:BB:CC:DD:EE:09\n")
+    stat = os.stat(ignore)
+    os.utime(ignore, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert device_filter.maybe_reload()
+    assert device_filter.is_ignored("AA:BB:CC:DD:EE:09")
+    assert not device_filter.is_ignored("AA:BB:CC:DD:EE:01")
+    assert not device_filter.is_ignored("11:22:33:44:55:66")
+    assert device_filter.is_ignored("B8:27:EB:00:00:01")  # own address survives a reload
+    assert device_filter.is_ignored("AA:BB:CC:DD:EE:02")
+
+
+def test_reload_checks_are_rate_limited(files):
+    ignore, baseline = files
+    device_filter = DeviceFilter(str(ignore), str(baseline), reload_interval=3600.0)
+    device_filter.last_check = float("inf")
+    ignore.write_text("AA:BB:CC:DD:EE:09\n")
+    assert not device_filter.maybe_reload()
+    assert not device_filter.is_ignored("AA:BB:CC:DD:EE:09")
@@ -0,0 +1,16 @@
+import pytest
+
+from event_log import EventSink
+
+
+@pytest.mark.parametrize("event, urgent", [
+    ("FIRST_DETECTION", False),
+    ("ALARM_TRIGGERED", True),
+    ("DETECTION_CLEARED", True),
+])
+def test_alarm_and_clear_events_are_written_at_once(tmp_path, event, urgent):
+    sink = EventSink(str(tmp_path / "events.csv"))
+    sink.write(event, "1 devices")
+    assert (len(sink.buffer) == 0) is urgent
+    sink.close()
+    assert event in (tmp_path / "events.csv").read_text()
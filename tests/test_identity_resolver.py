@@ -0,0 +1,104 @@
+from identity_resolver import IdentityResolver
+from presence_tracker import PresenceTracker
+
+
+def sighting(now, signal=-60):
+    return {'name': "Unknown", 'signal': signal, 'last_seen': now, 'address_type': "public"}
+
+
+def test_identity_suffixes_are_never_reused():
+    resolver = IdentityResolver()
+    resolver.observe("AA:BB:CC:DD:EE:FF", sighting(0.0))
+    first = resolver.resolve("AA:BB:CC:DD:EE:FF", sighting(1.0), 1.0)
+    second = resolver.resolve("AA:BB:CC:DD:EE:FF", sighting(2.0), 2.0)
+    del resolver.identities[first]  # pruned - the population shrinks
+    third = resolver.resolve("AA:BB:CC:DD:EE:FF", sighting(3.0, signal=-70), 3.0)
+
+    assert len({"AA:BB:CC:DD:EE:FF", first, second, third}) == 4
+    assert resolver.identities[second]['last_seen'] == 2.0
+
+
+def test_public_addresses_keep_their_own_identity():
+    resolver = IdentityResolver()
+    seen = []
+    resolver.add_listener(lambda identity, _sighting: seen.append(identity))
+    resolver.observe("AA:BB:CC:DD:EE:01", sighting(0.0))
+    resolver.observe("AA:BB:CC:DD:EE:02", sighting(1.0))
+    resolver.observe("AA:BB:CC:DD:EE:01", sighting(2.0))
+    assert seen == ["AA:BB:CC:DD:EE:01", "AA:BB:CC:DD:EE:02", "AA:BB:CC:DD:EE:01"]
+
+
+def advertisement(now, signal=-60, name="Unknown", transport="le", hold=0):
+    return {'name': name, 'signal': signal, 'last_seen': now, 'address_type': "random", 'transport': transport,
+            'hold': hold, 'manufacturer_data': {0x004C: b"\x10\x05\x01\x18\x2a\x9b\x44"}, 'tx_power': 12}
+
+
+def test_rotated_address_is_handed_over_by_fingerprint():
+    resolver = IdentityResolver()
+    resolver.observe("4A:11:22:33:44:55", advertisement(0.0))
+    first = resolver.addresses["4A:11:22:33:44:55"][0]
+    resolver.observe("5B:66:77:88:99:AA", advertisement(10.0, signal=-64))
+
+    assert resolver.addresses["5B:66:77:88:99:AA"][0] == first
+    assert resolver.aliases(first) == 2
+    assert resolver.handoffs == 1
+
+    # Too late, a different device model, or a jump in signal: new identities
+    resolver.observe("6C:00:00:00:00:01", advertisement(10.0 + resolver.handoff + 1))
+    other = dict(advertisement(12.0), manufacturer_data={0x0075: b"\x42\x04"})
+    resolver.observe("6C:00:00:00:00:02", other)
+    resolver.observe("6C:00:00:00:00:03", advertisement(13.0, signal=-90))
+    assert len(resolver.identities) == 4
+
+
+def test_old_address_speaking_again_splits_the_handoff():
+    resolver = IdentityResolver()
+    seen = []
+    resolver.add_listener(lambda identity, _sighting: seen.append(identity))
+    resolver.observe("4A:11:22:33:44:55", advertisement(0.0))
+    resolver.observe("5B:66:77:88:99:AA", advertisement(1.0))  # a second phone of the same model
+    resolver.observe("4A:11:22:33:44:55", advertisement(2.0))  # the first one is still here
+    resolver.observe("5B:66:77:88:99:AA", advertisement(3.0))
+
+    first = seen[0]
+    assert seen[:3] == [first, first, first]
+    assert seen[3] != first
+    assert resolver.identities[first]['mac'] == "4A:11:22:33:44:55"
+    assert resolver.aliases(first) == 1
+    assert resolver.handoffs == 0
+    resolver.observe("5B:66:77:88:99:AA", advertisement(4.0))
+    assert seen[4] == seen[3]  # and they stay apart
+
+
+def radio(now, name, signal=-60, transport="le", hold=0):
+    return {'name': name, 'signal': signal, 'last_seen': now, 'address_type': "public", 'transport': transport,
+            'hold': hold}
+
+
+def test_ble_and_classic_addresses_with_one_name_are_one_device():
+    resolver = IdentityResolver()
+    tracker = PresenceTracker(expiry=15.0)
+    resolver.add_listener(tracker.observe)
+    resolver.observe("AA:00:00:00:00:01", radio(0.0, "Car Kit"))
+    resolver.observe("BB:00:00:00:00:01", radio(5.0, "Car Kit", signal=-66, transport="bredr", hold=37.0))
+
+    assert resolver.addresses["BB:00:00:00:00:01"][0] == "AA:00:00:00:00:01"
+    assert resolver.identities["AA:00:00:00:00:01"]['transport'] == "dual"
+    assert resolver.dual_links == 1
+    assert list(tracker.devices) == ["AA:00:00:00:00:01"]
+    assert tracker.devices["AA:00:00:00:00:01"]['transport'] == "dual"
+
+    resolver.observe("AA:00:00:00:00:01", radio(6.0, "Car Kit"))  # both radios keep one identity
+    assert len(resolver.identities) == 1
+
+
+def test_ambiguous_name_is_not_linked():
+    resolver = IdentityResolver()
+    resolver.observe("AA:00:00:00:00:01", radio(0.0, "Galaxy Buds"))
+    resolver.observe("AA:00:00:00:00:02", radio(1.0, "Galaxy Buds", signal=-62))
+    resolver.observe("BB:00:00:00:00:01", radio(5.0, "Galaxy Buds", transport="bredr", hold=37.0))
+    resolver.observe("BB:00:00:00:00:02", radio(5.0, "Car Kit", transport="bredr", hold=37.0))
+
+    assert len(resolver.identities) == 4
+    assert resolver.dual_links == 0
+    assert {record['transport'] for record in resolver.identities.values()} == {"le", "bredr"}
@@ -0,0 +1,100 @@
+import json
+
+import live_feed
+from live_feed import MAX_BUFFERED, LiveFeed
+
+
+class Transport:
+    def __init__(self, buffered=0):
+        self.buffered = buffered
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class Writer:
+    def __init__(self, buffered=0):
+        self.transport = Transport(buffered)
+        self.data = []
+        self.closed = False
+
+    def write(self, data):
+        self.data.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+class State:
+    def __init__(self):
+        self.status = {"armed": True, "alarm": False}
+        self.devices = {}
+
+    def __call__(self):
+        return dict(self.status), {mac: dict(device) for mac, device in self.devices.items()}
+
+
+def events(writer):
+    """(event, payload) pairs written to a client"""
+    parsed = []
+    for chunk in writer.data:
+        if chunk.startswith(b":"):
+            parsed.append(("keepalive", None))
+            continue
+        event, data = chunk.decode().strip().split("\n")
+        parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+def test_frames_carry_only_the_changes():
+    state = State()
+    feed = LiveFeed("127.0.0.1", 0, state)
+    client = Writer()
+    feed.clients.add(client)
+
+    state.devices = {"AA": {"rssi": -60, "first_seen": 1.0}, "BB": {"rssi": -70, "first_seen": 2.0}}
+    feed.frame()
+    state.devices["AA"]["rssi"] = -55
+    feed.frame()
+    del state.devices["BB"]
+    state.status["alarm"] = True
+    feed.frame()
+    feed.frame()  # nothing changed: nothing sent
+
+    frames = events(client)
+    assert [event for event, _ in frames] == ["delta", "delta", "delta"]
+    first, second, third = (payload for _, payload in frames)
+    assert first["status"] == {"armed": True, "alarm": False}
+    assert set(first["upsert"]) == {"AA", "BB"}
+    assert second.keys() == {"t", "upsert"}
+    assert second["upsert"] == {"AA": {"rssi": -55, "first_seen": 1.0}}
+    assert third.keys() == {"t", "status", "remove"}
+    assert third["remove"] == ["BB"]
+    assert third["status"]["alarm"] is True
+    assert feed.frames_sent == 3
+
+
+def test_idle_feed_sends_keepalives(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(live_feed.time, "time", lambda: clock[0])
+    feed = LiveFeed("127.0.0.1", 0, State())
+    client = Writer()
+    feed.clients.add(client)
+
+    feed.frame()
+    clock[0] += 1.0
+    feed.frame()
+    clock[0] += live_feed.KEEPALIVE
+    feed.frame()
+    assert [event for event, _ in events(client)] == ["delta", "keepalive"]
+
+
+def test_slow_client_is_dropped():
+    feed = LiveFeed("127.0.0.1", 0, State())
+    fast, slow = Writer(), Writer(buffered=MAX_BUFFERED + 1)
+    feed.clients.update((fast, slow))
+
+    feed.broadcast(b"data")
+    assert feed.clients == {fast}
+    assert slow.closed and slow.data == []
+    assert fast.data == [b"data"]
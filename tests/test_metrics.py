@@ -0,0 +1,71 @@
+import socket
+import time
+import urllib.request
+
+from metrics import Metrics, SamplingProfiler
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_prometheus_rendering():
+    metrics = Metrics()
+    alerts = metrics.counter("alerts_total", "Alert channel outcomes")
+    alerts.inc(channel="voice", result="delivered")
+    alerts.inc(2, channel="voice", result="delivered")
+    tick = metrics.histogram("tick", "Detection tick", buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.05, 3.0):
+        tick.observe(value)
+    assert metrics.counter("alerts_total", "registered twice") is alerts
+
+    lines = metrics.render().splitlines()
+    assert 'btids_alerts_total{channel="voice",result="delivered"} 3' in lines
+    assert lines[lines.index("# TYPE btids_tick_seconds histogram") + 1:][:5] == [
+        'btids_tick_seconds_bucket{le="0.01"} 1',
+        'btids_tick_seconds_bucket{le="0.1"} 3',
+        'btids_tick_seconds_bucket{le="+Inf"} 4',
+        'btids_tick_seconds_sum 3.105000',
+        'btids_tick_seconds_count 4']
+
+
+def test_summary_covers_only_the_last_interval():
+    metrics = Metrics()
+    tick = metrics.histogram("tick", "Detection tick", buckets=(0.01, 0.1))
+    tick.observe(0.005)
+    tick.observe(0.05)
+    assert metrics.summary().startswith("tick n=2 p50<=10ms p99<=100ms max=50.0ms")
+
+    tick.observe(0.002)
+    assert metrics.summary().startswith("tick n=1 p50<=10ms p99<=10ms max=2.0ms")
+    assert metrics.summary().startswith("rss=")
+
+
+def test_metrics_endpoint_serves_the_registry():
+    metrics = Metrics()
+    metrics.counter("scans_total", "Scans").inc()
+    port = free_port()
+    metrics.start_server(port)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+    finally:
+        metrics.stop_server()
+    assert "btids_scans_total 1" in body.splitlines()
+
+
+def test_profiler_dumps_collapsed_stacks(tmp_path):
+    profiler = SamplingProfiler(interval=0.001, directory=str(tmp_path))
+    profiler.toggle()
+    deadline = time.monotonic() + 0.2
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    profiler.toggle()
+
+    assert not profiler.running
+    (dump,) = tmp_path.iterdir()
+    lines = dump.read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("MainThread;") for line in lines)
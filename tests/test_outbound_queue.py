@@ -0,0 +1,95 @@
+import time
+
+from outbound_queue import PRIORITY_ALARM, PRIORITY_TELEMETRY
+
+
+def test_delivers_by_priority_with_idempotency_key(queue, vps):
+    queue.enqueue("/api/telemetry", {"n": 1}, priority=PRIORITY_TELEMETRY, key="t1")
+    queue.enqueue("/api/make-call", {"n": 2}, priority=PRIORITY_ALARM, key="a1")
+    queue.enqueue("/api/make-call", {"n": 3}, priority=PRIORITY_ALARM, key="a1")  # duplicate key
+
+    queue.flush()
+
+    assert [(path, key) for path, key, _ in vps.requests] == [("/api/make-call", "a1"), ("/api/telemetry", "t1")]
+    assert queue.stats()["depth"] == 0
+    assert queue.delivered == 2
+
+
+def test_server_error_backs_off_then_retries(queue, vps):
+    vps.statuses = [503]
+    queue.enqueue("/api/status", {"armed": True}, priority=PRIORITY_TELEMETRY, key="s1")
+
+    queue.flush()
+    row = queue.db.execute("SELECT * FROM outbox WHERE key = 's1'").fetchone()
+    assert row["attempts"] == 1
+    assert row["last_error"] == "HTTP 503"
+    assert 0.5 < queue.seconds_until_due() <= 1.2
+
+    # Still backing off: nothing is sent
+    queue.flush()
+    assert len(vps.requests) == 1
+
+    queue.link_up()
+    queue.flush()
+    assert len(vps.requests) == 2
+    assert queue.stats()["depth"] == 0
+
+
+def test_backoff_doubles_and_alarms_are_capped(queue):
+    queue.backoff_initial, queue.backoff_max, queue.alarm_backoff_max = 2.0, 300.0, 30.0
+    queue.enqueue("/api/status", {}, key="s1")
+    queue.enqueue("/api/make-call", {}, priority=PRIORITY_ALARM, key="a1")
+    rows = {row["key"]: dict(row) for row in queue.db.execute("SELECT * FROM outbox")}
+
+    for key, attempts, delay in (("s1", 0, 2.0), ("s1", 3, 16.0), ("s1", 10, 300.0), ("a1", 10, 30.0)):
+        row = dict(rows[key], attempts=attempts)
+        before = time.time()
+        next_attempt = queue.retry_later(row, "HTTP 503")
+        assert delay * 0.8 <= next_attempt - before <= delay * 1.2 + 0.1
+
+
+def test_client_error_is_dropped_and_reported(queue, vps):
+    results = []
+    queue.add_listener(lambda key, outcome, row: results.append((key, outcome)))
+    vps.statuses = [400]
+    queue.enqueue("/api/make-call", {}, priority=PRIORITY_ALARM, key="a1")
+
+    queue.flush()
+
+    assert results == [("a1", "rejected")]
+    assert queue.stats()["depth"] == 0
+    assert queue.dropped == 1
+
+
+def test_expired_alarm_is_never_posted(queue, vps):
+    results = []
+    queue.add_listener(lambda key, outcome, row: results.append((key, outcome)))
+    queue.enqueue("/api/make-call", {"phone_numbers": ["+61400000000"]}, priority=PRIORITY_ALARM,
+                  key="a1", ttl=0.0)
+    queue.enqueue("/api/telemetry", {"n": 1}, key="t1")
+
+    queue.flush()
+
+    assert [key for _, key, _ in vps.requests] == ["t1"]
+    assert results == [("a1", "expired"), ("t1", "delivered")]
+    assert queue.stats()["expired"] == 1
+
+
+def test_expired_alarm_is_dropped_while_link_is_down(queue, vps):
+    results = []
+    queue.add_listener(lambda key, outcome, row: results.append(outcome))
+    queue.alarm_ttl = 0.2
+    vps.statuses = [503]
+    queue.enqueue("/api/make-call", {}, priority=PRIORITY_ALARM, key="a1")
+
+    queue.flush()
+    assert len(vps.requests) == 1
+    assert queue.seconds_until_due() <= 0.2
+
+    time.sleep(0.25)
+    queue.link_up()
+    queue.flush()
+
+    assert len(vps.requests) == 1
+    assert results == ["expired"]
+    assert queue.stats()["depth"] == 0
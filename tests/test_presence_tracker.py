@@ -0,0 +1,92 @@
+from presence_tracker import PresenceTracker
+
+
+def sighting(now, signal=-60, transport="le", hold=0):
+    return {'name': "Unknown", 'signal': signal, 'last_seen': now, 'transport': transport, 'hold': hold}
+
+
+def test_rssi_is_smoothed_and_dwell_measured_per_device():
+    tracker = PresenceTracker(expiry=15.0, alpha=0.5)
+    tracker.observe("AA", sighting(0.0, signal=-80))
+    tracker.observe("AA", sighting(2.0, signal=-60))
+    tracker.observe("BB", sighting(3.0))
+    tracker.observe("AA", sighting(4.0, signal=-60))
+
+    entry = tracker.devices["AA"]
+    assert entry['rssi'] == -65.0
+    assert entry['signal'] == -65
+    assert entry['count'] == 3
+    assert PresenceTracker.dwell(entry) == 4.0
+    assert list(tracker.devices) == ["BB", "AA"]  # ordered by last_seen
+
+
+def test_absent_devices_expire_and_start_a_new_session_on_return():
+    tracker = PresenceTracker(expiry=15.0)
+    left = []
+    tracker.add_expire_listener(lambda mac, entry: left.append((mac, entry['count'])))
+    tracker.observe("AA", sighting(0.0))
+    tracker.observe("AA", sighting(10.0))
+    tracker.observe("BB", sighting(12.0))
+
+    assert list(tracker.present(26.0)) == ["BB"]
+    assert left == [("AA", 2)]
+
+    tracker.observe("BB", sighting(40.0))  # back after more than the window
+    assert left == [("AA", 2), ("BB", 1)]
+    assert tracker.devices["BB"]['first_seen'] == 40.0
+
+
+def test_qualified_applies_signal_and_confidence_thresholds():
+    tracker = PresenceTracker(expiry=15.0)
+    tracker.observe("WEAK", sighting(0.0, signal=-95))
+    tracker.observe("ONCE", sighting(0.0, signal=-50))
+    for now in (0.0, 1.0, 2.0):
+        tracker.observe("NEAR", sighting(now, signal=-50))
+    assert list(tracker.qualified(signal_threshold=-80, confidence_threshold=3, now=3.0)) == ["NEAR"]
+
+
+def test_size_bound_evicts_the_stalest_device():
+    tracker = PresenceTracker(expiry=15.0, max_devices=2)
+    left = []
+    tracker.add_expire_listener(lambda mac, entry: left.append(mac))
+    tracker.observe("AA", sighting(0.0))
+    tracker.observe("BB", sighting(1.0))
+    tracker.observe("AA", sighting(2.0))
+    tracker.observe("CC", sighting(3.0))
+    assert list(tracker.devices) == ["AA", "CC"]
+    assert left == ["BB"]
+
+
+def test_held_device_outlives_the_window_in_place():
+    tracker = PresenceTracker(expiry=15.0)
+    tracker.observe("CLASSIC", sighting(0.0, transport="bredr", hold=37.0))
+    tracker.observe("PHONE", sighting(1.0))
+    tracker.observe("WATCH", sighting(24.0))
+
+    tracker.expire(25.0)
+    assert list(tracker.devices) == ["CLASSIC", "WATCH"]  # still ordered by last_seen
+
+    tracker.expire(38.0)
+    assert list(tracker.devices) == ["WATCH"]
+
+
+def test_eviction_still_drops_the_stalest_device():
+    tracker = PresenceTracker(expiry=15.0, max_devices=3)
+    tracker.observe("CLASSIC", sighting(0.0, transport="bredr", hold=37.0))
+    tracker.observe("A", sighting(10.0))
+    tracker.observe("B", sighting(18.0))
+    for now in (20.0, 22.0, 24.0):
+        tracker.expire(now)  # A leaves at 25, CLASSIC is held until 37
+
+    tracker.observe("C", sighting(24.0))
+    assert list(tracker.devices) == ["A", "B", "C"]
+
+
+def test_both_radios_make_one_dual_device():
+    tracker = PresenceTracker(expiry=15.0)
+    tracker.observe("AA", sighting(0.0))
+    tracker.observe("AA", sighting(5.0, transport="bredr", hold=37.0))
+    entry = tracker.devices["AA"]
+    assert entry['transport'] == "dual"
+    assert entry['hold'] == 37.0
+    assert entry['count'] == 2
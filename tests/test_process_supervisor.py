@@ -0,0 +1,105 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from process_supervisor import ProcessSupervisor
+
+STUBBORN = """
+import signal, sys, time
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+open(sys.argv[1], 'w').close()
+time.sleep(60)
+"""
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pidfile(tmp_path):
+    return str(tmp_path / "monitor.pid")
+
+
+def test_sigterm_stops_the_child_and_removes_the_pidfile(pidfile):
+    supervisor = ProcessSupervisor([sys.executable, "-c", "import time; time.sleep(60)"], pidfile=pidfile)
+    assert supervisor.start()
+    assert supervisor.is_running()
+    with open(pidfile) as f:
+        assert int(f.read()) == supervisor.process.pid
+
+    assert supervisor.stop()
+    assert supervisor.process.returncode == -signal.SIGTERM
+    assert not os.path.exists(pidfile)
+    supervisor.check()
+    assert supervisor.seconds_until_restart() is None  # a wanted stop is not a crash
+
+
+def test_child_ignoring_sigterm_is_killed(tmp_path):
+    ready = tmp_path / "ready"
+    supervisor = ProcessSupervisor([sys.executable, "-c", STUBBORN, str(ready)], stop_timeout=0.3)
+    supervisor.start()
+    wait_for(ready.exists)
+
+    started = time.monotonic()
+    assert supervisor.stop()
+    assert supervisor.process.returncode == -signal.SIGKILL
+    assert time.monotonic() - started >= 0.3
+
+
+def test_crashes_restart_with_doubling_backoff():
+    supervisor = ProcessSupervisor([sys.executable, "-c", "raise SystemExit(3)"],
+                                   backoff_initial=0.05, backoff_max=0.15, stable_after=60.0)
+    supervisor.start()
+    pids = [supervisor.process.pid]
+    delays = []
+    for _ in range(3):
+        supervisor.process.wait()
+        supervisor.check()
+        delays.append(supervisor.backoff)
+        assert 0.0 <= supervisor.seconds_until_restart() <= 0.15
+        wait_for(lambda: supervisor.seconds_until_restart() == 0.0)
+        supervisor.check()
+        pids.append(supervisor.process.pid)
+
+    assert len(set(pids)) == 4
+    assert delays == [0.1, 0.15, 0.15]  # the delay after the next crash, capped
+    supervisor.stop()
+
+
+def test_stable_child_resets_the_backoff():
+    supervisor = ProcessSupervisor([sys.executable, "-c", "raise SystemExit(1)"],
+                                   backoff_initial=0.05, stable_after=0.0)
+    supervisor.backoff = 30.0
+    supervisor.start()
+    supervisor.process.wait()
+    supervisor.check()
+    assert supervisor.seconds_until_restart() <= 0.05
+    supervisor.stop()
+
+
+def test_stale_child_from_a_previous_daemon_is_stopped(pidfile):
+    command = [sys.executable, "-c", "import time; time.sleep(60)"]
+    stale = subprocess.Popen(command)
+    threading.Thread(target=stale.wait, daemon=True).start()  # reap it like init would
+    with open(pidfile, "w") as f:
+        f.write(f"{stale.pid}\n")
+
+    ProcessSupervisor(command, pidfile=pidfile, stop_timeout=2.0)
+    assert stale.wait(timeout=2.0) == -signal.SIGTERM
+    assert not os.path.exists(pidfile)
+
+
+def test_pidfile_of_an_unrelated_process_is_left_alone(pidfile):
+    with open(pidfile, "w") as f:
+        f.write(f"{os.getpid()}\n")  # pid reused by something else
+    ProcessSupervisor([sys.executable, "-c", "pass", "monitor.py"], pidfile=pidfile)
+    assert not os.path.exists(pidfile)
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from scan_scheduler import CONTINUOUS, DISARMED, QUIET, ScanScheduler
+
+
+class Scanner:
+    def __init__(self):
+        self.running = True
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+
+@pytest.fixture
+def scheduler():
+    return ScanScheduler(Scanner(), quiet_after=600.0, quiet_on=5.0, quiet_period=30.0,
+                         disarmed_on=0.0, disarmed_period=120.0)
+
+
+def test_modes_follow_activity_and_arm_state(scheduler):
+    scheduler.update(armed=True, active=False, now=0.0)
+    assert scheduler.mode == CONTINUOUS
+    scheduler.update(armed=True, active=False, now=599.0)
+    assert scheduler.mode == CONTINUOUS
+    scheduler.update(armed=True, active=False, now=600.0)
+    assert scheduler.mode == QUIET
+    assert scheduler.mode_since == 600.0
+
+    scheduler.update(armed=True, active=True, now=700.0)
+    assert scheduler.mode == CONTINUOUS
+    scheduler.update(armed=True, active=False, now=1299.0)  # quiet_after counts from the last activity
+    assert scheduler.mode == CONTINUOUS
+    scheduler.update(armed=False, active=True, now=1300.0)
+    assert scheduler.mode == DISARMED
+
+
+def test_quiet_duty_cycle_phase(scheduler):
+    scheduler.update(armed=True, active=False, now=0.0)
+    assert scheduler.radio_wanted(10.0)
+    assert scheduler.seconds_until_change(10.0) is None
+
+    scheduler.update(armed=True, active=False, now=600.0)
+    assert [scheduler.radio_wanted(600.0 + t) for t in (0, 4.9, 5, 29.9, 30, 34)] == [
+        True, True, False, False, True, True]
+    assert scheduler.seconds_until_change(602.0) == pytest.approx(3.0)   # radio goes off
+    assert scheduler.seconds_until_change(610.0) == pytest.approx(20.0)  # radio comes back on
+    assert scheduler.seconds_until_change(634.0) == pytest.approx(1.0)   # second window
+
+
+def test_disarmed_with_zero_window_keeps_the_radio_off(scheduler):
+    scheduler.update(armed=False, active=False, now=0.0)
+    assert not any(scheduler.radio_wanted(t) for t in (0.0, 1.0, 120.0))
+    assert scheduler.seconds_until_change(0.0) is None
+
+
+def test_radio_time_and_mode_time_are_accounted(scheduler):
+    async def run():
+        for now, armed in ((0.0, True), (600.0, True), (605.0, True), (630.0, True), (700.0, False)):
+            scheduler.update(armed=armed, active=False, now=now)
+            await scheduler.apply(now)
+
+    asyncio.run(run())
+    assert scheduler.scanner.running is False
+    # on 0-605 (continuous then the first quiet window), on again 630-700
+    assert scheduler.radio_seconds(700.0) == pytest.approx(675.0)
+
+    stats = scheduler.stats(760.0)
+    assert stats["mode"] == DISARMED
+    assert {mode: values["seconds"] for mode, values in stats["modes"].items()} == {
+        CONTINUOUS: 600.0, QUIET: 100.0, DISARMED: 60.0}
+    assert stats["radio_duty"] == pytest.approx(675.0 / 760.0, abs=0.001)
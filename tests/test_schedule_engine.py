@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from schedule_engine import DAYS, WeeklySchedule
+
+# 2024-01-01 was a Monday
+MONDAY = 1
+
+
+def at(day, hour, minute=0):
+    return datetime(2024, 1, MONDAY + day, hour, minute)
+
+
+def nightly(start="22:00", end="06:00", days=DAYS):
+    return {day: {"enabled": day in days, "start": start, "end": end} for day in DAYS}
+
+
+@pytest.mark.parametrize("when, armed", [
+    (at(0, 21, 59), False),
+    (at(0, 22, 0), True),
+    (at(1, 0, 0), True),      # past midnight: still Monday night's window
+    (at(1, 5, 59), True),
+    (at(1, 6, 0), False),
+    (at(1, 12, 0), False),
+])
+def test_overnight_window_runs_into_the_next_morning(when, armed):
+    schedule = WeeklySchedule(nightly(days=["monday"]))
+    assert schedule.is_active(when) is armed
+
+
+def test_sunday_night_wraps_into_monday_morning():
+    schedule = WeeklySchedule(nightly(days=["sunday"]))
+    assert schedule.is_active(at(6, 23, 0))
+    assert schedule.is_active(at(0, 3, 0))       # Monday of the same (and every) week
+    assert not schedule.is_active(at(0, 6, 0))
+    assert schedule.next_transition(at(6, 23, 0)) == datetime(2024, 1, 8, 6, 0)
+
+
+def test_consecutive_nights_only_flip_at_their_edges():
+    schedule = WeeklySchedule(nightly(days=["monday", "tuesday"]))
+    assert schedule.next_transition(at(0, 12, 0)) == at(0, 22, 0)
+    assert schedule.next_transition(at(0, 23, 0)) == at(1, 6, 0)
+    assert schedule.next_transition(at(1, 6, 0)) == at(1, 22, 0)
+    assert schedule.next_transition(at(2, 6, 0)) == datetime(2024, 1, 8, 22, 0)
+
+
+def test_overlapping_windows_merge():
+    schedule = nightly(days=["monday", "tuesday"])
+    schedule["tuesday"].update(start="04:00", end="08:00")  # starts inside Monday night's window
+    engine = WeeklySchedule(schedule)
+    assert engine.is_active(at(1, 7, 0))
+    assert engine.next_transition(at(0, 23, 0)) == at(1, 8, 0)  # no edge at 06:00
+
+
+def test_empty_schedule_never_arms():
+    engine = WeeklySchedule({})
+    assert not engine.is_active(at(0, 0))
+    assert engine.next_transition(at(0, 0)) is None
+    # Equal start and end is no window at all
+    assert WeeklySchedule(nightly(start="18:00", end="18:00")).next_transition(at(0, 0)) is None
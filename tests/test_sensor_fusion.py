@@ -0,0 +1,110 @@
+import asyncio
+import time
+import zlib
+
+import pytest
+
+from sensor_fusion import (FRAME, MAX_BATCH, FusionServer, SightingForwarder, decode_batch, encode_batch,
+                           frame_tag)
+
+TOKEN = "shared-secret"
+CHALLENGE = bytes(range(16))
+
+
+def sighting(signal=-60):
+    return {
+        'name': "Phone",
+        'signal': signal,
+        'last_seen': time.time(),
+        'manufacturer_data': {76: b"\x10\x05"},
+        'service_uuids': ["180f"],
+        'tx_power': None,
+        'address_type': "random"
+    }
+
+
+def payload(frame):
+    (length,) = FRAME.unpack(frame[:FRAME.size])
+    assert length == len(frame) - FRAME.size
+    return frame[FRAME.size:]
+
+
+def test_frame_round_trip():
+    entries = [["AA:BB:CC:DD:EE:FF", "Phone", -60, 1.5, 0.2, 3, "random", None, {"76": "1005"}, [], "le", 0]]
+    frame = encode_batch(TOKEN, CHALLENGE, 7, "node-1", 1000.0, entries)
+
+    batch = decode_batch(TOKEN, CHALLENGE, 7, payload(frame))
+
+    assert batch == {"node": "node-1", "now": 1000.0, "sightings": entries}
+    assert TOKEN.encode() not in zlib.decompress(payload(frame)[32:])
+
+
+@pytest.mark.parametrize("token, challenge, seq", [
+    ("wrong-secret", CHALLENGE, 0),    # foreign node
+    (TOKEN, bytes(16), 0),             # recorded on another connection
+    (TOKEN, CHALLENGE, 1),             # replayed later on the same connection
+])
+def test_frame_authentication_rejects(token, challenge, seq):
+    frame = encode_batch(TOKEN, CHALLENGE, 0, "node-1", 1000.0, [])
+    with pytest.raises(PermissionError):
+        decode_batch(token, challenge, seq, payload(frame))
+
+
+def test_tampered_frame_is_rejected():
+    data = bytearray(payload(encode_batch(TOKEN, CHALLENGE, 0, "node-1", 1000.0, [])))
+    data[-1] ^= 1
+    with pytest.raises(PermissionError):
+        decode_batch(TOKEN, CHALLENGE, 0, bytes(data))
+
+
+def test_decompression_is_bounded():
+    body = zlib.compress(b" " * (MAX_BATCH + 1), 9)
+    with pytest.raises(ValueError):
+        decode_batch(TOKEN, CHALLENGE, 0, frame_tag(TOKEN, CHALLENGE, 0, body) + body)
+
+
+def test_fusion_needs_a_token():
+    with pytest.raises(ValueError):
+        FusionServer("127.0.0.1", 0, lambda mac, seen: None)
+    with pytest.raises(ValueError):
+        SightingForwarder("127.0.0.1", token="")
+
+
+def forward(server_token, node_token, batches=2):
+    """Send batches from a node to a local aggregator - (sightings received, batches acknowledged)"""
+    async def run():
+        received = []
+        server = FusionServer("127.0.0.1", 0, lambda mac, seen: received.append((mac, seen)), token=server_token)
+        await server.start()
+        forwarder = SightingForwarder("127.0.0.1", server.server.sockets[0].getsockname()[1],
+                                      node_id="node-1", token=node_token)
+        try:
+            for i in range(batches):
+                forwarder.record("AA:BB:CC:DD:EE:FF", sighting(-60 - i))
+                batch, forwarder.pending = forwarder.pending, {}
+                await forwarder.send(batch)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await forwarder.disconnect()
+            await server.stop()
+        return received, forwarder.batches_sent
+
+    return asyncio.run(run())
+
+
+def test_authenticated_node_is_ingested():
+    received, sent = forward(TOKEN, TOKEN)
+    assert sent == 2
+    assert [seen['signal'] for _, seen in received] == [-60, -61]
+    mac, seen = received[0]
+    assert mac == "AA:BB:CC:DD:EE:FF"
+    assert seen['node'] == "node-1"
+    assert seen['manufacturer_data'] == {76: b"\x10\x05"}
+    assert seen['transport'] == "le"
+
+
+def test_node_with_wrong_token_is_dropped():
+    received, sent = forward(TOKEN, "wrong-secret")
+    assert received == []
+    assert sent == 0
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from benchmark import run_virtual
+from simulation import MockGPIO, ReplayScanner, StaticArmState, SyntheticCrowd, build_simulated_ids
+
+START = 1_760_000_000.0
+
+
+def test_synthetic_crowd_is_time_ordered_and_reproducible():
+    crowd = SyntheticCrowd(devices=50, duration=3600.0, start=START, residents=0.2, intruders=2, seed=7)
+    advertisements = list(crowd)
+
+    assert advertisements == list(SyntheticCrowd(devices=50, duration=3600.0, start=START, residents=0.2,
+                                                 intruders=2, seed=7))
+    assert [a[0] for a in advertisements] == sorted(a[0] for a in advertisements)
+    assert START <= advertisements[0][0] and advertisements[-1][0] <= START + 3600.0
+    assert len(crowd.residents) == 10
+    kinds = {}
+    for arrive, mac, kind, leave, _rssi in crowd.devices:
+        kinds.setdefault(kind, []).append(leave - arrive)
+    assert len(kinds["intruder"]) == 2 and all(120 <= stay <= 600 for stay in kinds["intruder"])
+    assert len(kinds["passer"]) == 38 and all(5 <= stay <= 60 for stay in kinds["passer"])
+
+
+def test_replay_scanner_feeds_up_to_the_virtual_time():
+    scanner = ReplayScanner([(10.0, "aa:00:00:00:00:01", None, -60), (20.0, "AA:00:00:00:00:02", "Watch", -70)])
+    scanner.running = True
+    assert scanner.advance_to(15.0) == 1
+    assert list(scanner.recent(now=15.0)) == ["AA:00:00:00:00:01"]
+    assert scanner.sightings["AA:00:00:00:00:01"]['name'] == "Unknown"
+    assert not scanner.exhausted
+    assert scanner.advance_to(30.0) == 1
+    assert scanner.exhausted
+
+
+def test_mock_gpio_records_relay_transitions():
+    clock = iter(range(10))
+    gpio = MockGPIO(clock=lambda: next(clock))
+    gpio.setup(18, gpio.OUT)
+    for value in (gpio.HIGH, gpio.HIGH, gpio.LOW):
+        gpio.output(18, value)
+    assert gpio.history == [(0, 18, gpio.HIGH), (1, 18, gpio.LOW)]
+
+
+def test_static_arm_state_change_is_not_lost():
+    async def run():
+        arm_state = StaticArmState(armed=True)
+        arm_state.set(False)  # before anyone waits
+        return await asyncio.wait_for(arm_state.wait_for_change(5.0), 0.5)
+
+    assert asyncio.run(run())
+
+
+def test_intruder_triggers_the_simulated_relay(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    start = time.time()  # the simulated clock starts at the wall clock
+    lines = [(start + second, "66:00:00:00:00:01", "Intruder", -50) for second in range(300)]
+    ids = build_simulated_ids(lines, email_latency=0.0, voice_latency=0.0)
+
+    results = asyncio.run(run_virtual(ids, 1.0, start, start + 400.0))
+    for future in results['futures']:
+        future.result()
+    ids.dispatcher.shutdown(wait=True)
+
+    assert results['advertisements'] == 300
+    assert [value for _, _, value in ids.gpio.history][:1] == [ids.gpio.HIGH]
+    assert ids.dispatcher.sent
@@ -0,0 +1,63 @@
+import json
+import zlib
+
+from outbound_queue import PRIORITY_TELEMETRY
+from telemetry import TelemetryUplink, decode_batch, delta_encode
+
+
+class Outbox:
+    def __init__(self):
+        self.requests = []
+
+    def enqueue(self, path, body, priority, key=None, compressed=False):
+        self.requests.append((path, body, priority, key, compressed))
+
+
+SAMPLES = [
+    {"t": 100.0, "armed": True, "alarm": False, "devices": 3, "rssi": [0, 1, 2, 0, 0, 0]},
+    {"t": 115.0, "armed": True, "alarm": False, "devices": 3, "rssi": [0, 1, 2, 0, 0, 0]},
+    {"t": 130.1, "armed": True, "alarm": True, "devices": 4, "rssi": [0, 0, 3, 1, 0, 0]},
+    {"t": 145.1, "armed": False, "alarm": False, "devices": 0, "rssi": [0, 0, 0, 0, 0, 0]},
+]
+
+
+def test_delta_encoding_only_carries_changes():
+    encoded = delta_encode(SAMPLES)
+    assert encoded[0] == SAMPLES[0]
+    assert encoded[1] == {"dt": 15.0}
+    assert encoded[2] == {"dt": 15.1, "alarm": True, "devices": 4, "rssi": [0, 0, 3, 1, 0, 0]}
+
+
+def test_batch_round_trip():
+    batch = {"device_id": "btids001", "boot": 1, "seq": 7, "t": 100.0, "samples": delta_encode(SAMPLES)}
+    body = zlib.compress(json.dumps(batch).encode())
+
+    decoded, samples = decode_batch(body, "deflate")
+
+    assert decoded["seq"] == 7
+    assert samples == SAMPLES
+
+
+def test_uplink_batches_samples_through_the_outbox():
+    outbox = Outbox()
+    state = {"profile": "active", "armed": True, "alarm": False}
+    uplink = TelemetryUplink(outbox, "btids001", lambda: (state["profile"], state["armed"], state["alarm"]),
+                             lambda: {"devices": 2, "scanning": True})
+    for now in range(1000, 1121):
+        uplink.record("AA:BB:CC:DD:EE:FF", {'signal': -65, 'last_seen': float(now)})
+        uplink.tick(float(now))
+
+    # Active site: a sample every 15 s, one batch after 120 s
+    [(path, body, priority, key, compressed)] = outbox.requests
+    assert (path, priority, compressed) == ("/api/telemetry", PRIORITY_TELEMETRY, True)
+    assert key == f"telemetry-btids001-{uplink.boot}-1"
+    batch, samples = decode_batch(body, "deflate")
+    assert [sample["t"] for sample in samples] == [1015.0 + 15 * i for i in range(8)]
+    assert samples[0]["adv"] == 16 and samples[0]["rssi"] == [0, 0, 0, 16, 0, 0]
+    assert not any(sample["stalled"] for sample in samples)
+
+    # Arm state changes are sent straight away
+    state["armed"] = False
+    uplink.tick(1121.0)
+    assert len(outbox.requests) == 2
+    assert decode_batch(outbox.requests[1][1], "deflate")[1][-1]["t"] == 1121.0
@@ -0,0 +1,64 @@
+import pytest
+
+import tuner
+from tuner import rank
+
+START = 1_760_000_000.0
+
+
+def row(trigger, missed, false_alarms_per_night, time_to_detect_p50):
+    return {"trigger_threshold": trigger, "missed": missed, "false_alarms_per_night": false_alarms_per_night,
+            "time_to_detect_p50": time_to_detect_p50}
+
+
+def test_configs_that_miss_intruders_rank_last():
+    results = [
+        row(900, missed=4, false_alarms_per_night=0.0, time_to_detect_p50=None),   # never alarms
+        row(5, missed=0, false_alarms_per_night=86.0, time_to_detect_p50=3.1),
+        row(120, missed=0, false_alarms_per_night=0.0, time_to_detect_p50=121.0),
+        row(60, missed=0, false_alarms_per_night=0.0, time_to_detect_p50=61.0),
+        row(120, missed=1, false_alarms_per_night=0.0, time_to_detect_p50=121.8),
+    ]
+    assert [(r["trigger_threshold"], r["missed"]) for r in sorted(results, key=rank)] == [
+        (60, 0), (120, 0), (5, 0), (120, 1), (900, 4)]
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    """Two hours: a phone passing for 8 s, a visitor staying 200 s, one last blip - plus 2 intruders"""
+    monkeypatch.chdir(tmp_path)
+    lines = ["timestamp,mac,name,rssi"]
+    lines += [f"{START + i},11:22:33:44:55:01,Phone,-60" for i in range(8)]
+    lines += [f"{START + 3000 + i},11:22:33:44:55:02,Visitor,-55" for i in range(200)]
+    lines.append(f"{START + 7200},11:22:33:44:55:03,Blip,-80")
+    (tmp_path / "trace.csv").write_text("\n".join(lines) + "\n")
+    tuner.init_worker({
+        "trace": str(tmp_path / "trace.csv"),
+        "history": None,
+        "since": 0.0,
+        "baseline": str(tmp_path / "no_baseline.json"),  # every device scores as new
+        "intruders": {"count": 2, "start": START, "duration": 7200.0, "seed": 1}
+    })
+    yield
+    tuner.init_worker(None)
+
+
+def test_replay_scores_alarms_and_intruders(recording):
+    grid = [{"trigger_threshold": trigger, "signal_threshold": -100.0, "confidence_threshold": 1}
+            for trigger in (30.0, 900.0)]
+    (quick, never), span = tuner.replay(1.0, grid)
+
+    assert span == pytest.approx(7200.0, abs=30)
+    assert quick["intrusions"] == never["intrusions"] == 2
+    assert quick["missed"] == 0
+    assert quick["alarms"] == 3
+    assert quick["false_alarms"] == 1  # the visitor
+    assert quick["episodes"] == 5
+    assert quick["clear_rate"] == 0.4  # the passing phone and the blip
+    assert quick["time_to_detect_p50"] <= quick["time_to_detect_p90"]
+    assert quick["time_to_alarm_p50"] <= quick["time_to_alarm_p90"]
+
+    assert never["alarms"] == 0
+    assert never["missed"] == 2
+    assert never["clear_rate"] == 1.0
+    assert rank(quick) < rank(never)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+What-if threshold tuner for the Bluetooth IDS
+Replays recorded sightings (a .btr/.csv trace or the detections.db presence
+history) through the monitor's own pipeline - device filter, identity
+resolver, presence tracker, baseline profile and
+RemoteSiteIDS.process_detections - for every combination of a parameter
+grid, fanned out over a process pool. Reports alarms per night, time to
+alarm and how often detections clear without an alarm.
+
+The recording itself has no ground truth, so synthetic intruders (2-10
+minute visits, as in simulation.SyntheticCrowd) are mixed into the replay.
+Configurations are ranked by how many of them they miss, then by false
+alarms per night (alarms with no intruder present), then by how quickly
+they catch the intruders. A configuration that never alarms therefore
+ranks last instead of first.
+
+The presence table does not depend on the thresholds, so each task replays
+the recording once per tick interval and evaluates a whole slice of the
+grid on it. Stretches with nothing present are skipped in one step.
+
+Usage:
+    python3 tuner.py --history detections.db --days 30
+    python3 tuner.py --trace night.btr --trigger 10,20,45 --signal -90,-80,-70 --tick 1,2
+"""
+
+import argparse
+import csv
+import heapq
+import itertools
+import logging
+import math
+import os
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from baseline_profile import BASELINE_FILE, BaselineProfile
+from benchmark import percentile
+from config_cache import ConfigCache
+from device_filter import DeviceFilter
+from identity_resolver import IdentityResolver
+from presence_tracker import PresenceTracker
+from remote_site_with_email import RemoteSiteIDS
+from simulation import ReplayScanner, SyntheticCrowd, load_history, load_trace
+
+SIGHTING_WINDOW = 15.0    # same presence window as the monitor
+NIGHT_OFFSET = 12 * 3600  # alarms are grouped into noon-to-noon nights
+
+# Replays are silent: process_detections logs every detection it makes
+QUIET = logging.getLogger("tuner.replay")
+QUIET.disabled = True
+
+source = None  # recording spec of this worker process, set by the pool initializer
+
+
+def init_worker(spec):
+    global source
+    source = spec
+
+
+def recording(spec):
+    """(timestamp, mac, name, rssi) in time order from a trace or the history DB"""
+    if spec["history"]:
+        return load_history(spec["history"], since=spec["since"])
+    return load_trace(spec["trace"])
+
+
+def intruder_crowd(spec):
+    """The synthetic intruders of this sweep - the same in every worker"""
+    plan = spec["intruders"]
+    if not plan:
+        return None
+    return SyntheticCrowd(devices=plan["count"], duration=plan["duration"], start=plan["start"],
+                          residents=0, intruders=plan["count"], seed=plan["seed"])
+
+
+def advertisements(spec, crowd=None):
+    """The recording with the intruders' advertisements merged in"""
+    if crowd is None:
+        return recording(spec)
+    return heapq.merge(recording(spec), crowd, key=lambda advertisement: advertisement[0])
+
+
+class ReplayDecision:
+    """Just the detection state RemoteSiteIDS.process_detections works on, with outcomes recorded"""
+
+    process_detections = RemoteSiteIDS.process_detections
+
+    def __init__(self, tracker, params):
+        self.tracker = tracker
+        self.params = params
+        self.trigger_threshold = params["trigger_threshold"]
+        self.signal_threshold = params["signal_threshold"]
+        self.confidence_threshold = params["confidence_threshold"]
+        self.logger = QUIET
+
+        self.now = 0.0
+        self.first_detection_time = None
+        self.detected_devices = {}
+        self.alarm_active = False
+
+        self.episodes = 0       # FIRST_DETECTION ... DETECTION_CLEARED cycles
+        self.cleared = 0        # episodes that ended without an alarm
+        self.alarmed = False
+        self.alarm_times = []
+        self.false_alarm_times = []
+        self.time_to_alarm = []
+        self.intruders = set()  # identities of the synthetic intruders present, set per tick
+        self.time_to_detect = {}  # intrusion index -> seconds from arrival to an alarm covering it
+
+    def clock(self):
+        return self.now
+
+    def log_event(self, event_type, details):
+        if event_type == "FIRST_DETECTION":
+            self.episodes += 1
+            self.alarmed = False
+        elif event_type == "DETECTION_CLEARED" and not self.alarmed:
+            self.cleared += 1
+
+    def trigger_alarm(self, device_count):
+        if self.alarm_active:
+            return
+        self.alarm_active = True
+        self.alarmed = True
+        self.alarm_times.append(self.now)
+        self.time_to_alarm.append(self.now - self.first_detection_time)
+        if not self.intruders & self.detected_devices.keys():
+            self.false_alarm_times.append(self.now)
+
+    def check_intrusions(self, present):
+        """present: intrusion index -> (arrival, identity) for intruders in range this tick"""
+        if not self.alarm_active:
+            return
+        for index, (arrive, identity) in present.items():
+            if index not in self.time_to_detect and identity in self.detected_devices:
+                self.time_to_detect[index] = self.now - arrive
+
+    def stop_alarm(self):
+        self.alarm_active = False
+
+    def result(self, nights, intrusions):
+        per_night = Counter(datetime.fromtimestamp(t - NIGHT_OFFSET).date() for t in self.false_alarm_times)
+        delays = sorted(self.time_to_alarm)
+        detections = sorted(self.time_to_detect.values())
+        return dict(
+            self.params,
+            intrusions=intrusions,
+            missed=intrusions - len(detections),
+            time_to_detect_p50=round(statistics.median(detections), 1) if detections else None,
+            time_to_detect_p90=round(percentile(detections, 0.9), 1) if detections else None,
+            alarms=len(self.alarm_times),
+            false_alarms=len(self.false_alarm_times),
+            false_alarms_per_night=round(len(self.false_alarm_times) / nights, 2),
+            worst_night=max(per_night.values(), default=0),
+            time_to_alarm_p50=round(statistics.median(delays), 1) if delays else None,
+            time_to_alarm_p90=round(percentile(delays, 0.9), 1) if delays else None,
+            episodes=self.episodes,
+            clear_rate=round(self.cleared / self.episodes, 3) if self.episodes else None
+        )
+
+
+def rank(row):
+    """Intruders caught first, then fewest false alarms, then the quickest catches"""
+    return (row["missed"], row["false_alarms_per_night"],
+            row["time_to_detect_p50"] if row["time_to_detect_p50"] is not None else float("inf"))
+
+
+def replay(tick, grid):
+    """Replay the recording once at one tick interval and score every combination in grid"""
+    device_filter = DeviceFilter(baseline_file=source["baseline"], logger=QUIET)
+    baseline = BaselineProfile(source["baseline"], logger=QUIET)
+
+    crowd = intruder_crowd(source)
+    intrusions = [(arrive, mac, leave) for arrive, mac, _kind, leave, _rssi in crowd.devices] if crowd else []
+    scanner = ReplayScanner(advertisements(source, crowd), sighting_window=SIGHTING_WINDOW, logger=QUIET)
+    scanner.device_filter = device_filter
+    scanner.running = True
+    resolver = IdentityResolver(logger=QUIET)
+    scanner.add_listener(resolver.observe)
+    tracker = PresenceTracker(expiry=SIGHTING_WINDOW, logger=QUIET)
+    resolver.add_listener(tracker.observe)
+
+    decisions = [ReplayDecision(tracker, params) for params in grid]
+    scanner.advance_to(float("-inf"))
+    if scanner.pending is None:
+        return [], 0.0
+    first = now = scanner.pending[0]
+
+    while not scanner.exhausted or tracker.devices:
+        scanner.advance_to(now)
+        scanner.recent(now=now)
+        tracker.expire(now)
+        # Baseline scores depend on RSSI only - once per tick for all combinations
+        anomalous = {mac for mac, entry in tracker.devices.items()
+                     if baseline.is_anomalous(mac, entry['rssi'], now)}
+        # Intruders whose visit (plus the presence window) covers this tick, by identity
+        present = {}
+        for index, (arrive, mac, leave) in enumerate(intrusions):
+            address = resolver.addresses.get(mac)
+            if arrive <= now <= leave + SIGHTING_WINDOW and address is not None:
+                present[index] = (arrive, address[0])
+        identities = {identity for _, identity in present.values()}
+        for decision in decisions:
+            decision.now = now
+            decision.intruders = identities
+            qualified = tracker.qualified(decision.signal_threshold, decision.confidence_threshold, now)
+            decision.process_detections({mac: entry for mac, entry in qualified.items() if mac in anomalous})
+            decision.check_intrusions(present)
+        now += tick
+
+        # Nothing present (and every decision already cleared): jump to the next advertisement
+        if not tracker.devices and scanner.pending is not None and scanner.pending[0] > now:
+            now += math.floor((scanner.pending[0] - now) / tick) * tick
+
+    span = now - first
+    return [dict(decision.result(max(1.0, span / 86400), len(intrusions)), tick_interval=tick)
+            for decision in decisions], span
+
+
+def recording_span(spec):
+    """(first, last) advertisement time of the recording"""
+    first = last = None
+    for timestamp, *_ in recording(spec):
+        if first is None:
+            first = timestamp
+        last = timestamp
+    return first, last
+
+
+def current_settings():
+    """The thresholds the monitor would use right now"""
+    config = ConfigCache(directory=os.getcwd(), logger=QUIET)
+    detection, ids_config = config.get("detection"), config.get("ids")
+    return {
+        "trigger_threshold": float(ids_config.get("trigger_threshold", 45)),
+        "signal_threshold": float(detection.get("signal_threshold", -100)),
+        "confidence_threshold": int(detection.get("confidence_threshold", 1)),
+        "tick_interval": 1.0
+    }
+
+
+def numbers(kind):
+    return lambda value: [kind(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sightings over a grid of detection thresholds")
+    recording = parser.add_mutually_exclusive_group(required=True)
+    recording.add_argument("--trace", help="a .btr or CSV trace (timestamp,mac,name,rssi)")
+    recording.add_argument("--history", metavar="DB", help="presence sessions from detections.db")
+    parser.add_argument("--days", type=float, default=30, help="history to replay (--history only)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline profile / device list")
+    parser.add_argument("--trigger", type=numbers(float), default="5,10,20,30,45,60,90,120",
+                        help="trigger_threshold values (s)")
+    parser.add_argument("--signal", type=numbers(float), default="-100,-90,-85,-80,-75,-70",
+                        help="signal_threshold values (dBm)")
+    parser.add_argument("--confidence", type=numbers(int), default="1,2,3,5",
+                        help="confidence_threshold values (sightings)")
+    parser.add_argument("--tick", type=numbers(float), default="1,2", help="detection tick intervals (s)")
+    parser.add_argument("--intruders", type=float, default=2.0,
+                        help="synthetic intruders mixed in per night of recording (0 = none)")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the synthetic intruders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--top", type=int, default=25, help="rows to print")
+    parser.add_argument("--csv", metavar="PATH", help="write every combination to a CSV file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    spec = {
+        "trace": os.path.abspath(args.trace) if args.trace else None,
+        "history": os.path.abspath(args.history) if args.history else None,
+        "since": time.time() - args.days * 86400,
+        "baseline": args.baseline,
+        "intruders": None
+    }
+    if args.intruders > 0:
+        first, last = recording_span(spec)
+        if first is not None:
+            count = max(1, round(args.intruders * max(1.0, (last - first) / 86400)))
+            spec["intruders"] = {"count": count, "start": first, "duration": max(last - first, 600.0),
+                                 "seed": args.seed}
+            print(f"Mixing {count} synthetic intruder(s) into the recording")
+    else:
+        print("No synthetic intruders: ranking by false alarms only")
+    grid = [{"trigger_threshold": trigger, "signal_threshold": signal, "confidence_threshold": confidence}
+            for trigger, signal, confidence in itertools.product(args.trigger, args.signal, args.confidence)]
+
+    # One replay per slice: enough slices per tick interval to keep every worker busy
+    slices = max(1, math.ceil(2 * args.workers / len(args.tick)))
+    size = math.ceil(len(grid) / slices)
+    tasks = [(tick, grid[i:i + size]) for tick in args.tick for i in range(0, len(grid), size)]
+    print(f"Sweeping {len(grid) * len(args.tick)} configurations in {len(tasks)} replays on {args.workers} workers...")
+
+    started = time.perf_counter()
+    results = []
+    span = 0.0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(spec,)) as pool:
+        futures = [pool.submit(replay, tick, chunk) for tick, chunk in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            rows, span = future.result()
+            results.extend(rows)
+            print(f"\r  {done}/{len(tasks)} replays done", end="", flush=True)
+    print(f"\rReplayed {span / 86400:.1f} days x {len(results)} configurations in "
+          f"{time.perf_counter() - started:.1f} s")
+    if not results:
+        print("Recording is empty")
+        return
+
+    results.sort(key=rank)
+    current = current_settings()
+    columns = ["trigger_threshold", "signal_threshold", "confidence_threshold", "tick_interval",
+               "intrusions", "missed", "time_to_detect_p50", "time_to_detect_p90",
+               "alarms", "false_alarms", "false_alarms_per_night", "worst_night",
+               "time_to_alarm_p50", "time_to_alarm_p90", "episodes", "clear_rate"]
+    print(f"{'trigger':>8} {'signal':>7} {'conf':>5} {'tick':>5} {'missed':>7} {'ttd p50':>8} {'ttd p90':>8} "
+          f"{'false':>6} {'/night':>7} {'worst':>6} {'episodes':>9} {'cleared':>8}")
+    def is_current(row):
+        return all(row[key] == value for key, value in current.items())
+
+    shown = results[:args.top] + [row for row in results[args.top:] if is_current(row)]
+    for row in shown:
+        marker = "*" if is_current(row) else " "
+        print(f"{row['trigger_threshold']:>7g}s {row['signal_threshold']:>7g} {row['confidence_threshold']:>5} "
+              f"{row['tick_interval']:>4g}s {row['missed']:>3}/{row['intrusions']:<3} "
+              f"{row['time_to_detect_p50'] if row['time_to_detect_p50'] is not None else '-':>8} "
+              f"{row['time_to_detect_p90'] if row['time_to_detect_p90'] is not None else '-':>8} "
+              f"{row['false_alarms']:>6} {row['false_alarms_per_night']:>7} {row['worst_night']:>6} "
+              f"{row['episodes']:>9} {row['clear_rate'] if row['clear_rate'] is not None else '-':>8} {marker}")
+    if any(is_current(row) for row in shown):
+        print("* = current configuration")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"All {len(results)} configurations written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()